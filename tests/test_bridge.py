@@ -0,0 +1,98 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Tests of sharing a loop:// port with clients over 127.0.0.1.
+"""
+import os
+import sys
+import time
+import socket
+import unittest
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tinycom'))
+
+import bridge # pylint: disable=wrong-import-position
+
+def wait_for(condition, timeout=5.0):
+    """Return True once condition() is true, or False after timeout."""
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def recv_all(sock, size):
+    """Return size bytes read from sock."""
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+class BridgeServerTest(unittest.TestCase):
+    """Data goes both ways between clients and the port."""
+
+    def setUp(self):
+        self.port = serial.serial_for_url('loop://', timeout=2.0)
+        self.server = bridge.BridgeServer(self.port, self.port.write, 0)
+        self.server.start()
+        self.clients = []
+
+    def tearDown(self):
+        self.server.stop()
+        for sock in self.clients:
+            sock.close()
+        self.port.close()
+        self.assertIsNone(self.server.error)
+
+    def connect(self):
+        """Return a socket connected to the server, once accepted."""
+        count = len(self.server.clients)
+        sock = socket.create_connection(self.server.address, 5.0)
+        self.clients.append(sock)
+        self.assertTrue(wait_for(lambda: len(self.server.clients) > count))
+        return sock
+
+    def test_round_trip(self):
+        sock = self.connect()
+        sock.sendall(b'hello\xff')
+        data = self.port.read(6)
+        self.assertEqual(data, b'hello\xff')
+        self.server.broadcast(data)
+        self.assertEqual(recv_all(sock, 6), b'hello\xff')
+
+    def test_fan_out(self):
+        first = self.connect()
+        second = self.connect()
+        first.sendall(b'one')
+        second.sendall(b'two')
+        data = self.port.read(6)
+        self.assertEqual(sorted([data[:3], data[3:]]), [b'one', b'two'])
+        self.server.broadcast(b'both')
+        self.assertEqual(recv_all(first, 4), b'both')
+        self.assertEqual(recv_all(second, 4), b'both')
+
+    def test_disconnect(self):
+        sock = self.connect()
+        sock.close()
+        self.clients.remove(sock)
+        self.assertTrue(wait_for(lambda: not self.server.clients))
+
+class BridgeClientTest(unittest.TestCase):
+    """A client that isn't keeping up loses whole writes."""
+
+    def test_drops_whole_writes(self):
+        client = bridge.BridgeClient(None, None, 8)
+        client.write(b'12345')
+        client.write(b'6789')
+        client.write(b'abc')
+        self.assertEqual(bytes(client.queue), b'12345abc')
+        self.assertEqual(client.dropped, 4)
+
+if __name__ == '__main__':
+    unittest.main()
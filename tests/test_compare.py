@@ -0,0 +1,98 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Tests of aligning two streams of lines as they arrive.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tinycom'))
+
+import compare # pylint: disable=wrong-import-position
+from compare import SAME, CHANGED, A_ONLY, B_ONLY # pylint: disable=wrong-import-position
+
+LINES = [u'line %d' % n for n in range(20)]
+
+def diff(a_lines, b_lines, **kwargs):
+    """Return every aligned line of a and b, added at once."""
+    return compare.IncrementalDiff(**kwargs).add(a_lines, b_lines, final=True)
+
+class AlignTest(unittest.TestCase):
+    """Lines agree again after changed, missing and inserted lines."""
+
+    def test_same(self):
+        self.assertEqual(diff(LINES, LINES),
+                         [(SAME, line, line) for line in LINES])
+
+    def test_changed(self):
+        b_lines = LINES[:5] + [u'other'] + LINES[6:]
+        ops = diff(LINES, b_lines)
+        self.assertEqual(ops[5], (CHANGED, u'line 5', u'other'))
+        self.assertEqual([op[0] for op in ops],
+                         [SAME] * 5 + [CHANGED] + [SAME] * 14)
+
+    def test_missing(self):
+        ops = diff(LINES, LINES[:5] + LINES[8:])
+        self.assertEqual(ops[5:8], [(A_ONLY, u'line 5', None),
+                                    (A_ONLY, u'line 6', None),
+                                    (A_ONLY, u'line 7', None)])
+        self.assertEqual(ops[8:], [(SAME, line, line) for line in LINES[8:]])
+
+    def test_inserted(self):
+        ops = diff(LINES, LINES[:5] + [u'new 1', u'new 2'] + LINES[5:])
+        self.assertEqual(ops[5:7], [(B_ONLY, None, u'new 1'),
+                                    (B_ONLY, None, u'new 2')])
+        self.assertEqual(ops[7:], [(SAME, line, line) for line in LINES[5:]])
+
+    def test_ignore(self):
+        a_lines = [u'[%d.00] %s' % (n, line) for n, line in enumerate(LINES)]
+        b_lines = [u'[%d.50] %s' % (n, line) for n, line in enumerate(LINES)]
+        ops = diff(a_lines, b_lines, ignore=r'^\[[0-9.]+\] ')
+        self.assertEqual([op[0] for op in ops], [SAME] * len(LINES))
+        self.assertEqual(ops[0], (SAME, a_lines[0], b_lines[0]))
+
+    def test_counts(self):
+        differ = compare.IncrementalDiff()
+        differ.add(LINES, LINES[:3] + [u'other'] + LINES[4:10] +
+                   [u'new'] + LINES[12:] + [u'extra'], final=True)
+        # Two lines replaced by one is a changed line and a missing one.
+        self.assertEqual(differ.counts, [17, 2, 1, 1])
+
+class IncrementalTest(unittest.TestCase):
+    """Lines are aligned as they arrive, in bounded memory."""
+
+    def test_waits_for_sync(self):
+        differ = compare.IncrementalDiff()
+        self.assertEqual(differ.add(LINES[:5], LINES[:4] + [u'other']),
+                         [(SAME, line, line) for line in LINES[:4]])
+        # Only one line agrees after the change, so it could still diverge.
+        self.assertEqual(differ.add(LINES[5:6], LINES[5:6]), [])
+        ops = differ.add(LINES[6:], LINES[6:])
+        self.assertEqual(ops[0], (CHANGED, u'line 4', u'other'))
+        self.assertEqual(ops[1:], [(SAME, line, line) for line in LINES[5:]])
+
+    def test_final_flushes(self):
+        differ = compare.IncrementalDiff()
+        self.assertEqual(differ.add(LINES[:3], LINES[:5]),
+                         [(SAME, line, line) for line in LINES[:3]])
+        self.assertEqual(differ.add([], [], final=True),
+                         [(B_ONLY, None, u'line 3'), (B_ONLY, None, u'line 4')])
+
+    def test_window(self):
+        differ = compare.IncrementalDiff(window=4)
+        ops = differ.add([], LINES[:10])
+        self.assertEqual(ops, [(B_ONLY, None, line) for line in LINES[:6]])
+        self.assertEqual(differ.room(), 0)
+
+    def test_capture(self):
+        stream = compare.CaptureStream(u'\n'.join(LINES))
+        self.assertEqual(stream.take(15), LINES[:15])
+        self.assertFalse(stream.done())
+        self.assertEqual(stream.take(-1), [])
+        self.assertEqual(stream.take(15), LINES[15:])
+        self.assertTrue(stream.done())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Tests of the streaming decoders for binary framed protocols.
+"""
+import os
+import sys
+import struct
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tinycom'))
+
+import decoders # pylint: disable=wrong-import-position
+
+def crc16(data):
+    """Return the Modbus CRC of data, a bit at a time."""
+    crc = 0xffff
+    for byte in bytearray(data):
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+    return crc
+
+def rtu(data):
+    """Return data with its Modbus CRC appended."""
+    return data + struct.pack('<H', crc16(data))
+
+def cobs(data):
+    """Return data COBS encoded and zero delimited."""
+    out = bytearray()
+    block = bytearray()
+    for byte in bytearray(data):
+        if byte == 0:
+            out += bytearray([len(block) + 1]) + block
+            block = bytearray()
+        else:
+            block.append(byte)
+            if len(block) == 254:
+                out += bytearray([255]) + block
+                block = bytearray()
+    out += bytearray([len(block) + 1]) + block + b'\x00'
+    return bytes(out)
+
+def feed_bytes(decoder, data, stamp=0.0):
+    """Feed data one byte at a time and return every frame."""
+    frames = []
+    for pos in range(len(data)):
+        frames += decoder.feed(data[pos:pos + 1], stamp)
+    return frames
+
+class SlipTest(unittest.TestCase):
+    """SLIP frames are unescaped."""
+
+    def test_frames(self):
+        decoder = decoders.DECODERS['SLIP']()
+        frames = decoder.feed(b'\xc0ab\xdb\xdccd\xc0\xc0e\xdb\xddf\xc0g', 1.0)
+        self.assertEqual([(f.payload, f.info) for f in frames],
+                         [(b'ab\xc0cd', ''), (b'e\xdbf', '')])
+        self.assertEqual(frames[0].stamp, 1.0)
+        self.assertIsNone(frames[0].crc)
+        self.assertEqual(decoder.feed(b'h\xc0', 2.0)[0].payload, b'gh')
+
+    def test_split(self):
+        decoder = decoders.DECODERS['SLIP']()
+        frames = feed_bytes(decoder, b'ab\xdb\xdccd\xc0ef\xc0')
+        self.assertEqual([f.payload for f in frames], [b'ab\xc0cd', b'ef'])
+
+    def test_invalid_escape(self):
+        decoder = decoders.DECODERS['SLIP']()
+        frame, = decoder.feed(b'a\xdbb\xc0', 0.0)
+        self.assertEqual(frame.info, 'invalid escape')
+
+    def test_overrun(self):
+        decoder = decoders.DECODERS['SLIP']()
+        decoder.max_size = 100
+        self.assertEqual(decoder.feed(b'x' * 60, 0.0), [])
+        frame, = decoder.feed(b'x' * 60, 0.0)
+        self.assertTrue(frame.info.startswith('overrun, 120 bytes'))
+        self.assertEqual(len(decoder.buffer), 0)
+        frame, = decoder.feed(b'ok\xc0', 0.0)
+        self.assertEqual(frame.payload, b'ok')
+
+class CobsTest(unittest.TestCase):
+    """COBS frames are decoded, including zeros and long blocks."""
+
+    def test_frames(self):
+        payloads = [b'\x00', b'a\x00b\x00\x00c', b'\x11' * 300,
+                    b'\x22' * 254 + b'\x00\x33']
+        decoder = decoders.DECODERS['COBS']()
+        frames = decoder.feed(b''.join(cobs(p) for p in payloads), 0.0)
+        self.assertEqual([f.payload for f in frames], payloads)
+        self.assertEqual([f.info for f in frames], [''] * len(payloads))
+
+    def test_split(self):
+        decoder = decoders.DECODERS['COBS']()
+        frames = feed_bytes(decoder, cobs(b'ab\x00cd') + cobs(b'e'))
+        self.assertEqual([f.payload for f in frames], [b'ab\x00cd', b'e'])
+
+    def test_truncated(self):
+        decoder = decoders.DECODERS['COBS']()
+        frame, = decoder.feed(b'\x05ab\x00', 0.0)
+        self.assertEqual(frame.info, 'truncated block')
+
+class TlvTest(unittest.TestCase):
+    """TLV values are split by their length."""
+
+    def test_frames(self):
+        data = b'\x01\x00\x03abc\x02\x00\x00\x7f\x00\x02xy'
+        frames = feed_bytes(decoders.DECODERS['TLV'](), data)
+        self.assertEqual([(f.payload, f.info) for f in frames],
+                         [(b'abc', 'type 0x01'), (b'', 'type 0x02'),
+                          (b'xy', 'type 0x7f')])
+
+class ModbusRtuTest(unittest.TestCase):
+    """Modbus RTU frames end where their CRC checks."""
+
+    def test_frames(self):
+        request = rtu(b'\x11\x03\x00\x6b\x00\x03')
+        response = rtu(b'\x11\x03\x06\x02\x2b\x00\x00\x00\x64')
+        decoder = decoders.DECODERS['Modbus RTU']()
+        frames = decoder.feed(request + response, 0.0)
+        self.assertEqual([(f.payload, f.crc, f.info) for f in frames],
+                         [(request, True, 'addr 17 func 3'),
+                          (response, True, 'addr 17 func 3')])
+
+    def test_split(self):
+        request = rtu(b'\x01\x10\x00\x01\x00\x02\x04\x00\x0a\x01\x02')
+        decoder = decoders.DECODERS['Modbus RTU']()
+        frames = feed_bytes(decoder, request + rtu(b'\x01\x06\x00\x01\x00\x03'))
+        self.assertEqual([f.crc for f in frames], [True, True])
+        self.assertEqual(frames[0].payload, request)
+        self.assertEqual(frames[1].info, 'addr 1 func 6')
+
+    def test_gap(self):
+        good = rtu(b'\x02\x05\x00\xac\xff\x00')
+        decoder = decoders.DECODERS['Modbus RTU']()
+        self.assertEqual(decoder.feed(good[:-1], 1.0), [])
+        stale, frame = decoder.feed(good, 2.0)
+        self.assertEqual((stale.payload, stale.crc, stale.stamp),
+                         (good[:-1], False, 1.0))
+        # The partial frame doesn't spoil the next one.
+        self.assertEqual((frame.payload, frame.crc), (good, True))
+
+if __name__ == '__main__':
+    unittest.main()
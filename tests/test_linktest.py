@@ -0,0 +1,91 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Tests of the link test pattern checker over loop://.
+"""
+import os
+import sys
+import unittest
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tinycom'))
+
+import linktest # pylint: disable=wrong-import-position
+
+def loop(data):
+    """Send data through loop:// and return what comes back."""
+    port = serial.serial_for_url('loop://', timeout=1.0)
+    try:
+        port.write(data)
+        return port.read(len(data))
+    finally:
+        port.close()
+
+def check(name, data, chunk=1000):
+    """Return a PatternChecker fed data sent through loop:// in chunks."""
+    checker = linktest.PatternChecker(linktest.make_pattern(name))
+    received = loop(data)
+    for pos in range(0, len(received), chunk):
+        checker.feed(received[pos:pos + chunk], 0.0)
+    return checker
+
+class PatternTest(unittest.TestCase):
+    """Patterns repeat with the period of their polynomial."""
+
+    def test_periods(self):
+        self.assertEqual(len(linktest.make_pattern("PRBS-7")), 127)
+        self.assertEqual(len(linktest.make_pattern("PRBS-9")), 511)
+        self.assertEqual(len(linktest.make_pattern("PRBS-31")),
+                         linktest.MAX_PATTERN)
+        self.assertEqual(linktest.make_pattern("Counter")[:3], b'\x00\x01\x02')
+
+class CheckerTest(unittest.TestCase):
+    """Errors on the link are counted by kind."""
+
+    def setUp(self):
+        self.stream = linktest.make_pattern("PRBS-9") * 8
+
+    def assertCounts(self, checker, byte_errors=0, bit_errors=0, dropped=0,
+                     inserted=0):
+        self.assertTrue(checker.synced)
+        self.assertGreater(checker.checked, len(self.stream) // 2)
+        self.assertEqual((checker.byte_errors, checker.bit_errors,
+                          checker.dropped, checker.inserted),
+                         (byte_errors, bit_errors, dropped, inserted))
+
+    def test_clean(self):
+        checker = check("PRBS-9", self.stream)
+        self.assertCounts(checker)
+        self.assertEqual(checker.resyncs, 0)
+
+    def test_leading_garbage(self):
+        self.assertCounts(check("PRBS-9", b'junk' + self.stream, 7))
+
+    def test_bit_errors(self):
+        data = bytearray(self.stream)
+        for pos in (1000, 1500, 2500):
+            data[pos] ^= 0x10
+        data[3000] ^= 0x81
+        self.assertCounts(check("PRBS-9", bytes(data)), byte_errors=4,
+                          bit_errors=5)
+
+    def test_dropped(self):
+        checker = check("PRBS-9", self.stream[:2000] + self.stream[2010:])
+        self.assertCounts(checker, dropped=10)
+        self.assertEqual(checker.resyncs, 1)
+
+    def test_inserted(self):
+        checker = check("PRBS-9", self.stream[:2000] + b'\x55' * 7 +
+                        self.stream[2000:])
+        self.assertCounts(checker, inserted=7)
+        self.assertEqual(checker.resyncs, 1)
+
+    def test_counter(self):
+        stream = linktest.make_pattern("Counter") * 16
+        checker = check("Counter", stream[:1000] + stream[1003:], 256)
+        self.assertEqual(checker.dropped, 3)
+        self.assertEqual(checker.byte_errors, 0)
+
+if __name__ == '__main__':
+    unittest.main()
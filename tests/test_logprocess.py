@@ -0,0 +1,101 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Tests of the shared ring and commands to the log worker, without starting a
+worker.
+"""
+import os
+import sys
+import time
+import pickle
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tinycom'))
+
+import logprocess # pylint: disable=wrong-import-position
+
+class FakeProcess(object):
+    """A worker that is alive for a number of checks."""
+
+    def __init__(self, checks):
+        self.checks = checks
+
+    def is_alive(self):
+        self.checks -= 1
+        return self.checks >= 0
+
+class FakeSpace(object):
+    """Records whether the lock is held by waits for space that can block."""
+
+    def __init__(self, lock, on_wait=None):
+        self.lock = lock
+        self.on_wait = on_wait
+        self.locked = []
+
+    def clear(self):
+        pass
+
+    def set(self):
+        pass
+
+    def wait(self, timeout=None):
+        if timeout is not None and timeout <= 0:
+            return False
+        self.locked.append(self.lock.locked())
+        if self.on_wait is not None:
+            self.on_wait()
+        return False
+
+def full_process(checks):
+    """Return a LogProcess with a full ring and a fake worker."""
+    proc = logprocess.LogProcess.__new__(logprocess.LogProcess)
+    proc.ring = logprocess.SharedRing(logprocess._context(), 256) # pylint: disable=protected-access
+    proc.process = FakeProcess(checks)
+    proc.dropped = 0
+    proc._lock = threading.Lock() # pylint: disable=protected-access
+    while proc.ring.put(logprocess.DATA, b'x' * 16, 0.0, timeout=0.0):
+        pass
+    return proc
+
+class SharedRingTest(unittest.TestCase):
+    """Records come out as they went in, across the end of the buffer."""
+
+    def test_wrap(self):
+        ring = logprocess.SharedRing(logprocess._context(), 64) # pylint: disable=protected-access
+        for i in range(20):
+            data = b'%d' % i * 7
+            self.assertTrue(ring.put(logprocess.DATA, data, float(i), 0.0))
+            self.assertEqual(ring.get(), [(logprocess.DATA, data, float(i))])
+
+    def test_full(self):
+        ring = logprocess.SharedRing(logprocess._context(), 64) # pylint: disable=protected-access
+        self.assertTrue(ring.put(logprocess.DATA, b'x' * 40, 0.0, 0.0))
+        start = time.time()
+        self.assertFalse(ring.put(logprocess.DATA, b'x' * 40, 0.0, 0.0))
+        self.assertLess(time.time() - start, 0.05)
+
+class CommandTest(unittest.TestCase):
+    """Commands wait for space without holding the writers' lock."""
+
+    def test_worker_exits(self):
+        proc = full_process(3)
+        proc.ring.space = FakeSpace(proc._lock) # pylint: disable=protected-access
+        start = time.time()
+        self.assertFalse(proc.command('format', {}))
+        self.assertLess(time.time() - start, 0.05)
+        self.assertEqual(proc.ring.space.locked, [False] * 3)
+
+    def test_delivered_when_space(self):
+        proc = full_process(10)
+        proc.ring.space = FakeSpace(proc._lock, proc.ring.get) # pylint: disable=protected-access
+        self.assertTrue(proc.command('open', None))
+        self.assertEqual(proc.ring.space.locked, [False])
+        records = proc.ring.get()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0][0], logprocess.COMMAND)
+        self.assertEqual(pickle.loads(records[0][1]), ('open', None))
+
+if __name__ == '__main__':
+    unittest.main()
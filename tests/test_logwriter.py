@@ -0,0 +1,135 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Tests of log rotation, the segment index and compression.
+"""
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tinycom'))
+
+import logwriter # pylint: disable=wrong-import-position
+
+class LogWriterTest(unittest.TestCase):
+    """Logs are rotated into indexed segments."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'serial.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        """Return the contents of a segment or log file."""
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as handle:
+            return handle.read()
+
+    def test_no_rotation(self):
+        writer = logwriter.RotatingLogWriter(self.path)
+        for _ in range(10):
+            writer.write(u'0123456789\n')
+        writer.close()
+        self.assertEqual(self.read(self.path), b'0123456789\n' * 10)
+        self.assertEqual(logwriter.read_index(self.path), [])
+        self.assertEqual(logwriter.find_segments(self.path, 0, 1e12),
+                         [self.path])
+
+    def test_rotate_by_size(self):
+        writer = logwriter.RotatingLogWriter(self.path, max_bytes=20)
+        for line in range(7):
+            writer.write(u'line %d\xe9\n' % line)
+        writer.close()
+        index = logwriter.read_index(self.path)
+        self.assertEqual(len(index), 2)
+        for start, end, segment in index:
+            self.assertLessEqual(start, end)
+            self.assertTrue(segment.startswith(self.path + '.'))
+        self.assertEqual(index[0][1], index[1][0])
+        segments = logwriter.find_segments(self.path, 0, 1e12)
+        self.assertEqual(segments, [seg for _, _, seg in index] + [self.path])
+        self.assertEqual(b''.join(self.read(seg) for seg in segments),
+                         u''.join(u'line %d\xe9\n' % line
+                                  for line in range(7)).encode('utf-8'))
+
+    def test_find_segments(self):
+        with open(logwriter.index_path(self.path), 'w') as index:
+            index.write('100.0\t200.0\tserial.log.a\n')
+            index.write('not an entry\n')
+            index.write('200.0\t300.0\tserial.log.b.gz\n')
+        for name in ['serial.log.a', 'serial.log.b', 'serial.log']:
+            open(os.path.join(self.directory, name), 'w').close()
+        seg_a = os.path.join(self.directory, 'serial.log.a')
+        # Not compressed yet, so found by its original name.
+        seg_b = os.path.join(self.directory, 'serial.log.b')
+        self.assertEqual(logwriter.find_segments(self.path, 120, 150), [seg_a])
+        self.assertEqual(logwriter.find_segments(self.path, 150, 250),
+                         [seg_a, seg_b])
+        self.assertEqual(logwriter.find_segments(self.path, 250, 400),
+                         [seg_b, self.path])
+        self.assertEqual(logwriter.find_segments(self.path, 400, 500),
+                         [self.path])
+
+    def test_existing_log_is_a_segment(self):
+        with open(self.path, 'w') as handle:
+            handle.write('old\n')
+        writer = logwriter.RotatingLogWriter(self.path, max_bytes=1000)
+        writer.write(u'new\n')
+        writer.close()
+        (_, _, segment), = logwriter.read_index(self.path)
+        self.assertEqual(self.read(segment), b'old\n')
+        self.assertEqual(self.read(self.path), b'new\n')
+
+    def test_gzip(self):
+        errors = []
+        writer = logwriter.RotatingLogWriter(self.path, max_bytes=10,
+                                             compress='gzip',
+                                             on_error=errors.append)
+        compressor = writer.compressor
+        writer.write(u'first line\n')
+        writer.write(u'second line\n')
+        writer.close()
+        # Queued segments are still compressed after the log is closed.
+        compressor.join(10.0)
+        self.assertFalse(compressor.is_alive())
+        index = logwriter.read_index(self.path)
+        self.assertEqual([os.path.exists(seg) for _, _, seg in index],
+                         [True, True])
+        self.assertEqual([self.read(seg) for _, _, seg in index],
+                         [b'first line\n', b'second line\n'])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted([os.path.basename(seg) for _, _, seg in index] +
+                                ['serial.log', 'serial.log.index']))
+        self.assertEqual(errors, [])
+
+    def test_recover(self):
+        segment = self.path + '.20170101-000000'
+        with open(segment, 'w') as handle:
+            handle.write('left over\n')
+        with open(logwriter.index_path(self.path), 'w') as index:
+            index.write('1.0\t2.0\tserial.log.20170101-000000.gz\n')
+        writer = logwriter.RotatingLogWriter(self.path, compress='gzip')
+        compressor = writer.compressor
+        writer.close()
+        compressor.join(10.0)
+        self.assertFalse(os.path.exists(segment))
+        self.assertEqual(self.read(segment + '.gz'), b'left over\n')
+
+    def test_compress_error(self):
+        errors = []
+        compressor = logwriter.Compressor(errors.append)
+        compressor.start()
+        missing = os.path.join(self.directory, 'missing')
+        compressor.add(missing, 'gzip')
+        compressor.stop()
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("Can't compress %s: " % missing))
+
+if __name__ == '__main__':
+    unittest.main()
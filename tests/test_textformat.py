@@ -0,0 +1,55 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Tests of line timestamps in each newline mode.
+"""
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tinycom'))
+
+import transform # pylint: disable=wrong-import-position
+from textformat import TextFormatter # pylint: disable=wrong-import-position
+
+STAMP = re.compile(r'\[[0-9:.]+\] ')
+
+def format_chunks(newline, chunks):
+    """Format chunks with timestamps, with each timestamp shown as [t]."""
+    fmt = TextFormatter()
+    fmt.configure({'newline': newline, 'timestamps': True})
+    text = ''.join(fmt.format(chunk, 1.0) for chunk in chunks)
+    return STAMP.sub('[t] ', text)
+
+class NewlineModeTest(unittest.TestCase):
+    """A timestamp starts each line of the text shown, whatever the mode."""
+
+    def test_lf(self):
+        self.assertEqual(format_chunks(transform.LF, [b'abc\rdef\r\nghi\n']),
+                         u'[t] abcdef\n[t] ghi\n')
+
+    def test_cr(self):
+        self.assertEqual(format_chunks(transform.CR, [b'abc\n\rdef\n\r']),
+                         u'[t] abc\n[t] def\n')
+
+    def test_any(self):
+        self.assertEqual(format_chunks(transform.ANY,
+                                       [b'a\r\nb\rc\nd\r', b'\ne']),
+                         u'[t] a\n[t] b\n[t] c\n[t] d\n[t] e')
+
+    def test_as_received(self):
+        self.assertEqual(format_chunks(transform.AS_RECEIVED,
+                                       [b'abc\rdef\r\nghi\n']),
+                         u'[t] abc\rdef\r\n[t] ghi\n')
+
+    def test_change_mode(self):
+        fmt = TextFormatter()
+        fmt.configure({'newline': transform.CR, 'timestamps': True})
+        fmt.configure({'newline': transform.LF})
+        self.assertEqual(STAMP.sub('[t] ', fmt.format(b'a\rb\n', 1.0)),
+                         u'[t] ab\n')
+
+if __name__ == '__main__':
+    unittest.main()
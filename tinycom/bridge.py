@@ -0,0 +1,185 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Shares an open serial port with network clients over raw TCP or RFC 2217.
+"""
+import time
+import select
+import socket
+import threading
+
+# Default limit on data queued for a single client.
+MAX_QUEUE = 1024 * 1024
+
+# How often, in seconds, RFC 2217 clients are sent modem line changes.
+MODEM_POLL = 0.5
+
+IAC = b'\xff'
+
+class BridgeClient(object):
+    """A connected network client and the data queued for it."""
+
+    def __init__(self, sock, address, max_queue):
+        self.sock = sock
+        self.address = address
+        self.max_queue = max_queue
+        self.queue = bytearray()
+        self.dropped = 0
+        self.manager = None
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        """
+        Queue data for the client, from any thread.
+
+        If the client isn't keeping up and the queue is full, the data is
+        dropped whole, so one slow client never blocks the port or other
+        clients and never gets a partial telnet sequence.
+        """
+        with self._lock:
+            if len(self.queue) + len(data) > self.max_queue:
+                self.dropped += len(data)
+            else:
+                self.queue += data
+
+    def pending(self):
+        """Return True if data is queued."""
+        return len(self.queue) > 0
+
+    def flush(self):
+        """Send as much queued data as the socket will take."""
+        with self._lock:
+            sent = self.sock.send(self.queue)
+            del self.queue[:sent]
+
+class BridgeServer(threading.Thread):
+    """
+    TCP server that fans out data received from the serial port to all
+    clients and merges data from all clients into the serial port.
+
+    broadcast() is meant to be called from the serial port reader thread for
+    everything read.  Network IO all happens on this thread.  In RFC 2217
+    mode, clients can also change port settings and modem lines.
+    """
+
+    def __init__(self, serial_instance, write, port, host='127.0.0.1',
+                 rfc2217=False, max_queue=MAX_QUEUE):
+        super(BridgeServer, self).__init__()
+        self.daemon = True
+        self.serial = serial_instance
+        self.write = write
+        self.rfc2217 = rfc2217
+        self.max_queue = max_queue
+        self.clients = []
+        self.alive = True
+        self.error = None
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(5)
+        self.address = self.listener.getsockname()
+        try:
+            self._wake_r, self._wake_w = socket.socketpair()
+        except (AttributeError, OSError):
+            self._wake_r = self._wake_w = None
+
+    def wake(self):
+        """Wake the server thread up to send newly queued data."""
+        if self._wake_w is not None:
+            try:
+                self._wake_w.send(b'\0')
+            except socket.error:
+                pass
+
+    def stop(self):
+        """Stop the server, disconnect all clients and wait for the thread."""
+        self.alive = False
+        self.wake()
+        if self.is_alive():
+            self.join()
+        for client in list(self.clients):
+            self.drop(client)
+        self.listener.close()
+        if self._wake_r is not None:
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def broadcast(self, data, stamp=None):
+        """Queue data read from the serial port for all clients."""
+        _ = stamp
+        for client in self.clients:
+            if client.manager is not None:
+                # Same as PortManager.escape(), without a generator per byte.
+                client.write(data.replace(IAC, IAC + IAC))
+            else:
+                client.write(data)
+        self.wake()
+
+    def accept(self):
+        """Accept a new client."""
+        sock, address = self.listener.accept()
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = BridgeClient(sock, address, self.max_queue)
+        if self.rfc2217:
+            import serial.rfc2217
+            client.manager = serial.rfc2217.PortManager(self.serial, client)
+        self.clients = self.clients + [client]
+
+    def drop(self, client):
+        """Disconnect a client."""
+        self.clients = [c for c in self.clients if c is not client]
+        try:
+            client.sock.close()
+        except socket.error:
+            pass
+
+    def receive(self, client):
+        """Read data from a client and write it to the serial port."""
+        try:
+            data = client.sock.recv(4096)
+        except socket.error:
+            data = None
+        if not data:
+            self.drop(client)
+            return
+        if client.manager is not None:
+            data = b''.join(client.manager.filter(data))
+        if data:
+            self.write(data)
+
+    def run(self):
+        """Thread run loop."""
+        polled = time.time()
+        try:
+            while self.alive:
+                readers = [self.listener] + [c.sock for c in self.clients]
+                if self._wake_r is not None:
+                    readers.append(self._wake_r)
+                writers = [c.sock for c in self.clients if c.pending()]
+                readable, writable, _ = select.select(readers, writers, [],
+                                                      0.5)
+                socks = dict((c.sock, c) for c in self.clients)
+                for sock in readable:
+                    if sock is self.listener:
+                        self.accept()
+                    elif sock is self._wake_r:
+                        sock.recv(4096)
+                    elif sock in socks:
+                        self.receive(socks[sock])
+                for sock in writable:
+                    client = socks.get(sock)
+                    if client is None or client not in self.clients:
+                        continue
+                    try:
+                        client.flush()
+                    except socket.error:
+                        self.drop(client)
+                if time.time() - polled >= MODEM_POLL:
+                    polled = time.time()
+                    for client in self.clients:
+                        if client.manager is not None:
+                            client.manager.check_modem_lines()
+        except Exception as exp: # pylint: disable=broad-except
+            self.error = str(exp)
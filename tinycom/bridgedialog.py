@@ -0,0 +1,70 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Dialog for configuring the network bridge.
+"""
+from qt import *
+import guisave
+
+class BridgeDialog(QDialog):
+    """Network bridge settings dialog."""
+
+    controls = ["bridge_host", "bridge_port", "bridge_mode", "bridge_queue"]
+
+    def __init__(self, parent=None):
+        super(BridgeDialog, self).__init__(parent)
+        self.setWindowTitle("Network Bridge")
+
+        self.bridge_host = QLineEdit("127.0.0.1", self)
+        self.bridge_host.setObjectName("bridge_host")
+        self.bridge_host.setToolTip(
+            "Address to listen on.  Use 0.0.0.0 to accept clients from other"
+            " hosts.")
+        self.bridge_port = QSpinBox(self)
+        self.bridge_port.setObjectName("bridge_port")
+        self.bridge_port.setRange(1, 65535)
+        self.bridge_port.setValue(7000)
+        self.bridge_mode = QComboBox(self)
+        self.bridge_mode.setObjectName("bridge_mode")
+        self.bridge_mode.addItems(["Raw TCP", "RFC 2217"])
+        self.bridge_mode.setToolTip(
+            "RFC 2217 clients can also change port settings and modem lines.")
+        self.bridge_queue = QSpinBox(self)
+        self.bridge_queue.setObjectName("bridge_queue")
+        self.bridge_queue.setRange(16, 1024 * 1024)
+        self.bridge_queue.setValue(1024)
+        self.bridge_queue.setSuffix(" KB")
+        self.bridge_queue.setToolTip(
+            "Data queued for a client beyond this is dropped for that client.")
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok |
+                                   QDialogButtonBox.Cancel, parent=self)
+        layout = QFormLayout(self)
+        layout.addRow("Listen Address:", self.bridge_host)
+        layout.addRow("TCP Port:", self.bridge_port)
+        layout.addRow("Mode:", self.bridge_mode)
+        layout.addRow("Client Queue:", self.bridge_queue)
+        layout.addRow(buttons)
+
+        buttons.accepted.connect(self.onAccept)
+        buttons.rejected.connect(self.reject)
+
+        self.settings = QtCore.QSettings('tinycom', 'tinycom')
+        self.settings.beginGroup("bridgeDialog")
+        guisave.load(self, self.settings, self.controls)
+        self.settings.endGroup()
+
+    def getValues(self):
+        """Return a dictionary of BridgeServer arguments."""
+        return {'host':self.bridge_host.text(),
+                'port':self.bridge_port.value(),
+                'rfc2217':self.bridge_mode.currentIndex() == 1,
+                'max_queue':self.bridge_queue.value() * 1024}
+
+    def onAccept(self):
+        """Accept changes."""
+        self.settings.beginGroup("bridgeDialog")
+        guisave.save(self, self.settings, self.controls)
+        self.settings.endGroup()
+        self.accept()
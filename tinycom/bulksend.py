@@ -0,0 +1,161 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Sends a block of text, like a pasted config, paced so the target keeps up.
+"""
+import re
+import threading
+from qt import *
+from macros import LINE_ENDINGS
+
+# Only these end a line, unlike str.splitlines(), which also splits at form
+# feeds, vertical tabs and Unicode separators that a target sees as data.
+LINE_END = re.compile(u'\r\n|\r|\n')
+
+# How the block is split.
+LINES = 0
+CHUNKS = 1
+
+# What to wait for after each piece.
+WAIT_NONE = 0
+WAIT_PROMPT = 1
+WAIT_ECHO = 2
+
+def split_text(text, encoding, split=LINES, line_end=0, chunk_size=64):
+    """
+    Split text to the pieces to send, as bytes.
+
+    Lines are split at CR/LF, CR or LF, and sent with line_end, an index
+    into LINE_ENDINGS, in place of whatever line ends the text had.  Chunks
+    are sent as is.  Raises ValueError if the text can't be encoded.
+    """
+    try:
+        if split == CHUNKS:
+            raw = text.encode(encoding)
+            return [raw[i:i + chunk_size]
+                    for i in range(0, len(raw), chunk_size)]
+        lines = LINE_END.split(text)
+        if not lines[-1]:
+            # Like splitlines(), a final line end doesn't start a line.
+            lines.pop()
+        end = LINE_ENDINGS[line_end]
+        return [line.encode(encoding) + end for line in lines]
+    except UnicodeError as exp:
+        error = str(exp)
+    raise ValueError(error)
+
+class PromptWaiter(object):
+    """
+    Watches received data for a pattern.
+
+    feed() is a sink called with everything received.  arm() starts looking
+    for a pattern in what is received after it, and wait() blocks until it
+    is seen.  Arming before the write means a fast reply can't be missed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._pattern = None
+        self._seen = b''
+
+    def arm(self, pattern):
+        """Start looking for pattern in data received from now on."""
+        with self._lock:
+            self._pattern = pattern
+            self._seen = b''
+            self._event.clear()
+
+    def feed(self, data, unused_stamp=None):
+        """Look for the pattern in received data."""
+        _ = unused_stamp
+        with self._lock:
+            if self._pattern is None:
+                return
+            self._seen = self._seen + data
+            if self._pattern in self._seen:
+                self._pattern = None
+                self._seen = b''
+                self._event.set()
+            else:
+                # Only a partial match at the end can still complete.
+                self._seen = self._seen[-len(self._pattern):]
+
+    def wait(self, timeout):
+        """Wait for the pattern, returning False if it didn't show up."""
+        return self._event.wait(timeout)
+
+    def cancel(self):
+        """Wake up wait() without a match."""
+        self._event.set()
+
+class BulkSendThread(QtCore.QThread):
+    """
+    Sends pieces of a block with optional pacing.
+
+    After each piece, the thread waits for the prompt or the echo of the
+    piece, if asked to, and then for line_delay.  With char_delay, each
+    piece is written a byte at a time with that delay between bytes, for
+    targets without flow control and with a tiny FIFO.
+    """
+
+    progress = QtCore.pyqtSignal(int, int, name='progress')
+    sent = QtCore.pyqtSignal(bytes, name='sent')
+    send_error = QtCore.pyqtSignal(str, name='send_error')
+
+    def __init__(self, pieces, write, waiter, wait=WAIT_NONE, prompt=b'',
+                 timeout=1.0, line_delay=0.0, char_delay=0.0):
+        super(BulkSendThread, self).__init__()
+        self.pieces = pieces
+        self.write = write
+        self.waiter = waiter
+        self.wait_for = wait
+        self.prompt = prompt
+        self.timeout = timeout
+        self.line_delay = line_delay
+        self.char_delay = char_delay
+        self.timeouts = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Stop sending and wait for the thread to finish."""
+        self._stopped.set()
+        self.waiter.cancel()
+        self.wait()
+
+    def send(self, raw):
+        """Write one piece, a byte at a time if there's a char_delay."""
+        if not self.char_delay:
+            self.write(raw)
+            return True
+        for i in range(len(raw)):
+            if i and self._stopped.wait(self.char_delay):
+                return False
+            self.write(raw[i:i + 1])
+        return True
+
+    def run(self):
+        """Thread run loop."""
+        total = len(self.pieces)
+        for index, raw in enumerate(self.pieces):
+            if self._stopped.is_set():
+                return
+            if self.wait_for == WAIT_PROMPT:
+                self.waiter.arm(self.prompt)
+            elif self.wait_for == WAIT_ECHO:
+                self.waiter.arm(raw.rstrip(b'\r\n') or raw)
+            try:
+                complete = self.send(raw)
+            except Exception as exp: # pylint: disable=broad-except
+                self.send_error.emit(str(exp))
+                return
+            if not complete:
+                return
+            self.sent.emit(raw)
+            self.progress.emit(index + 1, total)
+            if self.wait_for != WAIT_NONE and \
+               not self.waiter.wait(self.timeout):
+                self.timeouts += 1
+            if self.line_delay and self._stopped.wait(self.line_delay):
+                return
@@ -0,0 +1,165 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Dialog for sending a block of text.
+"""
+import codecs
+from qt import *
+import guisave
+import bulksend
+from macrodialog import LINE_END_NAMES
+
+def open_text(parent, title):
+    """Ask for a text file and return its contents, or None."""
+    path = QFileDialog.getOpenFileName(parent, title)
+    if isinstance(path, tuple):
+        path = path[0]
+    if not path:
+        return None
+    try:
+        with codecs.open(path, 'r', encoding='utf-8',
+                         errors='replace') as handle:
+            return handle.read()
+    except (IOError, OSError) as exp:
+        QtGui.QMessageBox.critical(parent, title, str(exp))
+    return None
+
+class BulkSendDialog(QDialog):
+    """Bulk text send dialog."""
+
+    controls = ["bulk_split", "bulk_chunk", "bulk_line_end", "bulk_wait",
+                "bulk_prompt", "bulk_timeout", "bulk_line_delay",
+                "bulk_char_delay"]
+
+    def __init__(self, text="", parent=None):
+        super(BulkSendDialog, self).__init__(parent)
+        self.setWindowTitle("Send Text")
+
+        self.text = QPlainTextEdit(self)
+        self.text.setPlainText(text)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        btn_open = QPushButton("Open File...", self)
+        self.info = QLabel(self)
+
+        self.bulk_split = QComboBox(self)
+        self.bulk_split.setObjectName("bulk_split")
+        self.bulk_split.addItems(["Lines", "Chunks"])
+        self.bulk_chunk = QSpinBox(self)
+        self.bulk_chunk.setObjectName("bulk_chunk")
+        self.bulk_chunk.setRange(1, 65536)
+        self.bulk_chunk.setValue(64)
+        self.bulk_chunk.setSuffix(" bytes")
+        self.bulk_line_end = QComboBox(self)
+        self.bulk_line_end.setObjectName("bulk_line_end")
+        self.bulk_line_end.addItems(LINE_END_NAMES)
+        self.bulk_line_end.setToolTip(
+            "Line ending sent after each line, in place of the line endings"
+            " in the text.")
+        self.bulk_wait = QComboBox(self)
+        self.bulk_wait.setObjectName("bulk_wait")
+        self.bulk_wait.addItems(["Nothing", "Prompt", "Echo"])
+        self.bulk_wait.setToolTip(
+            "After sending each line or chunk, wait until the prompt or the"
+            " echo of what was sent is received.")
+        self.bulk_prompt = QLineEdit("> ", self)
+        self.bulk_prompt.setObjectName("bulk_prompt")
+        self.bulk_timeout = QSpinBox(self)
+        self.bulk_timeout.setObjectName("bulk_timeout")
+        self.bulk_timeout.setRange(1, 600000)
+        self.bulk_timeout.setValue(2000)
+        self.bulk_timeout.setSuffix(" ms")
+        self.bulk_timeout.setToolTip(
+            "How long to wait for the prompt or echo before sending anyway.")
+        self.bulk_line_delay = QSpinBox(self)
+        self.bulk_line_delay.setObjectName("bulk_line_delay")
+        self.bulk_line_delay.setRange(0, 600000)
+        self.bulk_line_delay.setSuffix(" ms")
+        self.bulk_char_delay = QSpinBox(self)
+        self.bulk_char_delay.setObjectName("bulk_char_delay")
+        self.bulk_char_delay.setRange(0, 10000)
+        self.bulk_char_delay.setSuffix(" ms")
+        self.bulk_char_delay.setToolTip(
+            "Delay between characters, for targets with a small receive FIFO"
+            " and no flow control.")
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok |
+                                   QDialogButtonBox.Cancel, parent=self)
+        buttons.button(QDialogButtonBox.Ok).setText("Send")
+
+        top = QHBoxLayout()
+        top.addWidget(self.info)
+        top.addStretch()
+        top.addWidget(btn_open)
+        form = QFormLayout()
+        form.addRow("Send As:", self.bulk_split)
+        form.addRow("Chunk Size:", self.bulk_chunk)
+        form.addRow("Line End:", self.bulk_line_end)
+        form.addRow("Wait For:", self.bulk_wait)
+        form.addRow("Prompt:", self.bulk_prompt)
+        form.addRow("Wait Timeout:", self.bulk_timeout)
+        form.addRow("Delay After Each:", self.bulk_line_delay)
+        form.addRow("Delay Between Characters:", self.bulk_char_delay)
+        layout = QVBoxLayout(self)
+        layout.addLayout(top)
+        layout.addWidget(self.text)
+        layout.addLayout(form)
+        layout.addWidget(buttons)
+
+        btn_open.clicked.connect(self.onOpen)
+        self.text.textChanged.connect(self.updateInfo)
+        self.bulk_split.currentIndexChanged.connect(self.updateEnabled)
+        self.bulk_wait.currentIndexChanged.connect(self.updateEnabled)
+        buttons.accepted.connect(self.onAccept)
+        buttons.rejected.connect(self.reject)
+        self.resize(640, 560)
+
+        self.settings = QtCore.QSettings('tinycom', 'tinycom')
+        self.settings.beginGroup("bulkSendDialog")
+        guisave.load(self, self.settings, self.controls)
+        self.settings.endGroup()
+        self.updateEnabled()
+        self.updateInfo()
+
+    def onOpen(self):
+        """Open file button clicked."""
+        text = open_text(self, 'Open File')
+        if text is not None:
+            self.text.setPlainText(text)
+
+    def updateEnabled(self):
+        """Enable only the options that apply."""
+        chunks = self.bulk_split.currentIndex() == bulksend.CHUNKS
+        self.bulk_chunk.setEnabled(chunks)
+        self.bulk_line_end.setEnabled(not chunks)
+        wait = self.bulk_wait.currentIndex()
+        self.bulk_prompt.setEnabled(wait == bulksend.WAIT_PROMPT)
+        self.bulk_timeout.setEnabled(wait != bulksend.WAIT_NONE)
+
+    def updateInfo(self):
+        """Show the size of the text."""
+        document = self.text.document()
+        self.info.setText("%d lines, %d characters" %
+                          (document.blockCount(), document.characterCount()))
+
+    def getPieces(self, encoding):
+        """Return the text split into the pieces to send, as bytes."""
+        return bulksend.split_text(self.text.toPlainText(), encoding,
+                                   self.bulk_split.currentIndex(),
+                                   self.bulk_line_end.currentIndex(),
+                                   self.bulk_chunk.value())
+
+    def getValues(self, encoding):
+        """Return a dictionary of BulkSendThread pacing arguments."""
+        return {'wait':self.bulk_wait.currentIndex(),
+                'prompt':self.bulk_prompt.text().encode(encoding),
+                'timeout':self.bulk_timeout.value() / 1000.,
+                'line_delay':self.bulk_line_delay.value() / 1000.,
+                'char_delay':self.bulk_char_delay.value() / 1000.}
+
+    def onAccept(self):
+        """Accept changes."""
+        self.settings.beginGroup("bulkSendDialog")
+        guisave.save(self, self.settings, self.controls)
+        self.settings.endGroup()
+        self.accept()
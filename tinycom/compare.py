@@ -0,0 +1,198 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Line by line comparison of two streams, like the console of a new board
+and a known good one.
+
+Lines are aligned as they arrive.  Only lines not yet aligned are kept, at
+most a window of them on each side, so a comparison can run for hours in
+bounded memory.  When the streams diverge, the closest point where they
+agree again is looked for within the window; until one is found, or the
+window fills, lines wait.
+"""
+import re
+import threading
+import transform
+
+# Kinds of aligned lines.
+SAME = 0
+CHANGED = 1
+A_ONLY = 2
+B_ONLY = 3
+
+# Default lines of each stream waiting to be aligned.
+WINDOW = 500
+
+# Lines that must agree to take a point as where the streams agree again.
+SYNC = 2
+
+# Positions of a repeated line, like an empty one, looked at when searching.
+MAX_CANDIDATES = 8
+
+class LiveStream(object):
+    """
+    Lines received from a port.
+
+    feed() is a sink called on the serial thread, and take() is called on
+    the GUI thread.
+    """
+
+    def __init__(self, encoding="UTF-8"):
+        self.rx = transform.RxTransform(encoding, transform.ANY,
+                                        remove_escape=True)
+        self.partial = u''
+        self.chunks = []
+        self._lock = threading.Lock()
+
+    def feed(self, data, unused_stamp=None):
+        """Queue received data."""
+        _ = unused_stamp
+        with self._lock:
+            self.chunks.append(data)
+
+    def take(self, unused_room=None):
+        """
+        Return the complete lines received since the last call.  Live lines
+        are returned whatever the room, since holding them back here would
+        only move where they are kept.
+        """
+        _ = unused_room
+        with self._lock:
+            chunks = self.chunks
+            self.chunks = []
+        if not chunks:
+            return []
+        lines = (self.partial + self.rx(b''.join(chunks))).split(u'\n')
+        self.partial = lines.pop()
+        return lines
+
+class CaptureStream(object):
+    """Lines of a recorded capture, handed out as there is room for them."""
+
+    def __init__(self, text):
+        self.lines = text.splitlines()
+        self.pos = 0
+
+    def take(self, room):
+        """Return up to room more lines."""
+        lines = self.lines[self.pos:self.pos + max(room, 0)]
+        self.pos += len(lines)
+        return lines
+
+    def done(self):
+        """Return True if every line was taken."""
+        return self.pos >= len(self.lines)
+
+class IncrementalDiff(object):
+    """
+    Aligns two streams of lines as they arrive.
+
+    add() returns the lines it could align as a list of (kind, a, b), where
+    a or b is None for a line only in one stream.  ignore is a regular
+    expression for parts of lines, like timestamps, that don't count.
+    """
+
+    def __init__(self, window=WINDOW, ignore=None):
+        self.window = window
+        self.ignore = re.compile(ignore) if ignore else None
+        self.a = []
+        self.b = []
+        self.counts = [0, 0, 0, 0]
+
+    def key(self, line):
+        """Return the part of a line that is compared."""
+        if self.ignore is None:
+            return line
+        return self.ignore.sub(u'', line)
+
+    def room(self):
+        """Return how many more lines of b fit in the window."""
+        return self.window - len(self.b)
+
+    def add(self, a_lines, b_lines, final=False):
+        """
+        Add new lines of each stream and return what can be aligned.  With
+        final, nothing more is coming, so everything is aligned.
+        """
+        self.a.extend((self.key(line), line) for line in a_lines)
+        self.b.extend((self.key(line), line) for line in b_lines)
+        ops = []
+        a = self.a
+        b = self.b
+        i = 0
+        j = 0
+        while True:
+            # The common case of lines that agree, without searching.
+            while i < len(a) and j < len(b) and a[i][0] == b[j][0]:
+                ops.append((SAME, a[i][1], b[j][1]))
+                i += 1
+                j += 1
+            if i < len(a) and j < len(b):
+                anchor = self.search(a, i, b, j, final)
+                if anchor is None:
+                    full = len(a) - i >= self.window or \
+                           len(b) - j >= self.window
+                    if not full and not final:
+                        break
+                    # Nowhere to agree again within the window.
+                    anchor = (i + 1, j + 1)
+                ai, bj = anchor
+                while i < ai and j < bj:
+                    ops.append((CHANGED, a[i][1], b[j][1]))
+                    i += 1
+                    j += 1
+                while i < ai:
+                    ops.append((A_ONLY, a[i][1], None))
+                    i += 1
+                while j < bj:
+                    ops.append((B_ONLY, None, b[j][1]))
+                    j += 1
+                continue
+            # One side is waiting for the other.
+            if final:
+                ops.extend((A_ONLY, line, None) for _, line in a[i:])
+                ops.extend((B_ONLY, None, line) for _, line in b[j:])
+                i = len(a)
+                j = len(b)
+            else:
+                while len(a) - i > self.window:
+                    ops.append((A_ONLY, a[i][1], None))
+                    i += 1
+                while len(b) - j > self.window:
+                    ops.append((B_ONLY, None, b[j][1]))
+                    j += 1
+            break
+        del a[:i]
+        del b[:j]
+        for op in ops:
+            self.counts[op[0]] += 1
+        return ops
+
+    def search(self, a, i, b, j, final):
+        """
+        Return the closest (ai, bj) past a diverged a[i] and b[j] where SYNC
+        lines agree, or None to wait for more lines.
+        """
+        positions = {}
+        for pos in range(j, len(b)):
+            found = positions.setdefault(b[pos][0], [])
+            if len(found) < MAX_CANDIDATES:
+                found.append(pos)
+        candidates = []
+        for ai in range(i, len(a)):
+            for bj in positions.get(a[ai][0], ()):
+                candidates.append((ai - i + bj - j, ai, bj))
+        candidates.sort()
+        for _, ai, bj in candidates:
+            run = 0
+            while run < SYNC and ai + run < len(a) and bj + run < len(b) and \
+                  a[ai + run][0] == b[bj + run][0]:
+                run += 1
+            if run >= SYNC:
+                return (ai, bj)
+            if ai + run >= len(a) or bj + run >= len(b):
+                # Agrees as far as there are lines, so wait to be sure,
+                # unless nothing more is coming.
+                return (ai, bj) if final else None
+        return None
@@ -0,0 +1,193 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Dock that shows two streams side by side, aligned by line.
+"""
+from qt import *
+import compare
+
+# Oldest lines are dropped from the panes once there are more than this many.
+MAX_LINES = 20000
+
+# Alignment updates per second.
+UPDATE_RATE = 10
+
+SOURCES = ["Another Port...", "Capture File..."]
+PORT = 0
+CAPTURE = 1
+
+class CompareDock(QDockWidget):
+    """
+    Compare controls and the two panes.
+
+    Starting a comparison needs the ports, so the main window handles
+    btn_start and calls start() and finish().
+    """
+
+    def __init__(self, parent=None):
+        super(CompareDock, self).__init__("Compare", parent)
+        self.setObjectName("compare_dock")
+        self.a = None
+        self.b = None
+        self.diff = None
+        self.empty = [True, True]
+
+        widget = QWidget(self)
+        self.source = QComboBox(widget)
+        self.source.addItems(SOURCES)
+        self.source.setToolTip("What to compare the open port with.")
+        self.ignore = QLineEdit(widget)
+        self.ignore.setPlaceholderText(r"Like ^\[[0-9:.]+\] for timestamps")
+        self.ignore.setToolTip(
+            "Regular expression for parts of lines that don't count, like"
+            " timestamps, addresses or serial numbers.")
+        self.window_lines = QSpinBox(widget)
+        self.window_lines.setRange(10, 100000)
+        self.window_lines.setValue(compare.WINDOW)
+        self.window_lines.setSuffix(" lines")
+        self.window_lines.setToolTip(
+            "How far apart lines can be and still be aligned.  Lines waiting"
+            " to be aligned are kept, at most this many from each stream.")
+        self.btn_start = QPushButton("Start", widget)
+        self.btn_start.setCheckable(True)
+        self.status = QLabel(widget)
+
+        self.panes = []
+        self.titles = []
+        splitter = QSplitter(QtCore.Qt.Horizontal, widget)
+        font = QFont("Monospace")
+        font.setStyleHint(QFont.TypeWriter)
+        for title in ["This Port", "Other"]:
+            pane = QWidget(splitter)
+            label = QLabel(title, pane)
+            text = QPlainTextEdit(pane)
+            text.setReadOnly(True)
+            text.setLineWrapMode(QPlainTextEdit.NoWrap)
+            text.setMaximumBlockCount(MAX_LINES)
+            text.setFont(font)
+            layout = QVBoxLayout(pane)
+            layout.setContentsMargins(0, 0, 0, 0)
+            layout.addWidget(label)
+            layout.addWidget(text)
+            splitter.addWidget(pane)
+            self.titles.append(label)
+            self.panes.append(text)
+        left = self.panes[0].verticalScrollBar()
+        right = self.panes[1].verticalScrollBar()
+        left.valueChanged.connect(right.setValue)
+        right.valueChanged.connect(left.setValue)
+
+        self.formats = {}
+        for name, color in [("changed", QColor(255, 255, 180)),
+                            ("only", QColor(255, 200, 200)),
+                            ("missing", QColor(220, 220, 220))]:
+            block = QTextBlockFormat()
+            block.setBackground(QBrush(color))
+            self.formats[name] = block
+        self.formats["same"] = QTextBlockFormat()
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Compare With:", widget))
+        top.addWidget(self.source)
+        top.addWidget(QLabel("Ignore:", widget))
+        top.addWidget(self.ignore)
+        top.addWidget(QLabel("Window:", widget))
+        top.addWidget(self.window_lines)
+        top.addWidget(self.btn_start)
+        layout = QVBoxLayout(widget)
+        layout.addLayout(top)
+        layout.addWidget(splitter)
+        layout.addWidget(self.status)
+        self.setWidget(widget)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.updateDiff)
+
+    def start(self, a, b, diff, title):
+        """Show a comparison of stream a, this port, with stream b."""
+        self.a = a
+        self.b = b
+        self.diff = diff
+        for pane in self.panes:
+            pane.clear()
+        self.empty = [True, True]
+        self.titles[1].setText(title)
+        self.source.setEnabled(False)
+        self.ignore.setEnabled(False)
+        self.window_lines.setEnabled(False)
+        self.btn_start.setText("Stop")
+        self.timer.start(1000 // UPDATE_RATE)
+        self.updateStatus()
+
+    def finish(self):
+        """The comparison stopped, so align what's left."""
+        self.timer.stop()
+        if self.diff is not None:
+            self.updateDiff(final=True)
+        self.a = None
+        self.b = None
+        self.diff = None
+        self.source.setEnabled(True)
+        self.ignore.setEnabled(True)
+        self.window_lines.setEnabled(True)
+        self.btn_start.setText("Start")
+
+    def updateDiff(self, final=False):
+        """Align the lines that arrived since the last update."""
+        ops = self.diff.add(self.a.take(self.diff.window),
+                            self.b.take(self.diff.room()), final)
+        if ops:
+            self.addOps(ops)
+        self.updateStatus()
+
+    def addOps(self, ops):
+        """Append aligned lines to the panes."""
+        scrollbar = self.panes[0].verticalScrollBar()
+        at_end = scrollbar.value() == scrollbar.maximum()
+        left = []
+        right = []
+        for kind, a, b in ops:
+            if kind == compare.SAME:
+                left.append((a, "same"))
+                right.append((b, "same"))
+            elif kind == compare.CHANGED:
+                left.append((a, "changed"))
+                right.append((b, "changed"))
+            elif kind == compare.A_ONLY:
+                left.append((a, "only"))
+                right.append(("", "missing"))
+            else:
+                left.append(("", "missing"))
+                right.append((b, "only"))
+        self.append(0, left)
+        self.append(1, right)
+        if at_end:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def append(self, index, lines):
+        """Append (text, format name) lines to a pane in one edit."""
+        cursor = QTextCursor(self.panes[index].document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        for text, name in lines:
+            if self.empty[index]:
+                # An empty document already has the first block.
+                cursor.setBlockFormat(self.formats[name])
+                self.empty[index] = False
+            else:
+                cursor.insertBlock(self.formats[name])
+            cursor.insertText(text)
+        cursor.endEditBlock()
+
+    def updateStatus(self):
+        """Show the counts of aligned lines."""
+        if self.diff is None:
+            return
+        counts = self.diff.counts
+        self.status.setText(
+            "%d same, %d changed, %d only here, %d only in other,"
+            " %d and %d waiting" %
+            (counts[compare.SAME], counts[compare.CHANGED],
+             counts[compare.A_ONLY], counts[compare.B_ONLY],
+             len(self.diff.a), len(self.diff.b)))
@@ -0,0 +1,269 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Streaming decoders for binary framed protocols.
+
+A decoder is a state machine that is fed raw bytes as they are received and
+returns any frames completed by them.  Decoders are registered by name with
+the register() decorator.  Other packages can provide decoders with a
+'tinycom.decoders' setuptools entry point that refers to a Decoder subclass.
+"""
+import struct
+import collections
+
+class Frame(collections.namedtuple('Frame',
+                                   ['stamp', 'payload', 'crc', 'info'])):
+    """
+    A decoded frame.
+
+    crc is True or False if the protocol has a checksum and it was checked,
+    or None if the protocol has none.  info is a short protocol specific
+    description.
+    """
+    __slots__ = ()
+
+DECODERS = collections.OrderedDict()
+
+def register(cls):
+    """Class decorator to register a decoder by its name."""
+    DECODERS[cls.name] = cls
+    return cls
+
+def load_plugins():
+    """
+    Register decoders provided by installed packages.
+
+    Returns a list of "name: error" for the plugins that failed to load.
+    """
+    errors = []
+    try:
+        import pkg_resources
+    except ImportError:
+        return errors
+    for entry in pkg_resources.iter_entry_points('tinycom.decoders'):
+        try:
+            register(entry.load())
+        except Exception as exp: # pylint: disable=broad-except
+            errors.append('%s: %s' % (entry.name, exp))
+    return errors
+
+class Decoder(object):
+    """Base class for decoders."""
+
+    name = None
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def reset(self):
+        """Discard any partial frame."""
+        del self.buffer[:]
+
+    def feed(self, data, stamp):
+        """Feed received data, returning a list of completed Frames."""
+        raise NotImplementedError
+
+class DelimitedDecoder(Decoder):
+    """
+    Base class for protocols where frames are separated by a delimiter.
+
+    A partial frame that grows past max_size, like when the stream isn't
+    framed with this protocol at all, is dropped and reported as an overrun
+    frame, so it can't hold on to everything received.
+    """
+
+    delimiter = None
+    max_size = 64 * 1024
+
+    def __init__(self):
+        super(DelimitedDecoder, self).__init__()
+        self.scanned = 0
+
+    def reset(self):
+        super(DelimitedDecoder, self).reset()
+        self.scanned = 0
+
+    def feed(self, data, stamp):
+        self.buffer += data
+        buf = self.buffer
+        view = memoryview(buf)
+        frames = []
+        pos = 0
+        # The partial frame was already searched for a delimiter.
+        end = buf.find(self.delimiter, self.scanned)
+        while end != -1:
+            if end > pos:
+                frames.append(self.decode(view[pos:end], stamp))
+            pos = end + 1
+            end = buf.find(self.delimiter, pos)
+        # The buffer can't be resized while viewed, and Python 2 has no
+        # memoryview.release().
+        del view
+        if pos:
+            del buf[:pos]
+        if len(buf) > self.max_size:
+            frames.append(Frame(stamp, b'', None,
+                                'overrun, %d bytes without a delimiter '
+                                'dropped' % len(buf)))
+            del buf[:]
+        self.scanned = len(buf)
+        return frames
+
+    def decode(self, view, stamp):
+        """Decode the bytes between two delimiters into a Frame."""
+        raise NotImplementedError
+
+@register
+class SlipDecoder(DelimitedDecoder):
+    """SLIP (RFC 1055)."""
+
+    name = 'SLIP'
+    delimiter = b'\xc0'
+
+    def decode(self, view, stamp):
+        raw = view.tobytes()
+        escapes = raw.count(b'\xdb')
+        payload = raw.replace(b'\xdb\xdc', b'\xc0')
+        escapes -= len(raw) - len(payload)
+        if escapes:
+            size = len(payload)
+            payload = payload.replace(b'\xdb\xdd', b'\xdb')
+            escapes -= size - len(payload)
+        info = 'invalid escape' if escapes else ''
+        return Frame(stamp, payload, None, info)
+
+@register
+class CobsDecoder(DelimitedDecoder):
+    """Consistent Overhead Byte Stuffing, with zero delimited frames."""
+
+    name = 'COBS'
+    delimiter = b'\x00'
+
+    def decode(self, view, stamp):
+        payload = bytearray()
+        size = len(view)
+        pos = 0
+        info = ''
+        # Copy a block at a time, not a byte at a time.
+        while pos < size:
+            code = view[pos]
+            if not isinstance(code, int):
+                code = ord(code)
+            end = pos + code
+            if end > size:
+                info = 'truncated block'
+                payload += view[pos + 1:]
+                break
+            payload += view[pos + 1:end]
+            pos = end
+            if code != 0xff and pos < size:
+                payload.append(0)
+        return Frame(stamp, bytes(payload), None, info)
+
+@register
+class TlvDecoder(Decoder):
+    """
+    Length prefixed TLV: a one byte type and a two byte big endian length
+    followed by the value.
+    """
+
+    name = 'TLV'
+    header = struct.Struct('>BH')
+
+    def feed(self, data, stamp):
+        self.buffer += data
+        buf = self.buffer
+        frames = []
+        pos = 0
+        hsize = self.header.size
+        while len(buf) - pos >= hsize:
+            kind, length = self.header.unpack_from(buf, pos)
+            end = pos + hsize + length
+            if end > len(buf):
+                break
+            frames.append(Frame(stamp, bytes(buf[pos + hsize:end]), None,
+                                'type 0x%02x' % kind))
+            pos = end
+        if pos:
+            del buf[:pos]
+        return frames
+
+def _crc16_table():
+    """Build the lookup table for the reflected 0xA001 CRC-16."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+_CRC16 = _crc16_table()
+
+@register
+class ModbusRtuDecoder(Decoder):
+    """
+    Modbus RTU.
+
+    A running CRC is kept over the bytes of the current frame.  The CRC of a
+    frame including its own trailing CRC is zero, which marks the end of the
+    frame without needing to know the length of every function code.  Bytes
+    left over when the line goes idle for longer than gap seconds are
+    reported as a frame with a bad CRC.
+    """
+
+    name = 'Modbus RTU'
+    gap = 0.5
+    min_size = 4
+    max_size = 256
+
+    def __init__(self):
+        super(ModbusRtuDecoder, self).__init__()
+        self.crc = 0xffff
+        self.last = None
+
+    def reset(self):
+        super(ModbusRtuDecoder, self).reset()
+        self.crc = 0xffff
+        self.last = None
+
+    def frame(self, payload, crc, stamp):
+        """Build a Frame from a complete RTU frame."""
+        info = ''
+        if len(payload) >= 2:
+            info = 'addr %d func %d' % (payload[0], payload[1])
+        return Frame(stamp, bytes(payload), crc, info)
+
+    def feed(self, data, stamp):
+        frames = []
+        buf = self.buffer
+        if buf and self.last is not None and stamp - self.last > self.gap:
+            frames.append(self.frame(buf, False, self.last))
+            self.reset()
+        self.last = stamp
+        table = _CRC16
+        crc = self.crc
+        start = len(buf)
+        buf += data
+        min_size = self.min_size
+        max_size = self.max_size
+        pos = start
+        size = len(buf)
+        first = 0
+        while pos < size:
+            crc = (crc >> 8) ^ table[(crc ^ buf[pos]) & 0xff]
+            pos += 1
+            length = pos - first
+            if crc == 0 and length >= min_size:
+                frames.append(self.frame(buf[first:pos], True, stamp))
+                first = pos
+                crc = 0xffff
+            elif length >= max_size:
+                frames.append(self.frame(buf[first:pos], False, stamp))
+                first = pos
+                crc = 0xffff
+        if first:
+            del buf[:first]
+        self.crc = crc
+        return frames
@@ -0,0 +1,164 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Table view of frames decoded from the received data.
+"""
+import binascii
+from qt import *
+import decoders
+from lineframer import format_stamp
+
+# Oldest frames are dropped once there are more than this many.
+MAX_FRAMES = 100000
+
+# Only this many payload bytes are shown in the table.
+MAX_DATA = 64
+
+class FrameModel(QtCore.QAbstractTableModel):
+    """Table model of decoded frames."""
+
+    headers = ["Time", "Length", "Info", "CRC", "Data"]
+
+    def __init__(self, parent=None):
+        super(FrameModel, self).__init__(parent)
+        self.frames = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.frames)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and \
+           orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        frame = self.frames[index.row()]
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if column == 0:
+                return format_stamp(frame.stamp)
+            elif column == 1:
+                return len(frame.payload)
+            elif column == 2:
+                return frame.info
+            elif column == 3:
+                return {None: "", True: "OK", False: "BAD"}[frame.crc]
+            elif column == 4:
+                text = binascii.hexlify(frame.payload[:MAX_DATA]).decode()
+                text = ' '.join(text[i:i+2] for i in range(0, len(text), 2))
+                if len(frame.payload) > MAX_DATA:
+                    text += ' ...'
+                return text
+        elif role == QtCore.Qt.BackgroundRole and frame.crc is False:
+            return QBrush(QColor(255, 200, 200))
+        return None
+
+    def append(self, frames):
+        """Append frames to the end of the table."""
+        first = len(self.frames)
+        self.beginInsertRows(QtCore.QModelIndex(), first,
+                             first + len(frames) - 1)
+        self.frames.extend(frames)
+        self.endInsertRows()
+        extra = len(self.frames) - MAX_FRAMES
+        if extra > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, extra - 1)
+            del self.frames[:extra]
+            self.endRemoveRows()
+
+    def clear(self):
+        """Remove all frames."""
+        self.beginResetModel()
+        self.frames = []
+        self.endResetModel()
+
+class DecoderDock(QDockWidget):
+    """Dock that decodes received data with a selected protocol decoder."""
+
+    def __init__(self, parent=None):
+        super(DecoderDock, self).__init__("Protocol Decoder", parent)
+        self.setObjectName("decoder_dock")
+        self.decoder = None
+
+        errors = decoders.load_plugins()
+
+        widget = QWidget(self)
+        self.protocol = QComboBox(widget)
+        self.protocol.setObjectName("decoder_protocol")
+        self.protocol.setToolTip("Protocol to decode received data with.")
+        self.protocol.addItems(list(decoders.DECODERS.keys()))
+        self.btn_clear = QPushButton("Clear", widget)
+        self.follow = QCheckBox("Follow", widget)
+        self.follow.setChecked(True)
+        self.model = FrameModel(self)
+        self.table = QTableView(widget)
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.plugin_errors = QLabel(widget)
+        self.plugin_errors.setStyleSheet("color: rgb(255, 0, 0);")
+        self.plugin_errors.setWordWrap(True)
+        self.plugin_errors.setText("Decoder plugins that failed to load:\n" +
+                                   "\n".join(errors))
+        self.plugin_errors.setVisible(bool(errors))
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Protocol:", widget))
+        top.addWidget(self.protocol)
+        top.addWidget(self.follow)
+        top.addStretch()
+        top.addWidget(self.btn_clear)
+        layout = QVBoxLayout(widget)
+        layout.addLayout(top)
+        layout.addWidget(self.plugin_errors)
+        layout.addWidget(self.table)
+        self.setWidget(widget)
+
+        self.visibilityChanged.connect(self.onVisibility)
+        self.protocol.currentIndexChanged.connect(self.onProtocol)
+        self.btn_clear.clicked.connect(self.onClear)
+        self.onProtocol()
+
+    def onProtocol(self):
+        """Protocol selection changed."""
+        cls = decoders.DECODERS.get(self.protocol.currentText())
+        self.decoder = cls() if cls is not None else None
+
+    def onClear(self):
+        """Clear button clicked."""
+        self.model.clear()
+        if self.decoder is not None:
+            self.decoder.reset()
+
+    def onVisibility(self, visible):
+        """
+        Data isn't decoded while the dock is hidden, so a partial frame from
+        before can't be completed by what arrives after.
+        """
+        _ = visible
+        self.resync()
+
+    def resync(self):
+        """Drop any partial frame after a gap in the received data."""
+        if self.decoder is not None:
+            self.decoder.reset()
+
+    def feed(self, data, stamp):
+        """Decode received data."""
+        if self.decoder is None or not self.isVisible():
+            return
+        frames = self.decoder.feed(data, stamp)
+        if frames:
+            self.model.append(frames)
+            if self.follow.isChecked():
+                self.table.scrollToBottom()
@@ -6,7 +6,6 @@
 # SPDX-License-Identifier: GPL-3.0
 """Saves and loads Qt GUI Control Settings"""
 import sys
-import inspect
 from .qt import *
 
 def save(ui, settings, controls):
@@ -14,11 +13,11 @@ def save(ui, settings, controls):
 
     if "ui" in controls:
         settings.setValue('geometry', ui.saveGeometry())
+        if isinstance(ui, QMainWindow):
+            settings.setValue('state', ui.saveState())
 
-    for name, obj in inspect.getmembers(ui):
-
-        if name not in controls:
-            continue
+    for name in controls:
+        obj = getattr(ui, name, None)
 
         if isinstance(obj, QComboBox):
             name = obj.objectName()
@@ -61,9 +60,9 @@ def save(ui, settings, controls):
                 value = obj.isChecked()
                 settings.setValue(name, value)
 
-def load(ui, settings):
+def load(ui, settings, controls):
     """
-    Configure UI controls from settings.
+    Configure the named UI controls from settings.
 
     With PyQt's QSettings.value(), you can get a QVariant and use the toBool(),
     toPoint() to convert back to the right type.  With Version 2 API, you
@@ -82,8 +81,11 @@ def load(ui, settings):
 
     if settings.contains('geometry'):
         ui.restoreGeometry(settings.value('geometry'))
+    if settings.contains('state') and isinstance(ui, QMainWindow):
+        ui.restoreState(settings.value('state'))
 
-    for name, obj in inspect.getmembers(ui):
+    for name in controls:
+        obj = getattr(ui, name, None)
         if isinstance(obj, QComboBox):
             name = obj.objectName()
             value = settings.value(name, None)
@@ -0,0 +1,253 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Input history.
+
+Sent lines are kept once each, most recent last, up to a limit, and saved to
+a file next to the settings so they survive a restart.  A sorted copy of the
+entries is kept to find prefix matches with a binary search, so reverse
+search stays fast on a long history.
+"""
+import os
+import re
+import bisect
+import codecs
+from qt import *
+
+# Entries kept.  The oldest are forgotten first.
+MAX_HISTORY = 10000
+
+def history_path():
+    """Return the path of the history file, next to the settings file."""
+    settings = QtCore.QSettings(QtCore.QSettings.IniFormat,
+                                QtCore.QSettings.UserScope,
+                                'tinycom', 'tinycom')
+    return os.path.join(os.path.dirname(settings.fileName()), 'history.txt')
+
+class HistoryModel(QtCore.QAbstractListModel):
+    """
+    List model of history entries, oldest first.
+
+    Each entry has a serial number that increases every time an entry is
+    added, so the row of an entry can be found with a binary search over
+    the serials, and matches can be sorted newest first without a scan.
+    """
+
+    def __init__(self, parent=None, limit=MAX_HISTORY):
+        super(HistoryModel, self).__init__(parent)
+        self.limit = limit
+        self.entries = []
+        self.serials = []
+        self.serial = {}
+        self.sorted = []
+        self._next = 0
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """Return the number of entries."""
+        if parent.isValid():
+            return 0
+        return len(self.entries)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Return the entry for a row."""
+        if not index.isValid() or \
+           role not in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return None
+        return self.entries[index.row()]
+
+    def entry(self, row):
+        """Return the text of a row."""
+        return self.entries[row]
+
+    def row(self, text):
+        """Return the row of an entry, or -1 if it isn't in the history."""
+        serial = self.serial.get(text)
+        if serial is None:
+            return -1
+        return bisect.bisect_left(self.serials, serial)
+
+    def add(self, text):
+        """Add an entry, or move it to the end if it's already there."""
+        if not text:
+            return
+        row = self.row(text)
+        if row == len(self.entries) - 1 and row >= 0:
+            return
+        if row >= 0:
+            self.removeRow(row)
+        while len(self.entries) >= self.limit:
+            self.removeRow(0)
+        row = len(self.entries)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.entries.append(text)
+        self.serials.append(self._next)
+        self.serial[text] = self._next
+        bisect.insort(self.sorted, text)
+        self._next += 1
+        self.endInsertRows()
+
+    def removeRow(self, row, parent=QtCore.QModelIndex()):
+        """Remove the entry at row."""
+        self.beginRemoveRows(parent, row, row)
+        text = self.entries.pop(row)
+        del self.serials[row]
+        del self.serial[text]
+        del self.sorted[bisect.bisect_left(self.sorted, text)]
+        self.endRemoveRows()
+        return True
+
+    def setEntries(self, entries):
+        """Replace all entries, oldest first."""
+        self.beginResetModel()
+        self.entries = []
+        self.serials = []
+        self.serial = {}
+        for text in entries:
+            if not text:
+                continue
+            if text in self.serial:
+                row = self.row(text)
+                del self.entries[row]
+                del self.serials[row]
+            self.entries.append(text)
+            self.serials.append(self._next)
+            self.serial[text] = self._next
+            self._next += 1
+        if len(self.entries) > self.limit:
+            for text in self.entries[:-self.limit]:
+                del self.serial[text]
+            self.entries = self.entries[-self.limit:]
+            self.serials = self.serials[-self.limit:]
+        self.sorted = sorted(self.entries)
+        self.endResetModel()
+
+    def search(self, query):
+        """
+        Return the rows of entries matching query, best first.
+
+        Entries that start with query come first, then entries that contain
+        it, then entries that contain its characters in order, each newest
+        first.  Only the prefix matches are case sensitive.
+        """
+        if not query:
+            return list(range(len(self.entries) - 1, -1, -1))
+        prefix = []
+        i = bisect.bisect_left(self.sorted, query)
+        while i < len(self.sorted) and self.sorted[i].startswith(query):
+            prefix.append(self.serial[self.sorted[i]])
+            i += 1
+        found = set(prefix)
+        lower = query.lower()
+        fuzzy = re.compile('.*?'.join(re.escape(c) for c in query),
+                           re.IGNORECASE)
+        contains = []
+        subsequence = []
+        for row in range(len(self.entries) - 1, -1, -1):
+            if self.serials[row] in found:
+                continue
+            text = self.entries[row]
+            if lower in text.lower():
+                contains.append(row)
+            elif fuzzy.search(text):
+                subsequence.append(row)
+        prefix.sort(reverse=True)
+        return [bisect.bisect_left(self.serials, serial) for serial in prefix] \
+            + contains + subsequence
+
+    def load(self, path):
+        """Load entries from a file, one per line."""
+        try:
+            with codecs.open(path, 'r', encoding='utf-8') as handle:
+                self.setEntries(handle.read().splitlines())
+        except (IOError, OSError, UnicodeError):
+            pass
+
+    def save(self, path):
+        """Save entries to a file, one per line."""
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with codecs.open(path, 'w', encoding='utf-8') as handle:
+            for text in self.entries:
+                handle.write(text + u'\n')
+
+class HistorySearch(QWidget):
+    """
+    Reverse search bar for the input history, like Ctrl-R in a shell.
+
+    Typing shows the best match, Ctrl-R again steps to the next match,
+    Enter keeps the match and Escape goes back to what was there before.
+    """
+
+    matched = QtCore.pyqtSignal(int, name='matched')
+    finished = QtCore.pyqtSignal(bool, name='finished')
+
+    def __init__(self, model, parent=None):
+        super(HistorySearch, self).__init__(parent)
+        self.model = model
+        self.rows = []
+        self.current = 0
+
+        self.text = QLineEdit(self)
+        self.text.setPlaceholderText("Search history")
+        self.text.setToolTip("Search the input history.  Press Ctrl+R again"
+                             " for the next match.")
+        self.text.installEventFilter(self)
+        self.count = QLabel(self)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel("History search:", self))
+        layout.addWidget(self.text)
+        layout.addWidget(self.count)
+
+        self.text.textChanged.connect(self.onTextChanged)
+        self.text.returnPressed.connect(lambda: self.finish(True))
+
+    def activate(self):
+        """Show the search bar, or step to the next match if it's shown."""
+        if self.isVisible():
+            self.step()
+            return
+        self.setVisible(True)
+        self.text.clear()
+        self.onTextChanged()
+        self.text.setFocus()
+
+    def eventFilter(self, obj, event):
+        """Handle Escape and Ctrl+R in the search text."""
+        if obj is self.text and event.type() == QtCore.QEvent.KeyPress:
+            if event.key() == QtCore.Qt.Key_Escape:
+                self.finish(False)
+                return True
+            if event.key() == QtCore.Qt.Key_R and \
+               event.modifiers() & QtCore.Qt.ControlModifier:
+                self.step()
+                return True
+        return super(HistorySearch, self).eventFilter(obj, event)
+
+    def onTextChanged(self):
+        """Search again."""
+        self.rows = self.model.search(self.text.text())
+        self.current = 0
+        self.showMatch()
+
+    def step(self):
+        """Show the next match."""
+        if self.rows:
+            self.current = (self.current + 1) % len(self.rows)
+        self.showMatch()
+
+    def showMatch(self):
+        """Show the current match."""
+        if not self.rows:
+            self.count.setText("No matches")
+            return
+        self.count.setText("%d of %d" % (self.current + 1, len(self.rows)))
+        self.matched.emit(self.rows[self.current])
+
+    def finish(self, accepted):
+        """Hide the search bar, keeping the match if accepted."""
+        self.setVisible(False)
+        self.finished.emit(accepted)
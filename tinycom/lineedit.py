@@ -5,13 +5,57 @@
 from qt import *
 
 class CustomLineEdit(QLineEdit):
-    """Custom line edit class that handles special key events."""
+    """
+    Custom line edit class that handles special key events.
+
+    A line edit would drop the line ends of pasted text, so text with more
+    than one line is handed over with paste_lines instead, whether it's
+    pasted with the keyboard, the context menu or the middle mouse button.
+    """
 
     key_event = QtCore.pyqtSignal(int, name='key_event')
+    paste_lines = QtCore.pyqtSignal(str, name='paste_lines')
+
+    def pasteLines(self, mode=QClipboard.Clipboard):
+        """
+        Hand over the clipboard, or the selection, with paste_lines if it has
+        more than one line.  Returns True if it did.
+        """
+        text = QApplication.clipboard().text(mode)
+        if '\n' not in text and '\r' not in text:
+            return False
+        self.paste_lines.emit(text)
+        return True
 
     def keyPressEvent(self, event):
         if event.key() == QtCore.Qt.Key_Up or event.key() == QtCore.Qt.Key_Down:
             self.key_event.emit(event.key())
             event.accept()
+        elif event.matches(QKeySequence.Paste) and self.pasteLines():
+            event.accept()
         else:
             super(CustomLineEdit, self).keyPressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == QtCore.Qt.MiddleButton and \
+           QApplication.clipboard().supportsSelection() and \
+           not self.isReadOnly() and self.pasteLines(QClipboard.Selection):
+            event.accept()
+        else:
+            super(CustomLineEdit, self).mouseReleaseEvent(event)
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+        paste = QApplication.translate("QLineEdit", "&Paste")
+        for action in menu.actions():
+            if action.objectName() == "edit-paste" or \
+               action.text().split('\t')[0] == paste:
+                action.triggered.disconnect()
+                action.triggered.connect(self.onPasteAction)
+        menu.exec_(event.globalPos())
+        menu.deleteLater()
+
+    def onPasteAction(self):
+        """Paste chosen from the context menu."""
+        if not self.pasteLines():
+            self.paste()
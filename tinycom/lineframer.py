@@ -0,0 +1,145 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Splits a received byte stream into timestamped lines.
+"""
+import re
+import time
+import bisect
+import datetime
+from array import array
+
+# What terminates a line: any of CR/LF, CR or LF, only LF, or only CR.
+ANY_TERMINATOR = re.compile(b'\r\n|\r|\n')
+LF_TERMINATOR = re.compile(b'\n')
+CR_TERMINATOR = re.compile(b'\r')
+
+# Unsigned 64 bit offsets where supported, otherwise doubles which are exact
+# up to 2**53.
+try:
+    array('Q')
+    _OFFSET_TYPE = 'Q'
+except ValueError:
+    _OFFSET_TYPE = 'd'
+
+def _make_clock():
+    """
+    Return a high resolution wall clock.
+
+    time.time() can have coarse resolution on some platforms, so when a
+    monotonic performance counter is available, anchor it to the wall clock
+    once and derive timestamps from it.
+    """
+    counter = getattr(time, 'perf_counter', None)
+    if counter is None:
+        return time.time
+    base = time.time() - counter()
+    return lambda: base + counter()
+
+clock = _make_clock() # pylint: disable=invalid-name
+
+def format_stamp(stamp):
+    """Format a timestamp as local time with microseconds."""
+    return datetime.datetime.fromtimestamp(stamp).strftime('%H:%M:%S.%f')
+
+class LineFramer(object):
+    """
+    Frames a byte stream into lines.
+
+    For every line, the stream offset of its first byte and the time that byte
+    was received are kept in flat arrays, so the index costs 16 bytes per line
+    rather than a Python object.  A line starts when its first byte arrives,
+    not when the previous line terminator is seen, so the timestamp is the
+    time the line arrived.
+
+    terminator is the regular expression that ends a line, which should
+    match the line ends of the text the stream is shown as.
+    """
+
+    def __init__(self, terminator=ANY_TERMINATOR):
+        self.terminator = terminator
+        self.offsets = array(_OFFSET_TYPE)
+        self.stamps = array('d')
+        self.offset = 0
+        self._open = False
+        self._pending_cr = False
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def reset(self):
+        """Forget all lines."""
+        self.offsets = array(_OFFSET_TYPE)
+        self.stamps = array('d')
+        self.offset = 0
+        self._open = False
+        self._pending_cr = False
+
+    def skip(self, size):
+        """
+        Account for size bytes of the stream that will not be fed.  The next
+        byte fed starts a new line.
+        """
+        self.offset += size
+        self._open = False
+        self._pending_cr = False
+
+    def setTerminator(self, terminator):
+        """Change what ends a line from the next byte fed."""
+        if terminator is not self.terminator:
+            self.terminator = terminator
+            self._pending_cr = False
+
+    def end(self):
+        """
+        End the open line, if there is one, so the next byte fed starts a new
+        line.  Returns True if a line was open.
+        """
+        was_open = self._open
+        self._open = False
+        return was_open
+
+    def feed(self, data, stamp=None):
+        """
+        Frame a chunk of data received at stamp.
+
+        Returns the positions in data where new lines start.
+        """
+        if stamp is None:
+            stamp = clock()
+        size = len(data)
+        starts = []
+        pos = 0
+        if self._pending_cr and size:
+            # The LF of a CR/LF split across two chunks.
+            self._pending_cr = False
+            if data[0:1] == b'\n':
+                pos = 1
+        while pos < size:
+            if not self._open:
+                self._open = True
+                starts.append(pos)
+            match = self.terminator.search(data, pos)
+            if match is None:
+                break
+            pos = match.end()
+            self._open = False
+            if pos == size and match.group() == b'\r' and \
+               self.terminator is ANY_TERMINATOR:
+                self._pending_cr = True
+        for start in starts:
+            self.offsets.append(self.offset + start)
+            self.stamps.append(stamp)
+        self.offset += size
+        return starts
+
+    def delta(self, line):
+        """Time between the start of line and the start of the line before."""
+        if line <= 0 or line >= len(self.stamps):
+            return 0.0
+        return self.stamps[line] - self.stamps[line - 1]
+
+    def find(self, offset):
+        """Return the line that contains the stream offset."""
+        return bisect.bisect_right(self.offsets, offset) - 1
@@ -0,0 +1,256 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Link test: sends a known pattern and checks what comes back.
+
+The pattern is sent through the normal TX path and the received stream is
+checked on the serial thread, so the result covers the whole link, whether
+that is loop://, a pty pair, a loopback plug or a device that echoes.
+Comparison uses NumPy when it's installed.
+
+This module doesn't import Qt.  The thread that sends the pattern is in
+linktestview.
+"""
+import binascii
+import collections
+from lineframer import clock
+try:
+    import numpy
+except ImportError:
+    numpy = None # pylint: disable=invalid-name
+
+# Pattern name to (order, tap) of the ITU-T O.150 polynomial x^order +
+# x^tap + 1, or None for a counter.
+PATTERNS = collections.OrderedDict([
+    ("PRBS-7", (7, 6)),
+    ("PRBS-9", (9, 5)),
+    ("PRBS-15", (15, 14)),
+    ("PRBS-23", (23, 18)),
+    ("PRBS-31", (31, 28)),
+    ("Counter", None),
+])
+
+# Longer sequences are truncated to this many bytes and repeated.
+MAX_PATTERN = 64 * 1024
+
+# Bytes that must match to find the position in the pattern.
+SYNC_LEN = 16
+
+# Received data is compared in blocks of this size, and more than a quarter of
+# a block wrong is taken as a lost or inserted byte rather than bit errors.
+BLOCK = 64
+
+# Bytes written at a time.
+CHUNK = 4096
+
+# Bytes sent but not yet received before the sender waits.
+MAX_IN_FLIGHT = 64 * 1024
+
+# How long the sender waits for received data to catch up before sending
+# anyway.
+STALL_TIME = 1.0
+
+_cache = {} # pylint: disable=invalid-name
+
+def make_pattern(name):
+    """
+    Return one period of the named pattern as bytes.
+
+    PRBS bits are packed most significant bit first.  Since the bit period
+    2^order - 1 is odd, the byte sequence also repeats every 2^order - 1
+    bytes.
+    """
+    if name in _cache:
+        return _cache[name]
+    poly = PATTERNS[name]
+    if poly is None:
+        pattern = bytes(bytearray(range(256)))
+    else:
+        order, tap = poly
+        mask = (1 << order) - 1
+        state = mask
+        out = bytearray(min(mask, MAX_PATTERN))
+        for i in range(len(out)):
+            byte = 0
+            for _ in range(8):
+                bit = ((state >> (order - 1)) ^ (state >> (tap - 1))) & 1
+                state = ((state << 1) | bit) & mask
+                byte = (byte << 1) | bit
+            out[i] = byte
+        pattern = bytes(out)
+    _cache[name] = pattern
+    return pattern
+
+def _popcount(diff):
+    """Return the number of set bits in a bytearray."""
+    if not diff:
+        return 0
+    return bin(int(binascii.hexlify(diff), 16)).count('1')
+
+def compare(data, expected):
+    """
+    Compare data to expected in blocks of BLOCK bytes.
+
+    Returns (byte_errors, bit_errors), each a list with a count per block.
+    """
+    size = len(data)
+    if numpy is not None:
+        diff = numpy.bitwise_xor(numpy.frombuffer(data, dtype=numpy.uint8),
+                                 numpy.frombuffer(expected, dtype=numpy.uint8))
+        starts = numpy.arange(0, size, BLOCK)
+        byte_errors = numpy.add.reduceat((diff != 0).astype(numpy.intp),
+                                         starts)
+        bit_errors = numpy.add.reduceat(
+            numpy.unpackbits(diff).reshape(-1, 8).sum(axis=1), starts)
+        return byte_errors.tolist(), bit_errors.tolist()
+    byte_errors = []
+    bit_errors = []
+    for start in range(0, size, BLOCK):
+        diff = bytearray(x ^ y for x, y in
+                         zip(bytearray(data[start:start + BLOCK]),
+                             bytearray(expected[start:start + BLOCK])))
+        byte_errors.append(len(diff) - diff.count(0))
+        bit_errors.append(_popcount(diff))
+    return byte_errors, bit_errors
+
+class PatternChecker(object):
+    """
+    Checks a received stream against a repeating pattern.
+
+    feed() is called with everything received.  The checker finds where in
+    the pattern the stream is, then compares each block with what should
+    have arrived.  A block that is mostly wrong means bytes were lost or
+    inserted, so the checker finds the stream in the pattern again and
+    counts the difference as dropped or inserted bytes.  Lost or inserted
+    whole periods of the pattern can't be seen, so use a long pattern for
+    links that drop a lot.
+
+    The counters are plain attributes, updated on the thread that calls
+    feed() and read by the GUI.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.period = len(pattern)
+        self._doubled = pattern + pattern[:SYNC_LEN]
+        # Every 4 byte window of these patterns is unique within a period.
+        self._index = {}
+        for pos in range(self.period - 1, -1, -1):
+            self._index[self._doubled[pos:pos + 4]] = pos
+        self._pending = bytearray()
+        self.synced = False
+        self.pos = 0
+        self._lost_at = None
+        self._hunted = 0
+        # Offset in the transmitted stream of the next byte expected.
+        self.position = 0
+        # (end offset in the transmitted stream, time) of each write.
+        self.marks = collections.deque()
+        self.start = clock()
+        self.received = 0
+        self.checked = 0
+        self.byte_errors = 0
+        self.bit_errors = 0
+        self.dropped = 0
+        self.inserted = 0
+        self.resyncs = 0
+        self.latency_min = None
+        self.latency_max = 0.0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def expected(self, pos, size):
+        """Return size bytes of the pattern starting at pos."""
+        if pos + size <= len(self._doubled):
+            return self._doubled[pos:pos + size]
+        repeat = (pos + size) // self.period + 1
+        return (self.pattern * repeat)[pos:pos + size]
+
+    def feed(self, data, stamp):
+        """Check received data."""
+        self.received += len(data)
+        buf = self._pending + data
+        i = 0
+        while True:
+            if not self.synced:
+                if len(buf) - i < SYNC_LEN:
+                    break
+                pos = self._index.get(bytes(buf[i:i + 4]))
+                if pos is None or \
+                   buf[i:i + SYNC_LEN] != self._doubled[pos:pos + SYNC_LEN]:
+                    i += 1
+                    self._hunted += 1
+                    continue
+                self.resync(pos)
+            else:
+                size = (len(buf) - i) // BLOCK * BLOCK
+                if size < 2 * BLOCK:
+                    break
+                i += self.check(buf[i:i + size])
+        self._pending = buf[i:]
+        while self.marks and self.marks[0][0] <= self.position:
+            self.addLatency(stamp - self.marks.popleft()[1])
+
+    def resync(self, pos):
+        """Found the stream at pos in the pattern."""
+        self.synced = True
+        if self._lost_at is None:
+            # Whatever came before the first sync wasn't sent by us.
+            self.position = pos
+        else:
+            # Bytes the transmitter sent while we were lost, versus the bytes
+            # received, tells what was dropped or inserted.  Whatever is in
+            # both was replaced.
+            sent = (pos - self._lost_at) % self.period
+            if sent > self.period // 2:
+                sent -= self.period
+            if sent > self._hunted:
+                self.dropped += sent - self._hunted
+            else:
+                self.inserted += self._hunted - sent
+            self.byte_errors += max(0, min(sent, self._hunted))
+            self.position += sent
+            self.resyncs += 1
+        self._lost_at = None
+        self._hunted = 0
+        self.pos = pos
+
+    def check(self, data):
+        """
+        Compare whole blocks of data while in sync.
+
+        A slip near the end of a block only shows as a few errors in that
+        block, so the last block is held back until the block after it has
+        been seen.  Returns the number of bytes consumed.
+        """
+        expected = self.expected(self.pos, len(data))
+        byte_errors, bit_errors = compare(data, expected)
+        blocks = len(byte_errors) - 1
+        for block, errors in enumerate(byte_errors):
+            if errors * 4 > BLOCK:
+                if block and byte_errors[block - 1]:
+                    block -= 1
+                blocks = block
+                self.synced = False
+                break
+        used = blocks * BLOCK
+        self.byte_errors += sum(byte_errors[:blocks])
+        self.bit_errors += sum(bit_errors[:blocks])
+        if not self.synced:
+            # Keep the good bytes before the first wrong one.
+            while data[used:used + 1] == expected[used:used + 1]:
+                used += 1
+            self._lost_at = (self.pos + used) % self.period
+        self.checked += used
+        self.position += used
+        self.pos = (self.pos + used) % self.period
+        return used
+
+    def addLatency(self, latency):
+        """Account for the latency of one write."""
+        if self.latency_min is None or latency < self.latency_min:
+            self.latency_min = latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_sum += latency
+        self.latency_count += 1
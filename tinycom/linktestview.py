@@ -0,0 +1,196 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Dock that shows the results of a link test.
+"""
+import threading
+from qt import *
+import linktest
+from lineframer import clock
+
+# Result updates per second.
+UPDATE_RATE = 4
+
+def human_rate(nbytes, seconds):
+    """Return a human readable transfer rate."""
+    if seconds <= 0:
+        return "0 B/s"
+    rate = nbytes / seconds
+    suffixes = ['B/s', 'KB/s', 'MB/s', 'GB/s']
+    i = 0
+    while rate >= 1024 and i < len(suffixes) - 1:
+        rate /= 1024.
+        i += 1
+    return '%.1f %s' % (rate, suffixes[i])
+
+class PatternThread(QtCore.QThread):
+    """
+    Sends a pattern as fast as the port accepts it.
+
+    At most MAX_IN_FLIGHT bytes are sent ahead of what the checker has
+    received, so a port that accepts writes faster than it can deliver them,
+    like loop://, doesn't buffer without bound and latency measures the link
+    rather than a queue.
+    """
+
+    send_error = QtCore.pyqtSignal(str, name='send_error')
+
+    def __init__(self, pattern, write, checker, count=0):
+        super(PatternThread, self).__init__()
+        self.pattern = pattern
+        self.write = write
+        self.checker = checker
+        self.count = count
+        self.sent = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Stop sending and wait for the thread to finish."""
+        self._stopped.set()
+        self.wait()
+
+    def run(self):
+        """Thread run loop."""
+        repeat = linktest.CHUNK // len(self.pattern) + 2
+        data = self.pattern * repeat
+        pos = 0
+        stalled = None
+        while not self._stopped.is_set():
+            if self.count and self.sent >= self.count:
+                return
+            if self.sent - self.checker.position > linktest.MAX_IN_FLIGHT:
+                if stalled is None:
+                    stalled = clock()
+                if clock() - stalled < linktest.STALL_TIME:
+                    self._stopped.wait(0.001)
+                    continue
+            stalled = None
+            size = linktest.CHUNK
+            if self.count:
+                size = min(size, self.count - self.sent)
+            chunk = data[pos:pos + size]
+            try:
+                self.write(chunk)
+            except Exception as exp: # pylint: disable=broad-except
+                self.send_error.emit(str(exp))
+                return
+            self.sent += size
+            self.checker.marks.append((self.sent, clock()))
+            pos = (pos + size) % len(self.pattern)
+
+
+class LinkTestDock(QDockWidget):
+    """
+    Link test controls and results.
+
+    The dock only displays a test.  Starting one needs the port, so the
+    main window handles btn_start and calls start() and finish().
+    """
+
+    def __init__(self, parent=None):
+        super(LinkTestDock, self).__init__("Link Test", parent)
+        self.setObjectName("linktest_dock")
+        self.checker = None
+        self.thread = None
+        self.stopped = None
+
+        widget = QWidget(self)
+        self.pattern = QComboBox(widget)
+        self.pattern.setObjectName("linktest_pattern")
+        self.pattern.addItems(list(linktest.PATTERNS.keys()))
+        self.pattern.setToolTip(
+            "Pattern to send.  Slips of a whole pattern period can't be seen,"
+            " so longer patterns catch more.")
+        self.count = QSpinBox(widget)
+        self.count.setObjectName("linktest_count")
+        self.count.setRange(0, 1024 * 1024)
+        self.count.setSuffix(" KB")
+        self.count.setSpecialValueText("Until Stopped")
+        self.count.setToolTip("Amount of data to send.")
+        self.btn_start = QPushButton("Start", widget)
+        self.btn_start.setCheckable(True)
+
+        self.results = {}
+        form = QFormLayout()
+        for name in ["Elapsed", "Sent", "Received", "Bit Errors",
+                     "Byte Errors", "Dropped", "Inserted", "Resyncs",
+                     "Latency"]:
+            self.results[name] = QLabel(widget)
+            self.results[name].setTextInteractionFlags(
+                QtCore.Qt.TextSelectableByMouse)
+            form.addRow(name + ":", self.results[name])
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Pattern:", widget))
+        top.addWidget(self.pattern)
+        top.addWidget(QLabel("Send:", widget))
+        top.addWidget(self.count)
+        top.addStretch()
+        top.addWidget(self.btn_start)
+        layout = QVBoxLayout(widget)
+        layout.addLayout(top)
+        layout.addLayout(form)
+        layout.addStretch()
+        self.setWidget(widget)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.updateResults)
+        self.updateResults()
+
+    def start(self, checker, thread):
+        """Show the results of a running test."""
+        self.checker = checker
+        self.thread = thread
+        self.stopped = None
+        self.pattern.setEnabled(False)
+        self.count.setEnabled(False)
+        self.btn_start.setText("Stop")
+        self.timer.start(1000 // UPDATE_RATE)
+        self.updateResults()
+
+    def finish(self):
+        """The test stopped, so show the final results."""
+        self.timer.stop()
+        self.stopped = clock()
+        self.updateResults()
+        self.pattern.setEnabled(True)
+        self.count.setEnabled(True)
+        self.btn_start.setText("Start")
+
+    def updateResults(self):
+        """Update the result labels from the running test."""
+        checker = self.checker
+        if checker is None:
+            for label in self.results.values():
+                label.setText("-")
+            return
+        elapsed = (self.stopped or clock()) - checker.start
+        sent = self.thread.sent
+        checked = float(checker.checked)
+        self.results["Elapsed"].setText("%.1f s" % elapsed)
+        self.results["Sent"].setText("%d bytes (%s)" %
+                                     (sent, human_rate(sent, elapsed)))
+        self.results["Received"].setText(
+            "%d bytes (%s)" % (checker.received,
+                               human_rate(checker.received, elapsed)))
+        self.results["Bit Errors"].setText(
+            "%d (BER %.3g)" % (checker.bit_errors,
+                               checker.bit_errors / (checked * 8)
+                               if checked else 0))
+        self.results["Byte Errors"].setText(
+            "%d (%.3g)" % (checker.byte_errors,
+                           checker.byte_errors / checked if checked else 0))
+        self.results["Dropped"].setText("%d bytes" % checker.dropped)
+        self.results["Inserted"].setText("%d bytes" % checker.inserted)
+        self.results["Resyncs"].setText(
+            "%d%s" % (checker.resyncs,
+                      "" if checker.synced else " (searching)"))
+        if checker.latency_count:
+            self.results["Latency"].setText(
+                "%.2f / %.2f / %.2f ms (min / avg / max)" %
+                (checker.latency_min * 1000,
+                 checker.latency_sum / checker.latency_count * 1000,
+                 checker.latency_max * 1000))
+        else:
+            self.results["Latency"].setText("-")
@@ -0,0 +1,283 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Formats and writes the log in a separate process.
+
+The serial thread copies each received chunk into a ring buffer in shared
+memory, and a worker process formats it and writes the log, so formatting,
+writing and compressing the log don't compete with the GUI and the serial
+thread for the GIL.  Every TinyCom window has its own worker, so monitoring
+many ports from one host spreads the logging across cores.
+
+This module doesn't need Qt, but a spawned worker imports the main script
+again, so it loads whatever that script imports.
+"""
+import ctypes
+import pickle
+import struct
+import threading
+import multiprocessing
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from textformat import TextFormatter
+from lineframer import clock
+import logwriter
+
+# Default size of the shared ring buffer.
+RING_SIZE = 4 * 1024 * 1024
+
+# Each record in the ring is this header, the kind, length and receive time of
+# the data, followed by the data.  Commands go through the ring too, so they
+# apply exactly where they were made in the stream.
+HEADER = struct.Struct('<BId')
+DATA = 0
+COMMAND = 1
+SENT = 2
+EVENT = 3
+
+# How long a command waits for space in the ring before checking that the
+# worker is still running.
+WAIT_TIME = 0.1
+
+# How long data and events wait for space in the ring before they are dropped.
+DROP_TIME = 1.0
+
+# How often the worker checks for commands when there's no data.
+POLL_TIME = 0.1
+
+def _context():
+    """
+    Return the multiprocessing context to use.  A forked child of a Qt
+    application with running threads isn't safe, so spawn where possible.
+    """
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context('spawn')
+    return multiprocessing
+
+class SharedRing(object):
+    """
+    Single producer, single consumer ring of records in shared memory.
+
+    head and tail are the total bytes ever written and read, so the ring is
+    empty when they are equal and each is only changed by one side.
+    """
+
+    def __init__(self, context, size=RING_SIZE):
+        self.size = size
+        self.buffer = context.RawArray('c', size)
+        self.head = context.RawValue(ctypes.c_uint64, 0)
+        self.tail = context.RawValue(ctypes.c_uint64, 0)
+        self.ready = context.Event()
+        self.space = context.Event()
+
+    def free(self):
+        """Return the number of bytes that can be written."""
+        return self.size - (self.head.value - self.tail.value)
+
+    def put(self, kind, data, stamp, timeout=WAIT_TIME):
+        """
+        Append a record, waiting up to timeout for space.
+
+        Returns False if the record didn't fit in time.
+        """
+        size = HEADER.size + len(data)
+        if size > self.size:
+            return False
+        while self.free() < size:
+            self.space.clear()
+            if self.free() >= size:
+                break
+            if not self.space.wait(timeout):
+                return False
+        head = self.head.value
+        self._write(head, HEADER.pack(kind, len(data), stamp))
+        self._write(head + HEADER.size, data)
+        self.head.value = head + size
+        self.ready.set()
+        return True
+
+    def get(self):
+        """Remove and return all records as a list of (kind, data, stamp)."""
+        head = self.head.value
+        tail = self.tail.value
+        records = []
+        while tail < head:
+            kind, size, stamp = HEADER.unpack(self._read(tail, HEADER.size))
+            records.append((kind, self._read(tail + HEADER.size, size), stamp))
+            tail += HEADER.size + size
+        self.tail.value = tail
+        self.space.set()
+        return records
+
+    def _write(self, pos, data):
+        """Copy data into the ring at stream position pos."""
+        start = pos % self.size
+        first = min(len(data), self.size - start)
+        base = ctypes.addressof(self.buffer)
+        ctypes.memmove(base + start, data, first)
+        if first < len(data):
+            ctypes.memmove(base, data[first:], len(data) - first)
+
+    def _read(self, pos, size):
+        """Return size bytes from the ring at stream position pos."""
+        start = pos % self.size
+        end = start + size
+        if end <= self.size:
+            return self.buffer[start:end]
+        return self.buffer[start:] + self.buffer[:end - self.size]
+
+def run_worker(ring, results):
+    """Worker process main loop."""
+    formatter = TextFormatter()
+    writer = None
+    running = True
+
+    def warn(text):
+        """Report an error that doesn't close the log."""
+        results.put((False, text))
+
+    while running:
+        ring.ready.wait(POLL_TIME)
+        ring.ready.clear()
+        pieces = []
+        for kind, data, stamp in ring.get():
+            if kind == EVENT:
+                if writer is not None:
+                    pieces.append(formatter.event(data.decode('utf-8'), stamp))
+                continue
+            if kind != COMMAND:
+                if writer is not None:
+                    pieces.append(formatter.format(data, stamp, kind == SENT))
+                continue
+            if pieces:
+                writer = _write(writer, ''.join(pieces), results)
+                pieces = []
+            command, arg = pickle.loads(data)
+            if command == 'format':
+                formatter.configure(arg)
+            elif command == 'open':
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                if arg is not None:
+                    try:
+                        writer = logwriter.RotatingLogWriter(
+                            *arg, on_error=warn)
+                    except (IOError, OSError) as exp:
+                        results.put((True, str(exp)))
+            elif command == 'stop':
+                running = False
+        if pieces:
+            writer = _write(writer, ''.join(pieces), results)
+    if writer is not None:
+        writer.close()
+
+def _write(writer, text, results):
+    """Write to the log, returning the writer or None if it failed."""
+    try:
+        writer.write(text)
+    except (IOError, OSError) as exp:
+        results.put((True, str(exp)))
+        writer.close()
+        return None
+    return writer
+
+class LogProcess(object):
+    """
+    Log worker process.
+
+    Any method may be called from any thread.  If the worker can't keep up
+    and the ring stays full for DROP_TIME, data and events are dropped and
+    counted in dropped rather than stalling the caller, which for received
+    data is the serial thread, any longer.  A bigger ring rides out longer
+    stalls.  Commands wait for space as long as it takes, since losing one
+    would leave the log open, closed or formatted differently than asked.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        context = _context()
+        self.ring = SharedRing(context, size)
+        self.results = context.Queue()
+        self.process = context.Process(target=run_worker,
+                                       args=(self.ring, self.results),
+                                       name='tinycom-log')
+        self.process.daemon = True
+        self.process.start()
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def command(self, command, arg=None):
+        """
+        Send a command to the worker, waiting for space in the ring.
+
+        Returns False if the worker exited before the command was sent.
+        """
+        data = pickle.dumps((command, arg), 2)
+        if HEADER.size + len(data) > self.ring.size:
+            raise ValueError('Command too large for the log ring')
+        while self.process.is_alive():
+            with self._lock:
+                if self.ring.put(COMMAND, data, 0.0, timeout=0.0):
+                    return True
+            # Wait without the lock, so writers can keep dropping meanwhile.
+            self.ring.space.wait(WAIT_TIME)
+        return False
+
+    def setFormat(self, options):
+        """
+        Set TextFormatter options from a dictionary.  Returns False if the
+        worker exited.
+        """
+        return self.command('format', options)
+
+    def open(self, config):
+        """
+        Open the log with a tuple of RotatingLogWriter arguments, or close it
+        if config is None.  Returns False if the worker exited.
+        """
+        return self.command('open', config)
+
+    def write(self, data, stamp=None, sent=False):
+        """Queue data received, or sent, to be logged."""
+        if stamp is None:
+            stamp = clock()
+        with self._lock:
+            if not self.ring.put(SENT if sent else DATA, data, stamp,
+                                 DROP_TIME):
+                self.dropped += len(data)
+
+    def event(self, text, stamp=None):
+        """Queue a note to be logged as a line of its own."""
+        if stamp is None:
+            stamp = clock()
+        data = text.encode('utf-8')
+        with self._lock:
+            if not self.ring.put(EVENT, data, stamp, DROP_TIME):
+                self.dropped += len(data)
+
+    def errors(self):
+        """
+        Return any errors reported by the worker since the last call, as
+        (fatal, message).  After a fatal error the log is closed.
+        """
+        errors = []
+        while True:
+            try:
+                errors.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        return errors
+
+    def isAlive(self):
+        """Return True if the worker is running."""
+        return self.process.is_alive()
+
+    def stop(self, timeout=5.0):
+        """Write anything queued, close the log and stop the worker."""
+        if self.command('stop'):
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,367 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Incremental search and filtering of the output log.
+"""
+import re
+import sys
+import bisect
+from array import array
+from qt import *
+
+# Matches are handed to the GUI in batches of this many, or sooner if the
+# search reaches the end of the text.
+BATCH_SIZE = 1000
+
+# Highlighting is done with extra selections, which get slow when there are
+# a lot of them, so only this many matches are highlighted at once.
+MAX_HIGHLIGHTS = 2000
+
+# Trailing text without a newline is normally held back until its line is
+# complete, unless it grows past this size.
+MAX_CARRY = 64 * 1024
+
+# The log is read for searching in pieces of whole lines of about this many
+# characters, so reading a large log doesn't stall the GUI.
+CHUNK_SIZE = 1024 * 1024
+
+# Qt counts positions in UTF-16 code units, so characters outside the BMP
+# count twice there.  Where Python strings are UTF-16 already, they count
+# twice in Python too.
+if sys.maxunicode > 0xffff:
+    ASTRAL = re.compile(u'[\U00010000-\U0010ffff]')
+else:
+    ASTRAL = None # pylint: disable=invalid-name
+
+def utf16_len(text):
+    """Return the length of text in UTF-16 code units."""
+    if ASTRAL is None:
+        return len(text)
+    return len(text) + len(ASTRAL.findall(text))
+
+def compile_pattern(text, regex, case):
+    """Compile the search text to a pattern, raising re.error if invalid."""
+    flags = 0 if case else re.IGNORECASE
+    if not regex:
+        text = re.escape(text)
+    return re.compile(text, flags | re.MULTILINE)
+
+class SearchThread(QtCore.QThread):
+    """Searches a snapshot of log text on a background thread."""
+
+    found = QtCore.pyqtSignal(object, name='found')
+
+    def __init__(self, text, base, pattern, lines):
+        """
+        Search text, which starts at document position base.  Matches are
+        reported as document positions, in UTF-16 code units.
+        """
+        super(SearchThread, self).__init__()
+        self.text = text
+        self.base = base
+        self.pattern = pattern
+        self.lines = lines
+        self.alive = True
+
+    def stop(self):
+        """Stop the search and wait for the thread to finish."""
+        self.alive = False
+        self.wait()
+
+    def run(self):
+        """Thread run loop."""
+        text = self.text
+        base = self.base
+        astral = []
+        if ASTRAL is not None:
+            astral = [match.start() for match in ASTRAL.finditer(text)]
+        starts = []
+        ends = []
+        lines = []
+        line_end = -1
+        for match in self.pattern.finditer(text):
+            if not self.alive:
+                return
+            start, end = match.span()
+            if start == end:
+                continue
+            if astral:
+                starts.append(base + start + bisect.bisect_left(astral, start))
+                ends.append(base + end + bisect.bisect_left(astral, end))
+            else:
+                starts.append(base + start)
+                ends.append(base + end)
+            if self.lines and start > line_end:
+                line_start = text.rfind('\n', 0, start) + 1
+                line_end = text.find('\n', end)
+                if line_end == -1:
+                    line_end = len(text)
+                lines.append(text[line_start:line_end])
+            if len(starts) >= BATCH_SIZE:
+                self.found.emit((starts, ends, lines))
+                starts = []
+                ends = []
+                lines = []
+        self.found.emit((starts, ends, lines))
+
+class SearchBar(QWidget):
+    """
+    Search bar for a QPlainTextEdit log.
+
+    The full log is searched once when the search changes, then only text
+    appended to the log after that point is searched.  Results stream in from
+    a background thread, so the GUI stays responsive on large logs.
+    """
+
+    def __init__(self, log, parent=None):
+        super(SearchBar, self).__init__(parent)
+        self.log = log
+        self.thread = None
+        self.pattern = None
+        self.starts = array('l')
+        self.ends = array('l')
+        self.current = -1
+        self._searched = 0
+        self._dirty = False
+        self._more = False
+
+        self.text = QLineEdit(self)
+        self.text.setPlaceholderText("Find")
+        self.text.setToolTip("Search the output log.")
+        self.regex = QCheckBox("Regex", self)
+        self.case = QCheckBox("Match Case", self)
+        self.only_matching = QCheckBox("Only Matching Lines", self)
+        self.only_matching.setToolTip("Show only the lines that match.")
+        self.btn_prev = QPushButton("&Previous", self)
+        self.btn_next = QPushButton("&Next", self)
+        self.count = QLabel(self)
+        self.btn_close = QPushButton("Close", self)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        for widget in [self.text, self.regex, self.case, self.only_matching,
+                       self.btn_prev, self.btn_next, self.count,
+                       self.btn_close]:
+            layout.addWidget(widget)
+
+        self.filter_view = QPlainTextEdit(parent)
+        self.filter_view.setReadOnly(True)
+        self.filter_view.setToolTip("Lines matching the search.")
+        self.filter_view.setVisible(False)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(200)
+        self.timer.timeout.connect(self.onTimer)
+
+        self.text.textChanged.connect(self.restart)
+        self.text.returnPressed.connect(self.onNext)
+        self.regex.toggled.connect(self.restart)
+        self.case.toggled.connect(self.restart)
+        self.only_matching.toggled.connect(self.onOnlyMatching)
+        self.btn_prev.clicked.connect(self.onPrevious)
+        self.btn_next.clicked.connect(self.onNext)
+        self.btn_close.clicked.connect(self.close)
+        self.log.document().contentsChanged.connect(self.onContentsChanged)
+
+    def activate(self):
+        """Show the search bar and focus the search text."""
+        self.setVisible(True)
+        self.text.setFocus()
+        self.text.selectAll()
+
+    def keyPressEvent(self, event):
+        if event.key() == QtCore.Qt.Key_Escape:
+            self.close()
+            event.accept()
+        else:
+            super(SearchBar, self).keyPressEvent(event)
+
+    def closeEvent(self, event):
+        """Stop searching and remove highlights when hidden."""
+        self.stop()
+        self.pattern = None
+        self.only_matching.setChecked(False)
+        self.log.setExtraSelections([])
+        super(SearchBar, self).closeEvent(event)
+
+    def stop(self):
+        """Stop any running search."""
+        self.timer.stop()
+        if self.thread is not None:
+            self.thread.stop()
+            self.thread = None
+
+    def restart(self):
+        """Search the whole log again."""
+        self.stop()
+        self.starts = array('l')
+        self.ends = array('l')
+        self.current = -1
+        self._searched = 0
+        self._more = False
+        self.filter_view.clear()
+        self.text.setStyleSheet("")
+        self.pattern = None
+        if self.text.text():
+            try:
+                self.pattern = compile_pattern(self.text.text(),
+                                               self.regex.isChecked(),
+                                               self.case.isChecked())
+            except re.error:
+                self.text.setStyleSheet("color: rgb(255, 0, 0);")
+        self.updateHighlights()
+        self.updateCount()
+        if self.pattern is not None:
+            self.searchTail()
+
+    def onContentsChanged(self):
+        """Log text changed."""
+        if self.pattern is None:
+            return
+        if self.log.document().characterCount() - 1 < self._searched:
+            # The log was cleared.
+            self.restart()
+            return
+        self._dirty = True
+        if self.thread is None and not self.timer.isActive():
+            self.timer.start()
+
+    def onTimer(self):
+        """Search text appended since the last search."""
+        if self._dirty and self.thread is None:
+            self.searchTail()
+
+    def readTail(self):
+        """
+        Return about CHUNK_SIZE characters of the log text not searched yet,
+        ending at the end of a line, and whether there is more after it.
+        """
+        document = self.log.document()
+        block = document.findBlock(self._searched)
+        pieces = []
+        size = 0
+        if block.isValid() and block.position() < self._searched:
+            # The rest of a long line that was searched in part.
+            cursor = QtGui.QTextCursor(document)
+            cursor.setPosition(self._searched)
+            cursor.movePosition(QtGui.QTextCursor.EndOfBlock,
+                                QtGui.QTextCursor.KeepAnchor)
+            pieces.append(cursor.selectedText())
+            size += len(pieces[-1]) + 1
+            block = block.next()
+        while block.isValid() and size < CHUNK_SIZE:
+            pieces.append(block.text())
+            size += len(pieces[-1]) + 1
+            block = block.next()
+        more = block.isValid()
+        text = u'\n'.join(pieces)
+        if more:
+            text += u'\n'
+        return text, more
+
+    def searchTail(self):
+        """Start a search on the log text not searched yet."""
+        self._dirty = False
+        text, self._more = self.readTail()
+        base = self._searched
+        # Hold back an incomplete last line, so a match can't be split.
+        end = text.rfind(u'\n') + 1
+        if len(text) - end > MAX_CARRY:
+            end = len(text)
+        if not end:
+            return
+        text = text[:end]
+        self._searched = base + utf16_len(text)
+        self.thread = SearchThread(text, base, self.pattern,
+                                   self.only_matching.isChecked())
+        self.thread.found.connect(self.onFound)
+        self.thread.finished.connect(self.onFinished)
+        self.thread.start()
+
+    def onFound(self, result):
+        """Batch of matches received from the search thread."""
+        if self.sender() is not self.thread:
+            return
+        starts, ends, lines = result
+        first = len(self.starts)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        if lines:
+            self.filter_view.appendPlainText(u'\n'.join(lines))
+        if first < MAX_HIGHLIGHTS and starts:
+            self.updateHighlights()
+        self.updateCount()
+
+    def onFinished(self):
+        """Search thread finished."""
+        if self.sender() is not self.thread:
+            return
+        self.thread = None
+        if self._more:
+            self.searchTail()
+        elif self._dirty:
+            self.timer.start()
+
+    def onOnlyMatching(self, checked):
+        """Toggle between the full log and only the matching lines."""
+        self.log.setVisible(not checked)
+        self.filter_view.setVisible(checked)
+        self.restart()
+
+    def updateCount(self):
+        """Update the match count label."""
+        if self.pattern is None:
+            self.count.setText("")
+        elif self.current >= 0:
+            self.count.setText("%d of %d" % (self.current + 1,
+                                             len(self.starts)))
+        else:
+            self.count.setText("%d matches" % len(self.starts))
+
+    def selection(self, index, color):
+        """Return an extra selection for a match."""
+        selection = QTextEdit.ExtraSelection()
+        selection.format.setBackground(color)
+        cursor = QtGui.QTextCursor(self.log.document())
+        cursor.setPosition(self.starts[index])
+        cursor.setPosition(self.ends[index], QtGui.QTextCursor.KeepAnchor)
+        selection.cursor = cursor
+        return selection
+
+    def updateHighlights(self):
+        """Highlight matches around the current match."""
+        if self.current >= 0:
+            first = max(0, self.current - MAX_HIGHLIGHTS // 2)
+        else:
+            first = 0
+        last = min(len(self.starts), first + MAX_HIGHLIGHTS)
+        color = QColor(QtCore.Qt.yellow)
+        selections = [self.selection(i, color) for i in range(first, last)]
+        if self.current >= 0:
+            selections.append(self.selection(self.current,
+                                             QColor(255, 165, 0)))
+        self.log.setExtraSelections(selections)
+
+    def moveTo(self, index):
+        """Make a match the current match and scroll to it."""
+        if not len(self.starts):
+            return
+        self.current = index % len(self.starts)
+        cursor = self.log.textCursor()
+        cursor.setPosition(self.starts[self.current])
+        self.log.setTextCursor(cursor)
+        self.log.ensureCursorVisible()
+        self.updateHighlights()
+        self.updateCount()
+
+    def onNext(self):
+        """Move to the next match after the cursor."""
+        position = self.log.textCursor().position()
+        self.moveTo(bisect.bisect_right(self.starts, position))
+
+    def onPrevious(self):
+        """Move to the previous match before the cursor."""
+        position = self.log.textCursor().position()
+        self.moveTo(bisect.bisect_left(self.starts, position) - 1)
@@ -0,0 +1,266 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Log file writer with size and time based rotation and compression.
+
+When the log is rotated, the current file is renamed to a segment named
+after the time it was started, and a line is appended to an index file next
+to the log with the start time, end time and name of the segment.  Closed
+segments are compressed on a background thread.
+"""
+import os
+import gzip
+import time
+import shutil
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+try:
+    import zstandard
+except ImportError:
+    zstandard = None # pylint: disable=invalid-name
+
+COMPRESSORS = ['gzip']
+if zstandard is not None:
+    COMPRESSORS.append('zstd')
+
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+def index_path(path):
+    """Return the name of the index file for a log file."""
+    return path + '.index'
+
+def read_index(path):
+    """Return a list of (start, end, segment path) for a log file."""
+    entries = []
+    directory = os.path.dirname(path)
+    try:
+        with open(index_path(path), 'r') as handle:
+            for line in handle:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != 3:
+                    continue
+                try:
+                    entries.append((float(fields[0]), float(fields[1]),
+                                    os.path.join(directory, fields[2])))
+                except ValueError:
+                    pass
+    except (IOError, OSError):
+        pass
+    return entries
+
+def find_segments(path, start, end):
+    """
+    Return the segment files of a log that may contain entries between start
+    and end, oldest first, including the live log file.
+
+    A segment that hasn't been compressed yet is returned by its original
+    name.
+    """
+    found = []
+    last = None
+    for seg_start, seg_end, segment in read_index(path):
+        last = seg_end if last is None else max(last, seg_end)
+        if seg_end < start or seg_start > end:
+            continue
+        if not os.path.exists(segment):
+            for ext in EXTENSIONS.values():
+                if segment.endswith(ext) and \
+                   os.path.exists(segment[:-len(ext)]):
+                    segment = segment[:-len(ext)]
+        found.append(segment)
+    if os.path.exists(path) and (last is None or last <= end):
+        found.append(path)
+    return found
+
+def compress_file(source, compress):
+    """
+    Compress source to source plus the compressor's extension, streaming,
+    then remove source.
+    """
+    target = source + EXTENSIONS[compress]
+    temp = target + '.tmp'
+    with open(source, 'rb') as src:
+        if compress == 'zstd':
+            with open(temp, 'wb') as raw:
+                compressor = zstandard.ZstdCompressor(level=10)
+                with compressor.stream_writer(raw) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            with gzip.open(temp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.rename(temp, target)
+    os.remove(source)
+
+class Compressor(threading.Thread):
+    """
+    Background thread that compresses closed log segments in order.
+
+    A segment that can't be compressed is left as it is, and on_error, if
+    given, is called with a message on this thread.
+    """
+
+    def __init__(self, on_error=None):
+        super(Compressor, self).__init__()
+        self.daemon = True
+        self.jobs = queue.Queue()
+        self.on_error = on_error
+
+    def add(self, source, compress):
+        """Queue a file to be compressed."""
+        self.jobs.put((source, compress))
+
+    def stop(self, wait=True):
+        """Stop the thread after queued jobs are finished."""
+        self.jobs.put(None)
+        if wait:
+            self.join()
+
+    def run(self):
+        """Thread run loop."""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                compress_file(*job)
+            except (IOError, OSError) as exp:
+                if self.on_error is not None:
+                    self.on_error("Can't compress %s: %s" % (job[0], exp))
+
+class RotatingLogWriter(object):
+    """
+    Appends to a log file, rotating it when it gets bigger than max_bytes or
+    older than max_age seconds.  A limit of 0 disables that rotation.  If
+    compress is 'gzip' or 'zstd', closed segments are compressed, and
+    on_error is called, on the compressor thread, for any that fail.
+
+    write() may be called from any thread.  If writing or rotating fails,
+    the writer closes itself and raises the IOError or OSError, and later
+    writes do nothing.
+    """
+
+    def __init__(self, path, max_bytes=0, max_age=0, compress=None,
+                 on_error=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress if compress in COMPRESSORS else None
+        self._lock = threading.Lock()
+        self.compressor = None
+        if self.compress is not None:
+            self.compressor = Compressor(on_error)
+            self.compressor.start()
+            self.recover()
+        self.handle = None
+        self.started = time.time()
+        self.size = 0
+        try:
+            if self.rotating() and os.path.exists(path) and \
+               os.path.getsize(path):
+                # Start a new segment, since there's no record of when the old
+                # contents were written.
+                mtime = os.path.getmtime(path)
+                self.started = mtime
+                self.rotate(mtime)
+            self.open()
+        except (IOError, OSError):
+            self._close(quiet=True)
+            raise
+
+    def rotating(self):
+        """Return True if any rotation limit is set."""
+        return bool(self.max_bytes or self.max_age)
+
+    def recover(self):
+        """Queue segments left uncompressed by a previous run."""
+        for _, _, segment in read_index(self.path):
+            ext = EXTENSIONS[self.compress]
+            if segment.endswith(ext) and not os.path.exists(segment) and \
+               os.path.exists(segment[:-len(ext)]):
+                self.compressor.add(segment[:-len(ext)], self.compress)
+
+    def open(self):
+        """Open the live log file."""
+        self.handle = open(self.path, 'ab')
+        self.size = self.handle.tell()
+
+    def segmentName(self, started):
+        """Return an unused segment file name for a start time."""
+        base = self.path + time.strftime('.%Y%m%d-%H%M%S',
+                                         time.localtime(started))
+        name = base
+        count = 1
+        while any(os.path.exists(name + ext) for ext in
+                  [''] + list(EXTENSIONS.values())):
+            name = '%s.%d' % (base, count)
+            count += 1
+        return name
+
+    def rotate(self, now=None):
+        """Close the live log file as a segment and start a new one."""
+        if now is None:
+            now = time.time()
+        handle = self.handle
+        self.handle = None
+        if handle is not None:
+            handle.close()
+        segment = self.segmentName(self.started)
+        os.rename(self.path, segment)
+        name = os.path.basename(segment)
+        if self.compress is not None:
+            name += EXTENSIONS[self.compress]
+        with open(index_path(self.path), 'a') as index:
+            index.write('%.6f\t%.6f\t%s\n' % (self.started, now, name))
+        if self.compress is not None:
+            self.compressor.add(segment, self.compress)
+        self.started = now
+
+    def write(self, text):
+        """Append text to the log, rotating first if it's due."""
+        data = text.encode('utf-8')
+        with self._lock:
+            if self.handle is None:
+                return
+            try:
+                if self.max_age and \
+                   time.time() - self.started >= self.max_age:
+                    if self.size:
+                        self.rotate()
+                        self.open()
+                    else:
+                        self.started = time.time()
+                self.handle.write(data)
+                self.handle.flush()
+                self.size += len(data)
+                if self.max_bytes and self.size >= self.max_bytes:
+                    self.rotate()
+                    self.open()
+            except (IOError, OSError):
+                self._close(quiet=True)
+                raise
+
+    def close(self):
+        """Close the log.  Queued compression finishes in the background."""
+        with self._lock:
+            self._close()
+
+    def _close(self, quiet=False):
+        """
+        Close the live log file and stop the compressor, with the lock held.
+        With quiet, an error closing the file is ignored.
+        """
+        handle = self.handle
+        self.handle = None
+        if self.compressor is not None:
+            self.compressor.stop(wait=False)
+            self.compressor = None
+        if handle is not None:
+            try:
+                handle.close()
+            except (IOError, OSError):
+                if not quiet:
+                    raise
@@ -0,0 +1,154 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Dialog for editing macros and sequences.
+"""
+from qt import *
+from macros import KINDS, Macro, Sequence
+
+LINE_END_NAMES = ["LF", "CR", "CR/LF", "LF/CR", "None"]
+
+class MacroDialog(QDialog):
+    """Macro and sequence editor dialog."""
+
+    def __init__(self, macros, sequences, parent=None):
+        super(MacroDialog, self).__init__(parent)
+        self.setWindowTitle("Macros")
+        self.macros = macros
+        self.sequences = sequences
+
+        self.macro_table = QTableWidget(0, 5, self)
+        self.macro_table.setHorizontalHeaderLabels(
+            ["Name", "Type", "Data", "Line End", "Hotkey"])
+        self.macro_table.horizontalHeader().setStretchLastSection(True)
+        self.macro_table.setToolTip(
+            "Text is sent as typed, Hex as hex bytes, Escapes allows \\r, \\n"
+            " and \\xNN escapes, and File sends the contents of a file.")
+        for macro in macros:
+            self.addMacroRow(macro)
+
+        self.sequence_table = QTableWidget(0, 3, self)
+        self.sequence_table.setHorizontalHeaderLabels(
+            ["Name", "Steps", "Repeat"])
+        self.sequence_table.horizontalHeader().setStretchLastSection(True)
+        self.sequence_table.setToolTip(
+            "Steps are macro names and the delay after each in milliseconds,"
+            " like \"reset:500, status:100\".  A repeat of 0 runs until"
+            " stopped.")
+        for sequence in sequences:
+            self.addSequenceRow(sequence)
+
+        btn_add_macro = QPushButton("Add Macro", self)
+        btn_del_macro = QPushButton("Remove Macro", self)
+        btn_add_sequence = QPushButton("Add Sequence", self)
+        btn_del_sequence = QPushButton("Remove Sequence", self)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok |
+                                   QDialogButtonBox.Cancel, parent=self)
+
+        macro_buttons = QHBoxLayout()
+        macro_buttons.addWidget(btn_add_macro)
+        macro_buttons.addWidget(btn_del_macro)
+        macro_buttons.addStretch()
+        sequence_buttons = QHBoxLayout()
+        sequence_buttons.addWidget(btn_add_sequence)
+        sequence_buttons.addWidget(btn_del_sequence)
+        sequence_buttons.addStretch()
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Macros:", self))
+        layout.addWidget(self.macro_table)
+        layout.addLayout(macro_buttons)
+        layout.addWidget(QLabel("Sequences:", self))
+        layout.addWidget(self.sequence_table)
+        layout.addLayout(sequence_buttons)
+        layout.addWidget(buttons)
+
+        btn_add_macro.clicked.connect(self.onAddMacro)
+        btn_del_macro.clicked.connect(self.onRemoveMacro)
+        btn_add_sequence.clicked.connect(self.onAddSequence)
+        btn_del_sequence.clicked.connect(self.onRemoveSequence)
+        buttons.accepted.connect(self.onAccept)
+        buttons.rejected.connect(self.reject)
+        self.resize(640, 480)
+
+    def addMacroRow(self, macro):
+        """Add a row to the macro table."""
+        row = self.macro_table.rowCount()
+        self.macro_table.insertRow(row)
+        self.macro_table.setItem(row, 0, QTableWidgetItem(macro.name))
+        kind = QComboBox(self.macro_table)
+        kind.addItems(KINDS)
+        kind.setCurrentIndex(max(0, kind.findText(macro.kind)))
+        self.macro_table.setCellWidget(row, 1, kind)
+        self.macro_table.setItem(row, 2, QTableWidgetItem(macro.data))
+        line_end = QComboBox(self.macro_table)
+        line_end.addItems(LINE_END_NAMES)
+        line_end.setCurrentIndex(macro.line_end)
+        self.macro_table.setCellWidget(row, 3, line_end)
+        self.macro_table.setItem(row, 4, QTableWidgetItem(macro.shortcut))
+
+    def addSequenceRow(self, sequence):
+        """Add a row to the sequence table."""
+        row = self.sequence_table.rowCount()
+        self.sequence_table.insertRow(row)
+        self.sequence_table.setItem(row, 0, QTableWidgetItem(sequence.name))
+        self.sequence_table.setItem(row, 1, QTableWidgetItem(sequence.steps))
+        repeat = QSpinBox(self.sequence_table)
+        repeat.setRange(0, 1000000)
+        repeat.setSpecialValueText("Forever")
+        repeat.setValue(sequence.repeat)
+        self.sequence_table.setCellWidget(row, 2, repeat)
+
+    def onAddMacro(self):
+        """Add macro button clicked."""
+        self.addMacroRow(Macro("macro%d" % (self.macro_table.rowCount() + 1)))
+
+    def onRemoveMacro(self):
+        """Remove macro button clicked."""
+        self.macro_table.removeRow(self.macro_table.currentRow())
+
+    def onAddSequence(self):
+        """Add sequence button clicked."""
+        self.addSequenceRow(
+            Sequence("sequence%d" % (self.sequence_table.rowCount() + 1)))
+
+    def onRemoveSequence(self):
+        """Remove sequence button clicked."""
+        self.sequence_table.removeRow(self.sequence_table.currentRow())
+
+    def onAccept(self):
+        """Compile everything and accept, or show what is wrong."""
+        macros = []
+        sequences = []
+        table = self.macro_table
+        try:
+            for row in range(table.rowCount()):
+                name = table.item(row, 0).text().strip()
+                if not name:
+                    raise ValueError('Macro %d has no name' % (row + 1))
+                try:
+                    macros.append(Macro(name,
+                                        table.cellWidget(row, 1).currentText(),
+                                        table.item(row, 2).text(),
+                                        table.cellWidget(row, 3).currentIndex(),
+                                        table.item(row, 4).text().strip()))
+                except ValueError as exp:
+                    raise ValueError('Macro %s: %s' % (name, exp))
+            names = dict((macro.name, macro) for macro in macros)
+            table = self.sequence_table
+            for row in range(table.rowCount()):
+                name = table.item(row, 0).text().strip()
+                try:
+                    sequence = Sequence(name, table.item(row, 1).text(),
+                                        table.cellWidget(row, 2).value())
+                    sequence.compile(names)
+                except ValueError as exp:
+                    raise ValueError('Sequence %s: %s' % (name, exp))
+                sequences.append(sequence)
+        except ValueError as exp:
+            QMessageBox.critical(self, 'Macro Error', str(exp))
+            return
+        self.macros = macros
+        self.sequences = sequences
+        self.accept()
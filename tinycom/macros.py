@@ -0,0 +1,227 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Named transmit payloads and timed sequences of them.
+"""
+import time
+import codecs
+import binascii
+import threading
+from qt import *
+
+# Line endings, in the order of the line ending combo boxes.
+LINE_ENDINGS = [b"\n", b"\r", b"\r\n", b"\n\r", b""]
+
+KINDS = ["Text", "Hex", "Escapes", "File"]
+
+# When waiting for the next step of a sequence, sleep until this many seconds
+# before it is due and then spin, because sleeps can overshoot by a scheduler
+# tick.
+SPIN_TIME = 0.002
+
+_clock = getattr(time, 'perf_counter', time.time) # pylint: disable=invalid-name
+
+def hex_to_bytes(text):
+    """Convert hex text, ignoring whitespace, to bytes."""
+    text = ''.join(text.split())
+    if len(text) % 2:
+        raise ValueError('Hex encoded values must be a multiple of 2')
+    try:
+        return binascii.unhexlify(text.encode('ascii'))
+    except (TypeError, binascii.Error, UnicodeError):
+        raise ValueError('Invalid hex encoded value')
+
+def compile_payload(kind, data, line_end=len(LINE_ENDINGS) - 1,
+                    encoding="utf-8"):
+    """
+    Compile a payload to the bytes to send.
+
+    Text is encoded with encoding.  Escapes is text with backslash escapes like \\r
+    and \\x1b.  File reads the contents of the file named by data.  Raises
+    ValueError if the payload is invalid.
+    """
+    if kind == "Hex":
+        return hex_to_bytes(data)
+    elif kind == "File":
+        try:
+            with open(data, 'rb') as handle:
+                return handle.read()
+        except (IOError, OSError) as exp:
+            raise ValueError(str(exp))
+    elif kind == "Escapes":
+        try:
+            raw = codecs.escape_decode(data.encode(encoding))[0]
+        except (ValueError, UnicodeError) as exp:
+            raise ValueError('Invalid escape sequence: ' + str(exp))
+    else:
+        try:
+            raw = data.encode(encoding)
+        except UnicodeError as exp:
+            raise ValueError(str(exp))
+    return raw + LINE_ENDINGS[line_end]
+
+class Macro(object):
+    """
+    A named payload, compiled once to bytes when it is defined.
+
+    With check False, a payload that doesn't compile, like a file that was
+    removed, doesn't raise.  The macro is kept and compiled again each time
+    it's used, so a stored macro isn't lost.
+    """
+
+    def __init__(self, name, kind="Text", data="", line_end=0, shortcut="",
+                 check=True):
+        self.name = name
+        self.kind = kind
+        self.data = data
+        self.line_end = line_end
+        self.shortcut = shortcut
+        self.raw = None
+        try:
+            self.raw = compile_payload(kind, data, line_end)
+        except ValueError:
+            if check:
+                raise
+
+    def payload(self):
+        """Return the bytes to send.  Raises ValueError if it doesn't compile."""
+        if self.raw is None:
+            self.raw = compile_payload(self.kind, self.data, self.line_end)
+        return self.raw
+
+class Sequence(object):
+    """
+    A named list of steps, each a macro name and the delay in milliseconds
+    after sending it, repeated a number of times or forever if repeat is 0.
+
+    Steps are written as "name:delay, name:delay".
+    """
+
+    def __init__(self, name, steps="", repeat=1):
+        self.name = name
+        self.steps = steps
+        self.repeat = repeat
+        self.parsed = []
+        for step in steps.split(','):
+            step = step.strip()
+            if not step:
+                continue
+            macro, _, delay = step.partition(':')
+            try:
+                delay = float(delay) / 1000.0 if delay.strip() else 0.0
+            except ValueError:
+                raise ValueError('Invalid delay in step ' + step)
+            self.parsed.append((macro.strip(), delay))
+
+    def compile(self, macros):
+        """Resolve steps to a list of (bytes, delay) using a macro dict."""
+        steps = []
+        for name, delay in self.parsed:
+            if name not in macros:
+                raise ValueError('Unknown macro ' + name)
+            steps.append((macros[name].payload(), delay))
+        return steps
+
+def load_macros(settings):
+    """Load macros and sequences from settings."""
+    macros = []
+    sequences = []
+    count = settings.beginReadArray("macros")
+    for i in range(count):
+        settings.setArrayIndex(i)
+        try:
+            line_end = int(settings.value("line_end", 0))
+        except ValueError:
+            line_end = 0
+        macros.append(Macro(settings.value("name", ""),
+                            settings.value("kind", "Text"),
+                            settings.value("data", ""),
+                            line_end,
+                            settings.value("shortcut", ""),
+                            check=False))
+    settings.endArray()
+    count = settings.beginReadArray("sequences")
+    for i in range(count):
+        settings.setArrayIndex(i)
+        try:
+            sequences.append(Sequence(settings.value("name", ""),
+                                      settings.value("steps", ""),
+                                      int(settings.value("repeat", 1))))
+        except ValueError:
+            pass
+    settings.endArray()
+    return macros, sequences
+
+def save_macros(settings, macros, sequences):
+    """Save macros and sequences to settings."""
+    settings.beginWriteArray("macros", len(macros))
+    for i, macro in enumerate(macros):
+        settings.setArrayIndex(i)
+        settings.setValue("name", macro.name)
+        settings.setValue("kind", macro.kind)
+        settings.setValue("data", macro.data)
+        settings.setValue("line_end", macro.line_end)
+        settings.setValue("shortcut", macro.shortcut)
+    settings.endArray()
+    settings.beginWriteArray("sequences", len(sequences))
+    for i, sequence in enumerate(sequences):
+        settings.setArrayIndex(i)
+        settings.setValue("name", sequence.name)
+        settings.setValue("steps", sequence.steps)
+        settings.setValue("repeat", sequence.repeat)
+    settings.endArray()
+
+class SequenceThread(QtCore.QThread):
+    """
+    Sends the steps of a sequence on a precise schedule.
+
+    Each step is due at a fixed time from the start of the sequence, rather
+    than a delay after the previous write finished, so timing errors don't
+    accumulate over a long run.
+    """
+
+    sent = QtCore.pyqtSignal(bytes, name='sent')
+    send_error = QtCore.pyqtSignal(str, name='send_error')
+
+    def __init__(self, name, steps, repeat, write):
+        super(SequenceThread, self).__init__()
+        self.name = name
+        self.steps = steps
+        self.repeat = repeat
+        self.write = write
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Stop the sequence and wait for the thread to finish."""
+        self._stopped.set()
+        self.wait()
+
+    def sleepUntil(self, deadline):
+        """Wait until the deadline, returning False if stopped first."""
+        remaining = deadline - _clock() - SPIN_TIME
+        if remaining > 0 and self._stopped.wait(remaining):
+            return False
+        while _clock() < deadline:
+            if self._stopped.is_set():
+                return False
+        return not self._stopped.is_set()
+
+    def run(self):
+        """Thread run loop."""
+        if not self.steps:
+            return
+        count = 0
+        deadline = _clock()
+        while not self.repeat or count < self.repeat:
+            for raw, delay in self.steps:
+                if not self.sleepUntil(deadline):
+                    return
+                try:
+                    self.write(raw)
+                except Exception as exp: # pylint: disable=broad-except
+                    self.send_error.emit(str(exp))
+                    return
+                self.sent.emit(raw)
+                deadline += delay
+            count += 1
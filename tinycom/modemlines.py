@@ -0,0 +1,184 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Watches the modem status lines of the open port.
+
+For local POSIX ports, a thread reads the lines with the TIOCMGET ioctl
+every WATCH_INTERVAL, whether or not data arrives.  It doesn't block in
+TIOCMIWAIT, which only returns when a line changes and can't be woken up
+otherwise, so a thread waiting in it would keep the port open after it was
+closed.  Elsewhere, for ports without a file descriptor like network URLs,
+and for drivers without TIOCMGET, the lines are polled from the serial
+thread after every read, which is at least every read timeout.
+"""
+import struct
+import threading
+import collections
+import serial
+from qt import *
+from lineframer import clock
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = None # pylint: disable=invalid-name
+    termios = None # pylint: disable=invalid-name
+
+# Lines set by us, and lines set by the other end.
+OUTPUTS = ["DTR", "RTS"]
+INPUTS = ["CTS", "DSR", "RI", "CD"]
+
+# Changes kept for the GUI to take.  The oldest are dropped beyond this.
+MAX_EVENTS = 10000
+
+# Polling from the serial thread reads the lines at most this often.
+POLL_INTERVAL = 0.01
+
+# How often the watch thread reads the lines.
+WATCH_INTERVAL = 0.005
+
+# Modem bits from <sys/ioctl.h>, where termios lacks them.
+_BITS = [("CTS", "TIOCM_CTS", 0x020), ("DSR", "TIOCM_DSR", 0x100),
+         ("RI", "TIOCM_RNG", 0x080), ("CD", "TIOCM_CAR", 0x040)]
+
+def read_inputs(port):
+    """Return the states of the INPUTS lines as a tuple of bools."""
+    if hasattr(port, 'cts'):
+        return (port.cts, port.dsr, port.ri, port.cd)
+    return (port.getCTS(), port.getDSR(), port.getRI(), port.getCD())
+
+def set_output(port, line, state):
+    """Set DTR or RTS."""
+    if hasattr(port, 'dtr'):
+        setattr(port, line.lower(), state)
+    elif line == "DTR":
+        port.setDTR(state)
+    else:
+        port.setRTS(state)
+
+def _fileno(port):
+    """Return the file descriptor of a local POSIX port, or None."""
+    if fcntl is None or not isinstance(port, serial.Serial):
+        return None
+    try:
+        return port.fileno()
+    except (AttributeError, serial.SerialException, IOError, OSError):
+        return None
+
+class ModemLineMonitor(QtCore.QObject):
+    """
+    Records changes of the modem status lines.
+
+    Changes are queued as (stamp, line, state) and ready is signaled when
+    the queue goes from empty to not empty, so a line that toggles
+    thousands of times a second under flow control can't flood the GUI.
+    Each change is also passed to log(text, stamp) on the thread that saw
+    it, so polled changes are logged in order with the data around them.
+    """
+
+    ready = QtCore.pyqtSignal(name='ready')
+
+    def __init__(self, port, log=None, parent=None):
+        super(ModemLineMonitor, self).__init__(parent)
+        self.port = port
+        self.log = log
+        self.states = dict((line, False) for line in INPUTS)
+        self.changes = collections.Counter()
+        self.events = collections.deque()
+        self.dropped = 0
+        self.watching = False
+        self._last = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Read the lines and start a thread to watch them if possible.  poll()
+        should still be called regularly, and does nothing while the thread
+        is watching.
+        """
+        try:
+            states = read_inputs(self.port)
+        except (serial.SerialException, IOError, OSError, ValueError):
+            states = (False,) * len(INPUTS)
+        self.states = dict(zip(INPUTS, states))
+        if self.log is not None:
+            self.log("Modem lines " + self.describe(), clock())
+        fd = _fileno(self.port)
+        if fd is None or not hasattr(termios, 'TIOCMGET'):
+            return
+        self._thread = threading.Thread(target=self.runWatch, args=(fd,),
+                                        name='tinycom-modem')
+        self._thread.daemon = True
+        self.watching = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching, and wait for the watch thread to finish, so it's done
+        with the port before the port is closed.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def describe(self):
+        """Return the input line states as text."""
+        return ", ".join("%s %s" % (line, "on" if self.states[line] else "off")
+                         for line in INPUTS)
+
+    def runWatch(self, fd):
+        """Watch thread run loop."""
+        while not self._stopped.wait(WATCH_INTERVAL):
+            try:
+                bits = struct.unpack(
+                    'I', fcntl.ioctl(fd, termios.TIOCMGET,
+                                     struct.pack('I', 0)))[0]
+            except (IOError, OSError):
+                # Not supported by the driver, or the port went away, so
+                # leave it to poll().
+                self.watching = False
+                return
+            self.update(tuple(bool(bits & getattr(termios, name, default))
+                              for _, name, default in _BITS), clock())
+
+    def poll(self, stamp):
+        """Read the lines, at most every POLL_INTERVAL.  Call from one thread."""
+        if self.watching or self._stopped.is_set() or \
+           stamp - self._last < POLL_INTERVAL:
+            return
+        self._last = stamp
+        try:
+            states = read_inputs(self.port)
+        except (serial.SerialException, IOError, OSError, ValueError):
+            return
+        self.update(states, stamp)
+
+    def update(self, states, stamp):
+        """Record the lines that changed."""
+        notify = False
+        for line, state in zip(INPUTS, states):
+            if self.states[line] == state:
+                continue
+            self.states[line] = state
+            self.changes[line] += 1
+            if self.log is not None:
+                self.log("%s %s" % (line, "on" if state else "off"), stamp)
+            with self._lock:
+                if len(self.events) >= MAX_EVENTS:
+                    self.events.popleft()
+                    self.dropped += 1
+                notify = notify or not self.events
+                self.events.append((stamp, line, state))
+        if notify:
+            self.ready.emit()
+
+    def take(self):
+        """Take the queued changes as a list of (stamp, line, state)."""
+        with self._lock:
+            events = list(self.events)
+            self.events.clear()
+        return events
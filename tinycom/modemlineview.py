@@ -0,0 +1,128 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Dock that shows and sets the modem lines, with a timeline of changes.
+"""
+from qt import *
+import modemlines
+from lineframer import format_stamp
+
+# Oldest timeline lines are dropped once there are more than this many.
+MAX_LINES = 10000
+
+ON_STYLE = "background-color: rgb(0, 200, 0); color: white; padding: 2px;"
+OFF_STYLE = "background-color: rgb(200, 200, 200); padding: 2px;"
+
+class ModemLineDock(QDockWidget):
+    """
+    Modem line buttons, indicators and timeline.
+
+    Setting a line needs the port, so the main window handles the outputs
+    buttons, and calls start() and finish() with a ModemLineMonitor.
+    """
+
+    def __init__(self, parent=None):
+        super(ModemLineDock, self).__init__("Modem Lines", parent)
+        self.setObjectName("modemline_dock")
+        self.monitor = None
+        self.last = {}
+
+        widget = QWidget(self)
+        top = QHBoxLayout()
+        self.outputs = {}
+        for line in modemlines.OUTPUTS:
+            button = QPushButton(line, widget)
+            button.setCheckable(True)
+            button.setEnabled(False)
+            button.setToolTip("Set or clear " + line)
+            self.outputs[line] = button
+            top.addWidget(button)
+        top.addSpacing(12)
+        self.inputs = {}
+        for line in modemlines.INPUTS:
+            label = QLabel(line, widget)
+            label.setAlignment(QtCore.Qt.AlignCenter)
+            label.setMinimumWidth(40)
+            label.setStyleSheet(OFF_STYLE)
+            self.inputs[line] = label
+            top.addWidget(label)
+        self.mode = QLabel(widget)
+        top.addWidget(self.mode)
+        top.addStretch()
+        btn_clear = QPushButton("Clear", widget)
+        top.addWidget(btn_clear)
+
+        self.timeline = QPlainTextEdit(widget)
+        self.timeline.setReadOnly(True)
+        self.timeline.setMaximumBlockCount(MAX_LINES)
+        self.timeline.setLineWrapMode(QPlainTextEdit.NoWrap)
+        font = QFont("Monospace")
+        font.setStyleHint(QFont.TypeWriter)
+        self.timeline.setFont(font)
+
+        layout = QVBoxLayout(widget)
+        layout.addLayout(top)
+        layout.addWidget(self.timeline)
+        self.setWidget(widget)
+
+        btn_clear.clicked.connect(self.timeline.clear)
+
+    def start(self, monitor):
+        """Show the lines of a port that was opened."""
+        self.monitor = monitor
+        self.last = {}
+        monitor.ready.connect(self.onReady)
+        for line, state in monitor.states.items():
+            self.setInput(line, state)
+        self.updateMode()
+        for button in self.outputs.values():
+            button.setEnabled(True)
+
+    def finish(self):
+        """The port was closed."""
+        if self.monitor is not None:
+            self.monitor.ready.disconnect(self.onReady)
+            self.onReady()
+        self.monitor = None
+        self.mode.setText("")
+        for button in self.outputs.values():
+            button.setEnabled(False)
+
+    def updateMode(self):
+        """Show how changes are seen."""
+        self.mode.setText("Watching" if self.monitor.watching
+                          else "Polling after reads")
+
+    def setOutput(self, line, state):
+        """Show the state of an output without signaling."""
+        button = self.outputs[line]
+        button.blockSignals(True)
+        button.setChecked(state)
+        button.blockSignals(False)
+
+    def setInput(self, line, state):
+        """Show the state of an input."""
+        self.inputs[line].setStyleSheet(ON_STYLE if state else OFF_STYLE)
+
+    def onReady(self):
+        """Take the changes queued by the monitor."""
+        if self.monitor is not None:
+            self.addEvents(self.monitor.take())
+            for line, state in self.monitor.states.items():
+                self.setInput(line, state)
+            self.updateMode()
+
+    def addEvents(self, events):
+        """Add (stamp, line, state) changes to the timeline."""
+        if not events:
+            return
+        lines = []
+        for stamp, line, state in events:
+            text = "%s  %-3s %-3s" % (format_stamp(stamp), line,
+                                      "on" if state else "off")
+            if line in self.last:
+                text += "  after %.6f s" % (stamp - self.last[line])
+            self.last[line] = stamp
+            lines.append(text)
+        self.timeline.appendPlainText("\n".join(lines))
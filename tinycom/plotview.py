@@ -0,0 +1,261 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Live plot of numeric values parsed from received lines.
+
+Requires NumPy.
+"""
+import re
+import itertools
+from qt import *
+try:
+    import numpy
+except ImportError:
+    numpy = None # pylint: disable=invalid-name
+
+NUMBER = re.compile(br'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+LINE_END = re.compile(br'[\r\n]')
+
+# A line longer than this isn't telemetry, so it's dropped rather than kept
+# until it ends.
+MAX_LINE = 4096
+
+MAX_CHANNELS = 8
+
+# Samples kept per channel.
+CAPACITY = 1024 * 1024
+
+# Maximum redraws per second.
+FRAME_RATE = 30
+
+COLORS = [QtCore.Qt.blue, QtCore.Qt.red, QtCore.Qt.darkGreen,
+          QtCore.Qt.magenta, QtCore.Qt.darkCyan, QtCore.Qt.darkYellow,
+          QtCore.Qt.black, QtCore.Qt.gray]
+
+class RingBuffer(object):
+    """
+    Preallocated ring buffer of samples for a fixed number of channels.
+
+    The buffer is allocated when the first samples are added, so a window
+    that never plots doesn't hold it.
+    """
+
+    def __init__(self, channels, capacity):
+        self.channels = channels
+        self.capacity = capacity
+        self.data = None
+        self.count = 0
+
+    def clear(self):
+        """Remove all samples."""
+        if self.data is not None:
+            self.data.fill(numpy.nan)
+        self.count = 0
+
+    def extend(self, rows):
+        """Append an array of samples, one row per sample."""
+        if self.data is None:
+            self.data = numpy.full((self.channels, self.capacity), numpy.nan,
+                                   dtype=numpy.float32)
+        total = len(rows)
+        if total > self.capacity:
+            rows = rows[-self.capacity:]
+        size = len(rows)
+        start = (self.count + total - size) % self.capacity
+        first = min(size, self.capacity - start)
+        self.data[:, start:start + first] = rows[:first].T
+        if size > first:
+            self.data[:, :size - first] = rows[first:].T
+        self.count += total
+
+    def last(self, size):
+        """Return the newest size samples, oldest first."""
+        size = min(size, self.count, self.capacity)
+        if self.data is None:
+            return numpy.empty((self.channels, 0), dtype=numpy.float32)
+        end = self.count % self.capacity
+        if size <= end:
+            return self.data[:, end - size:end]
+        return numpy.concatenate((self.data[:, self.capacity - (size - end):],
+                                  self.data[:, :end]), axis=1)
+
+def decimate(values, width):
+    """
+    Reduce samples to the minimum and maximum per pixel column.
+
+    Returns x positions in pixels and an array of y values per channel.  If
+    there are fewer samples than pixels, they're returned unchanged.
+    """
+    size = values.shape[1]
+    if size <= width * 2:
+        xs = numpy.arange(size) * (float(width) / max(size - 1, 1))
+        return xs, values
+    per = size // width
+    values = values[:, size - per * width:].reshape(values.shape[0], width,
+                                                   per)
+    out = numpy.empty((values.shape[0], width * 2), dtype=values.dtype)
+    # fmin/fmax ignore NaN, unlike min/max.
+    out[:, 0::2] = numpy.fmin.reduce(values, axis=2)
+    out[:, 1::2] = numpy.fmax.reduce(values, axis=2)
+    xs = numpy.repeat(numpy.arange(width), 2)
+    return xs, out
+
+class LineParser(object):
+    """Parses numeric fields from lines in a byte stream."""
+
+    def __init__(self, channels=MAX_CHANNELS):
+        self.channels = channels
+        self.partial = b''
+        self.overlong = False
+
+    def feed(self, data):
+        """Return an array of samples, one row per complete line."""
+        if self.overlong:
+            # Skip the rest of a line that was too long.
+            match = LINE_END.search(data)
+            if match is None:
+                return None
+            data = data[match.end():]
+            self.overlong = False
+        data = self.partial + data
+        end = max(data.rfind(b'\n'), data.rfind(b'\r'))
+        self.partial = data[end + 1:]
+        if len(self.partial) > MAX_LINE:
+            self.partial = b''
+            self.overlong = True
+        if end < 0:
+            return None
+        rows = []
+        for line in data[:end].splitlines():
+            values = NUMBER.findall(line)
+            if values:
+                rows.append(values[:self.channels])
+        if not rows:
+            return None
+        # Convert every value in one pass, then scatter them to their row
+        # and column.
+        counts = numpy.array([len(values) for values in rows])
+        flat = numpy.array(list(itertools.chain.from_iterable(rows)))
+        starts = numpy.cumsum(counts) - counts
+        samples = numpy.full((len(rows), self.channels), numpy.nan,
+                             dtype=numpy.float32)
+        samples[numpy.repeat(numpy.arange(len(rows)), counts),
+                numpy.arange(len(flat)) - numpy.repeat(starts, counts)] = \
+            flat.astype(numpy.float32)
+        return samples
+
+class PlotWidget(QWidget):
+    """Draws the newest samples of a ring buffer."""
+
+    def __init__(self, ring, parent=None):
+        super(PlotWidget, self).__init__(parent)
+        self.ring = ring
+        self.span = 10000
+        self.channels = 0
+        self.setMinimumHeight(100)
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QPalette.Window, QtCore.Qt.white)
+        self.setPalette(palette)
+
+    def paintEvent(self, event):
+        _ = event
+        painter = QPainter(self)
+        width = max(self.width(), 1)
+        height = self.height()
+        values = self.ring.last(self.span)[:self.channels]
+        if not values.size:
+            return
+        xs, ys = decimate(values, width)
+        low = numpy.nanmin(ys) if not numpy.isnan(ys).all() else 0.0
+        high = numpy.nanmax(ys) if not numpy.isnan(ys).all() else 1.0
+        if high == low:
+            high, low = high + 1.0, low - 1.0
+        scale = (height - 20) / (high - low)
+        painter.setPen(QtCore.Qt.darkGray)
+        painter.drawText(4, 12, "%g" % high)
+        painter.drawText(4, height - 4, "%g" % low)
+        for channel in range(ys.shape[0]):
+            points = height - 10 - (ys[channel] - low) * scale
+            valid = ~numpy.isnan(points)
+            painter.setPen(COLORS[channel % len(COLORS)])
+            painter.drawPolyline(QPolygonF([
+                QtCore.QPointF(x, y)
+                for x, y in zip(xs[valid].tolist(), points[valid].tolist())]))
+
+class PlotDock(QDockWidget):
+    """Dock with a live plot of numeric values in received lines."""
+
+    def __init__(self, parent=None):
+        super(PlotDock, self).__init__("Plot", parent)
+        self.setObjectName("plot_dock")
+        self.dirty = False
+
+        if numpy is None:
+            self.setWidget(QLabel("Plotting requires NumPy.", self))
+            self.parser = None
+            return
+
+        self.ring = RingBuffer(MAX_CHANNELS, CAPACITY)
+        self.parser = LineParser()
+
+        widget = QWidget(self)
+        self.plot = PlotWidget(self.ring, widget)
+        self.span = QSpinBox(widget)
+        self.span.setRange(10, CAPACITY)
+        self.span.setValue(self.plot.span)
+        self.span.setSuffix(" samples")
+        self.span.setToolTip("Number of most recent samples to show.")
+        self.pause = QCheckBox("Pause", widget)
+        self.btn_clear = QPushButton("Clear", widget)
+        self.info = QLabel(widget)
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Show:", widget))
+        top.addWidget(self.span)
+        top.addWidget(self.pause)
+        top.addWidget(self.info)
+        top.addStretch()
+        top.addWidget(self.btn_clear)
+        layout = QVBoxLayout(widget)
+        layout.addLayout(top)
+        layout.addWidget(self.plot)
+        self.setWidget(widget)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.onTimer)
+        self.timer.start(1000 // FRAME_RATE)
+
+        self.span.valueChanged.connect(self.onSpan)
+        self.btn_clear.clicked.connect(self.onClear)
+
+    def onSpan(self, value):
+        """Span spin box changed."""
+        self.plot.span = value
+        self.dirty = True
+
+    def onClear(self):
+        """Clear button clicked."""
+        self.ring.clear()
+        self.plot.channels = 0
+        self.dirty = True
+
+    def onTimer(self):
+        """Redraw if there's anything new, at most FRAME_RATE times a second."""
+        if self.dirty and not self.pause.isChecked() and self.isVisible():
+            self.dirty = False
+            self.info.setText("%d samples" % self.ring.count)
+            self.plot.update()
+
+    def feed(self, data):
+        """Parse received data."""
+        if self.parser is None or not self.isVisible():
+            return
+        samples = self.parser.feed(data)
+        if samples is not None:
+            self.ring.extend(samples)
+            channels = int((~numpy.isnan(samples)).sum(axis=0).nonzero()[0].max()) + 1
+            self.plot.channels = max(self.plot.channels, channels)
+            self.dirty = True
@@ -0,0 +1,205 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Built in profiler, so a profile of a stall can be attached to a bug report.
+
+A session runs cProfile on the GUI thread, samples the stacks of every
+thread, including the serial reader, at a fixed interval, and takes
+tracemalloc snapshots at the start and end when tracemalloc is available.
+Stopping writes the cProfile stats, the final memory snapshot and a short
+text summary of the hottest functions to a directory.
+
+This module doesn't import Qt.
+"""
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import platform
+import threading
+import collections
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    from threading import get_ident
+except ImportError:
+    from thread import get_ident # pylint: disable=import-error
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None # pylint: disable=invalid-name
+
+# How often thread stacks are sampled.
+SAMPLE_INTERVAL = 0.005
+
+# Functions listed per section of the summary.
+TOP = 20
+
+# Stack frames kept for each memory allocation.
+MEMORY_FRAMES = 10
+
+# Names of threads that aren't Python threads, like QThreads, by ident.
+_names = {} # pylint: disable=invalid-name
+
+def name_thread(name):
+    """Name the calling thread in profiles."""
+    _names[get_ident()] = name
+
+def _thread_names():
+    """Return a dictionary of thread ident to name."""
+    names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+    names.update(_names)
+    return names
+
+class Sampler(threading.Thread):
+    """
+    Samples the stack of every thread at an interval.
+
+    For each thread, counts how often each function was running (own) and
+    how often it was anywhere on the stack (total).
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super(Sampler, self).__init__(name='tinycom-profiler')
+        self.daemon = True
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.own = collections.defaultdict(collections.Counter)
+        self.total = collections.defaultdict(collections.Counter)
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Stop sampling and wait for the thread to finish."""
+        self._stopped.set()
+        self.join()
+
+    def run(self):
+        """Thread run loop."""
+        me = get_ident()
+        while not self._stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items(): # pylint: disable=protected-access
+                if ident == me:
+                    continue
+                self.samples[ident] += 1
+                seen = set()
+                own = True
+                while frame is not None:
+                    code = frame.f_code
+                    func = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if own:
+                        self.own[ident][func] += 1
+                        own = False
+                    if func not in seen:
+                        seen.add(func)
+                        self.total[ident][func] += 1
+                    frame = frame.f_back
+
+    def report(self, names, top=TOP):
+        """Return the busiest functions of each thread as text."""
+        lines = []
+        for ident, count in self.samples.most_common():
+            lines.append("%s: %d samples" % (names.get(ident, ident), count))
+            lines.append("   own%  total%  function")
+            for func, own in self.own[ident].most_common(top):
+                lines.append("%6.1f %7.1f  %s" %
+                             (100. * own / count,
+                              100. * self.total[ident][func] / count,
+                              _label(func)))
+            lines.append("")
+        return "\n".join(lines)
+
+def _label(func):
+    """Return a function key as text, like pstats."""
+    filename, line, name = func
+    return "%s:%d(%s)" % (os.path.basename(filename), line, name)
+
+class ProfileSession(object):
+    """
+    One profiling run.
+
+    Create and stop a session on the GUI thread, because cProfile only sees
+    the thread it's enabled on.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = time.strftime("tinycom-%Y%m%d-%H%M%S")
+        self.start_time = time.time()
+        self.files = []
+        self._snapshot = None
+        name_thread("GUI")
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_FRAMES)
+            self._snapshot = tracemalloc.take_snapshot()
+        self.profile = cProfile.Profile()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Another profiler, like one run from the command line, is active.
+            self.profile = None
+        self.sampler = Sampler()
+        self.sampler.start()
+
+    def path(self, extension):
+        """Return the path of an output file."""
+        return os.path.join(self.directory, self.name + extension)
+
+    def stop(self):
+        """
+        Stop profiling and write the results.
+
+        Returns the summary text.  The paths of the files written are in
+        files.  Raises IOError or OSError if they can't be written.
+        """
+        if self.profile is not None:
+            self.profile.disable()
+        self.sampler.stop()
+        snapshot = None
+        if self._snapshot is not None:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        seconds = time.time() - self.start_time
+        out = StringIO()
+        out.write("TinyCom profile of %.1f seconds, Python %s on %s\n\n" %
+                  (seconds, platform.python_version(), platform.platform()))
+
+        if self.profile is not None:
+            path = self.path(".prof")
+            self.profile.dump_stats(path)
+            self.files.append(path)
+            stats = pstats.Stats(path, stream=out)
+            stats.strip_dirs()
+            out.write("GUI thread, by own time:\n")
+            stats.sort_stats('tottime').print_stats(TOP)
+            out.write("GUI thread, TinyCom functions by total time:\n")
+            here = os.path.dirname(os.path.abspath(__file__))
+            stats = pstats.Stats(path, stream=out)
+            stats.sort_stats('cumulative').print_stats(
+                '^' + re.escape(here), TOP)
+
+        out.write("Stack samples every %d ms:\n\n" %
+                  (self.sampler.interval * 1000))
+        out.write(self.sampler.report(_thread_names()))
+
+        if snapshot is not None:
+            path = self.path(".tracemalloc")
+            snapshot.dump(path)
+            self.files.append(path)
+            out.write("\nMemory growth by line:\n")
+            for stat in snapshot.compare_to(self._snapshot, 'lineno')[:TOP]:
+                out.write("%s\n" % stat)
+
+        text = out.getvalue()
+        path = self.path(".txt")
+        with open(path, 'w') as handle:
+            handle.write(text)
+        self.files.append(path)
+        return text
@@ -5,13 +5,33 @@
 Wraps a serial port in a thread.
 """
 import threading
+import collections
 import serial
 from qt import *
+from lineframer import clock
+import profiler
+
+# What to do with received data when the display queue is full.
+DROP = 0    # Don't display new data until the GUI catches up.
+SAMPLE = 1  # Discard the oldest queued data to display the newest.
+PAUSE = 2   # Stop displaying until resume() is called.
+
+# Default limit on data queued for display.
+MAX_QUEUED = 1024 * 1024
 
 class SerialThread(QtCore.QThread):
-    """Serial thread."""
+    """
+    Serial thread.
 
-    recv = QtCore.pyqtSignal(bytes, name='recv')
+    Everything read is passed to the sinks on this thread, which is where
+    anything that must see all data, like logging, belongs.  Data is then
+    queued for display, up to max_queued bytes, and the GUI is signaled with
+    ready when the queue goes from empty to not empty.  When the GUI can't
+    keep up and the queue is full, the overload policy decides what is not
+    displayed.
+    """
+
+    ready = QtCore.pyqtSignal(name='ready')
     recv_error = QtCore.pyqtSignal(str, name='recv_error')
 
     def __init__(self, serial_instance):
@@ -20,6 +40,21 @@ class SerialThread(QtCore.QThread):
         self.serial = serial_instance
         self.alive = True
         self._lock = threading.Lock()
+        # Callables taking (data, stamp) that are called on this thread with
+        # everything read, before it is queued to the GUI.
+        self.sinks = []
+        # Callables taking (stamp) that are called on this thread after every
+        # read, even one that timed out, after the sinks.
+        self.pollers = []
+        self.received = 0
+        self.policy = DROP
+        self.max_queued = MAX_QUEUED
+        self.queue = collections.deque()
+        self.queued = 0
+        self.paused = False
+        self.not_displayed = 0
+        self._skipped = 0
+        self._queue_lock = threading.Lock()
 
     #def __del__(self):
     #    self.stop()
@@ -31,22 +66,87 @@ class SerialThread(QtCore.QThread):
             self.serial.cancel_read()
         self.wait()
 
+    def enqueue(self, data, stamp):
+        """Queue received data for display, applying the overload policy."""
+        with self._queue_lock:
+            size = len(data)
+            if self.paused:
+                self._skip(size)
+                return
+            if self.queued + size > self.max_queued:
+                if self.policy == PAUSE:
+                    self.paused = True
+                    self._skip(size)
+                    return
+                elif self.policy == SAMPLE:
+                    gap = 0
+                    while self.queue and \
+                          self.queued + size > self.max_queued:
+                        old, _, skipped = self.queue.popleft()
+                        self.queued -= len(old)
+                        self.not_displayed += len(old)
+                        gap += len(old) + skipped
+                    if self.queue:
+                        old, old_stamp, skipped = self.queue[0]
+                        self.queue[0] = (old, old_stamp, skipped + gap)
+                    else:
+                        self._skipped += gap
+                else:
+                    self._skip(size)
+                    return
+            notify = not self.queue
+            self.queue.append((data, stamp, self._skipped))
+            self.queued += size
+            self._skipped = 0
+        if notify:
+            self.ready.emit()
+
+    def _skip(self, size):
+        """Count data that will not be displayed."""
+        self._skipped += size
+        self.not_displayed += size
+
+    def take(self):
+        """
+        Take everything queued for display.
+
+        Returns a list of (data, stamp, skipped), where skipped is the number
+        of bytes not displayed just before data.
+        """
+        with self._queue_lock:
+            items = list(self.queue)
+            self.queue.clear()
+            self.queued = 0
+        return items
+
+    def resume(self):
+        """Resume displaying after a pause."""
+        with self._queue_lock:
+            self.paused = False
+
     def run(self):
         """Thread run loop."""
         error = None
+        profiler.name_thread("Serial reader")
         while self.alive and self.serial.isOpen:
             try:
                 data = self.serial.read(1024 * 8)
+                stamp = clock()
             except serial.SerialException as exp:
                 error = str(exp)
                 break
             else:
-                if data:
-                    try:
-                        self.recv.emit(data)
-                    except Exception as exp: # pylint: disable=broad-except
-                        error = str(exp)
-                        break
+                try:
+                    if data:
+                        self.received += len(data)
+                        for sink in self.sinks:
+                            sink(data, stamp)
+                        self.enqueue(data, stamp)
+                    for poller in self.pollers:
+                        poller(stamp)
+                except Exception as exp: # pylint: disable=broad-except
+                    error = str(exp)
+                    break
         if error != None:
             self.recv_error.emit(error)
         self.alive = True
@@ -0,0 +1,82 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Saves and restores session snapshots: the output log and the open port.  The
+input history is saved on its own, see history.py.
+
+A snapshot is a single file with a small JSON header followed by the output
+log as zlib compressed UTF-8, so restoring it is one read, one decompress and
+one setPlainText().
+"""
+import os
+import json
+import zlib
+import struct
+from qt import *
+
+MAGIC = b'TCSESSION1\n'
+
+# Only the newest this many characters of the output log are saved.
+MAX_SCROLLBACK = 16 * 1024 * 1024
+
+def session_path():
+    """Return the path of the session file, next to the settings file."""
+    settings = QtCore.QSettings(QtCore.QSettings.IniFormat,
+                                QtCore.QSettings.UserScope,
+                                'tinycom', 'tinycom')
+    return os.path.join(os.path.dirname(settings.fileName()), 'session.dat')
+
+def save_session(path, scrollback, port, connected):
+    """
+    Save a session snapshot.
+
+    port is a dictionary of serial port settings, or None.  The file is
+    written to a temporary name and renamed, so a crash never leaves a
+    partial snapshot behind.
+    """
+    header = json.dumps({'port': port,
+                         'connected': connected}).encode('utf-8')
+    blob = zlib.compress(scrollback[-MAX_SCROLLBACK:].encode('utf-8'), 6)
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    temp = path + '.tmp'
+    with open(temp, 'wb') as handle:
+        handle.write(MAGIC)
+        handle.write(struct.pack('>I', len(header)))
+        handle.write(header)
+        handle.write(blob)
+    if hasattr(os, 'replace'):
+        os.replace(temp, path)
+    else:
+        # Python 2 renames over an existing file atomically, except on
+        # Windows where it can't rename over one at all.
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(temp, path)
+
+def load_session(path):
+    """
+    Load a session snapshot.
+
+    Returns a dictionary with 'scrollback', 'port' and 'connected', or None
+    if there is no valid snapshot.
+    """
+    try:
+        with open(path, 'rb') as handle:
+            data = handle.read()
+    except (IOError, OSError):
+        return None
+    if not data.startswith(MAGIC):
+        return None
+    pos = len(MAGIC)
+    try:
+        size = struct.unpack_from('>I', data, pos)[0]
+        pos += 4
+        session = json.loads(data[pos:pos + size].decode('utf-8'))
+        session['scrollback'] = zlib.decompress(data[pos + size:]).decode(
+            'utf-8', 'replace')
+    except (struct.error, ValueError, zlib.error):
+        return None
+    return session
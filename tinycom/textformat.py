@@ -0,0 +1,98 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Converts received data to the text shown in the output and written to the
+log.
+"""
+import lineframer
+import transform
+from lineframer import LineFramer, format_stamp, clock
+from transform import RxTransform
+
+# Where lines end for each way of showing line ends, so a line timestamp goes
+# where a line starts in the text.
+TERMINATORS = {
+    transform.LF: lineframer.LF_TERMINATOR,
+    transform.CR: lineframer.CR_TERMINATOR,
+    transform.ANY: lineframer.ANY_TERMINATOR,
+    transform.AS_RECEIVED: lineframer.LF_TERMINATOR,
+}
+
+class TextFormatter(object):
+    """
+    Formats a stream of received data.
+
+    Each formatter frames lines with its own LineFramer and converts with its
+    own RxTransform, so the output and the log can each see a different
+    subset of the stream.  Sent data that is echoed is converted with a
+    separate transform, so it can't split a received character or line end.
+    """
+
+    def __init__(self, framer=None):
+        self.framer = framer if framer is not None else LineFramer()
+        self.rx = RxTransform()
+        self.tx = RxTransform()
+        self.framer.setTerminator(TERMINATORS[self.rx.newline])
+        self.timestamps = False
+        self.deltas = False
+
+    def configure(self, options):
+        """
+        Set options from a dictionary of timestamps, deltas and RxTransform
+        arguments.
+        """
+        options = dict(options)
+        self.timestamps = options.pop('timestamps', self.timestamps)
+        self.deltas = options.pop('deltas', self.deltas)
+        self.rx.configure(options)
+        self.tx.configure(options)
+        self.framer.setTerminator(TERMINATORS.get(self.rx.newline,
+                                                  lineframer.LF_TERMINATOR))
+
+    def reset(self):
+        """Forget any partial line or character."""
+        self.framer.reset()
+        self.rx.reset()
+        self.tx.reset()
+
+    def skip(self, size):
+        """Account for size bytes of the stream that will not be formatted."""
+        self.framer.skip(size)
+        self.rx.reset()
+
+    def event(self, text, stamp=None):
+        """
+        Format a note, like a modem line change, as a timestamped line of its
+        own between the lines of data.
+        """
+        if stamp is None:
+            stamp = clock()
+        prefix = '\n' if self.framer.end() else ''
+        return '%s[%s] -- %s --\n' % (prefix, format_stamp(stamp), text)
+
+    def lineStamp(self, line):
+        """Return the timestamp prefix for a line from the line index."""
+        stamp = format_stamp(self.framer.stamps[line])
+        if self.deltas:
+            return '[%s +%.6f] ' % (stamp, self.framer.delta(line))
+        return '[%s] ' % stamp
+
+    def format(self, data, stamp=None, sent=False):
+        """Frame and format a chunk of data received, or sent, at stamp."""
+        convert = self.tx if sent else self.rx
+        starts = self.framer.feed(data, stamp)
+        if not starts or not self.timestamps:
+            return convert(data)
+        pieces = []
+        prev = 0
+        line = len(self.framer) - len(starts)
+        for start in starts:
+            if start > prev:
+                pieces.append(convert(data[prev:start]))
+            pieces.append(self.lineStamp(line))
+            prev = start
+            line += 1
+        if prev < len(data):
+            pieces.append(convert(data[prev:]))
+        return ''.join(pieces)
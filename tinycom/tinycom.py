@@ -7,10 +7,14 @@
 # SPDX-License-Identifier: GPL-3.0
 
 """TinyCom"""
+import os
+import re
 import sys
 import glob
-import re
+import argparse
 import codecs
+import threading
+import socket
 import serial
 from pkg_resources import parse_version
 from qt import *
@@ -18,6 +22,29 @@ from version import __version__
 import guisave
 import tinycom_rc # pylint: disable=unused-import
 from lineedit import CustomLineEdit
+from lineframer import clock
+from textformat import TextFormatter
+import transform
+from logsearch import SearchBar
+from history import HistoryModel, HistorySearch, history_path
+from decoderview import DecoderDock
+from plotview import PlotDock
+from linktest import PatternChecker, make_pattern
+from linktestview import LinkTestDock, PatternThread
+from modemlines import ModemLineMonitor, set_output
+from modemlineview import ModemLineDock
+from compare import IncrementalDiff, LiveStream, CaptureStream
+import compareview
+from macros import compile_payload, load_macros, save_macros, SequenceThread
+from macrodialog import MacroDialog
+from bulksend import BulkSendThread, PromptWaiter
+from bulksenddialog import BulkSendDialog, open_text
+from bridge import BridgeServer
+from bridgedialog import BridgeDialog
+import logwriter
+from logprocess import LogProcess
+from profiler import ProfileSession
+import session
 
 # By default, a thread is used to process the serial port. If this is set to
 # False, a timer will poll the serial port at a fixed interval, which can have
@@ -48,19 +75,6 @@ def populate_serial_ports():
             pass
     return result
 
-def _chunks(text, chunk_size):
-    """Chunk text into chunk_size."""
-    for i in range(0, len(text), chunk_size):
-        yield text[i:i+chunk_size]
-
-def str_to_hex(text):
-    """Convert text to hex encoded bytes."""
-    return ''.join('{:02x}'.format(ord(c)) for c in text)
-
-def hex_to_raw(hexstr):
-    """Convert a hex encoded string to raw bytes."""
-    return ''.join(chr(int(x, 16)) for x in _chunks(hexstr, 2))
-
 def human_size(nbytes):
     suffixes = ['B', 'KB', 'MB', 'GB', 'TB', 'PB']
     if nbytes == 0:
@@ -72,8 +86,27 @@ def human_size(nbytes):
     f = ('%.2f' % nbytes).rstrip('0').rstrip('.')
     return '%s %s' % (f, suffixes[i])
 
+def create_serial(url=None):
+    """
+    Create a closed serial port.
+
+    If url is given, it's opened with serial_for_url(), which supports
+    socket://, rfc2217://, loop:// and other URL handlers.
+    """
+    if parse_version(serial.VERSION) >= parse_version("3.0"):
+        kwargs = dict(timeout=0.1, write_timeout=5.0, inter_byte_timeout=1.0)
+    else:
+        kwargs = dict(timeout=0.1, writeTimeout=5.0, interCharTimeout=1.0)
+    if url:
+        return serial.serial_for_url(url, do_not_open=True, **kwargs)
+    return serial.Serial(**kwargs)
+
 class SettingsDialog(QDialog):
     """Settings dialog."""
+
+    controls = ["port", "baudrate", "bytesize", "parity", "stopbits",
+                "xonxoff", "rtscts", "dsrdtr"]
+
     def __init__(self, parent=None):
         super(SettingsDialog, self).__init__(parent)
         load_ui_widget(os.path.join(os.path.dirname(__file__), 'settings.ui'),
@@ -108,7 +141,7 @@ class SettingsDialog(QDialog):
 
         self.settings = QtCore.QSettings('tinycom', 'tinycom')
         self.settings.beginGroup("settingsDialog")
-        guisave.load(self, self.settings)
+        guisave.load(self, self.settings, self.controls)
         self.settings.endGroup()
 
     def getValues(self):
@@ -128,13 +161,24 @@ class SettingsDialog(QDialog):
     def onAccept(self):
         """Accept changes."""
         self.settings.beginGroup("settingsDialog")
-        guisave.save(self, self.settings,
-                     ["port", "baudrate", "bytesize", "parity", "stopbits",
-                      "xonxoff", "rtscts", "dsrdtr"])
+        guisave.save(self, self.settings, self.controls)
         self.settings.endGroup()
 
 class MainWindow(QMainWindow):
     """The main window."""
+
+    log_error = QtCore.pyqtSignal(str, name='log_error')
+    log_warning = QtCore.pyqtSignal(str, name='log_warning')
+
+    controls = ["ui", "remove_escape",
+                "echo_input", "log_file", "enable_log", "line_end",
+                "splitter", "output_hex", "timestamps",
+                "timestamp_delta", "log_rotate_size",
+                "log_rotate_time", "log_compress", "actionRestoreSession",
+                "overload_policy", "display_queue", "log_in_process",
+                "log_ring_size",
+                "encoding", "newline", "show_controls"]
+
     def __init__(self, parent=None):
         super(MainWindow, self).__init__(parent)
         load_ui_widget(os.path.join(os.path.dirname(__file__), 'tinycom.ui'),
@@ -144,6 +188,23 @@ class MainWindow(QMainWindow):
         self.rx = 0
         self.tx = 0
         self.history_index = 0
+        self.display_format = TextFormatter()
+        self.log_format = TextFormatter()
+        self.log_lock = threading.Lock()
+        self._encoded = None
+        self.sequence_threads = {}
+        self.sinks = [self.logData]
+        self.bridge = None
+        self.link_test = None
+        self.bulk_send = None
+        self.modem_monitor = None
+        self.compare_session = None
+        self.profile_session = None
+        self.log_writer = None
+        self.log_config = None
+        self.log_process = None
+        self.log_dropped = 0
+        self.port_settings = None
 
         self.statusBar().showMessage("Not connected")
 
@@ -166,38 +227,166 @@ class MainWindow(QMainWindow):
         self.btn_open_log.clicked.connect(self.onBtnOpenLog)
         self.actionQuit.triggered.connect(self.close)
         self.actionAbout.triggered.connect(self.onAbout)
-        self.history.itemDoubleClicked.connect(self.onHistoryDoubleClick)
+        self.actionProfile.triggered.connect(self.onProfile)
+        self.profile_timer = QtCore.QTimer(self)
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.timeout.connect(self.stopProfile)
+        self.actionFind.triggered.connect(self.onFind)
+        self.actionSearchHistory.triggered.connect(self.onSearchHistory)
+        self.actionMacros.triggered.connect(self.onMacros)
+        self.actionBulkSend.triggered.connect(
+            lambda: self.onBulkSend(QApplication.clipboard().text()))
+        self.btn_send_file.clicked.connect(self.onBtnSendFile)
+        self.actionBridge.toggled.connect(self.onBridge)
+        self.history_model = HistoryModel(self)
+        self.history_model.load(history_path())
+        self.history_index = self.history_model.rowCount()
+        self.history.setModel(self.history_model)
+        self.history.setUniformItemSizes(True)
+        self.history.scrollToBottom()
+        self.history.doubleClicked.connect(self.onHistoryDoubleClick)
+        self.history_search = HistorySearch(self.history_model, self)
+        self.history_search.setVisible(False)
+        self.centralwidget.layout().insertWidget(2, self.history_search)
+        self.history_search.matched.connect(self.onHistoryMatch)
+        self.history_search.finished.connect(self.onHistorySearchFinished)
+        self._before_search = ""
 
         self.input.setEnabled(False)
         self.btn_send.setEnabled(False)
         self.history.setEnabled(False)
 
+        self.search = SearchBar(self.log, self.frame)
+        self.search.setVisible(False)
+        self.frame.layout().addWidget(self.search.filter_view, 0, 0)
+        self.frame.layout().addWidget(self.search, 2, 0)
+
+        self.decoder = DecoderDock(self)
+        self.decoder.setVisible(False)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.decoder)
+        self.menuView.addAction(self.decoder.toggleViewAction())
+
+        self.plot = PlotDock(self)
+        self.plot.setVisible(False)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.plot)
+        self.menuView.addAction(self.plot.toggleViewAction())
+
+        self.linktest = LinkTestDock(self)
+        self.linktest.setVisible(False)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.linktest)
+        self.menuView.addAction(self.linktest.toggleViewAction())
+        self.linktest.btn_start.toggled.connect(self.onLinkTest)
+
+        self.modem_lines = ModemLineDock(self)
+        self.modem_lines.setVisible(False)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.modem_lines)
+        self.menuView.addAction(self.modem_lines.toggleViewAction())
+        self.compare = compareview.CompareDock(self)
+        self.compare.setVisible(False)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.compare)
+        self.menuView.addAction(self.compare.toggleViewAction())
+        self.compare.btn_start.toggled.connect(self.onCompare)
+
+        for line, button in self.modem_lines.outputs.items():
+            button.toggled.connect(
+                lambda checked, line=line: self.onModemOutput(line, checked))
+
+        self.macro_bar = self.addToolBar("Macros")
+        self.macro_bar.setObjectName("macro_bar")
+        self.menuView.addAction(self.macro_bar.toggleViewAction())
+
+        self.bridge_status = QLabel()
+        self.bridge_status.setVisible(False)
+        self.statusBar().addPermanentWidget(self.bridge_status)
+        self.bridge_timer = QtCore.QTimer(self)
+        self.bridge_timer.timeout.connect(self.updateBridgeStatus)
+
+        self.overload_status = QLabel()
+        self.overload_status.setStyleSheet("color: rgb(255, 0, 0);")
+        self.overload_status.setVisible(False)
+        self.statusBar().addPermanentWidget(self.overload_status)
+        self.btn_resume = QPushButton("Resume Output")
+        self.btn_resume.setVisible(False)
+        self.btn_resume.clicked.connect(self.onResume)
+        self.statusBar().addPermanentWidget(self.btn_resume)
+        self.status_timer = QtCore.QTimer(self)
+        self.status_timer.timeout.connect(self.updateStatus)
+
+        self.bulk_progress = QProgressBar()
+        self.bulk_progress.setMaximumWidth(200)
+        self.bulk_progress.setVisible(False)
+        self.statusBar().addPermanentWidget(self.bulk_progress)
+        self.btn_bulk_stop = QPushButton("Stop Sending")
+        self.btn_bulk_stop.setVisible(False)
+        self.btn_bulk_stop.clicked.connect(self.stopBulkSend)
+        self.statusBar().addPermanentWidget(self.btn_bulk_stop)
+
         self.rxtx = QLabel("TX: 0 B  RX: 0 B")
         self.statusBar().addPermanentWidget(self.rxtx)
 
+        self.encoding.addItems(list(transform.ENCODINGS.keys()))
+        self.newline.addItems(transform.NEWLINES)
+
         self.settings = QtCore.QSettings('tinycom', 'tinycom')
         self.settings.beginGroup("mainWindow")
-        guisave.load(self, self.settings)
+        guisave.load(self, self.settings, self.controls)
         self.settings.endGroup()
 
-        self.ansi_escape = re.compile(r'(\x9B|\x1B\[)[0-?]*[ -\/]*[@-~]')
-        if parse_version(serial.VERSION) >= parse_version("3.0"):
-            self.serial = serial.Serial(timeout=0.1,
-                                        write_timeout=5.0,
-                                        inter_byte_timeout=1.0)
-        else:
-            self.serial = serial.Serial(timeout=0.1,
-                                        writeTimeout=5.0,
-                                        interCharTimeout=1.0)
+        self.settings.beginGroup("macros")
+        self.macros, self.sequences = load_macros(self.settings)
+        self.settings.endGroup()
+        self.updateMacroBar()
+
+        if 'zstd' not in logwriter.COMPRESSORS:
+            index = self.log_compress.findText('zstd')
+            self.log_compress.model().item(index).setEnabled(False)
+            if self.log_compress.currentIndex() == index:
+                self.log_compress.setCurrentIndex(0)
+
+        for widget in [self.remove_escape, self.output_hex, self.timestamps,
+                       self.timestamp_delta, self.show_controls]:
+            widget.toggled.connect(self.updateFormat)
+        self.encoding.currentIndexChanged.connect(self.updateFormat)
+        self.encoding.currentIndexChanged.connect(self.onInputChanged)
+        self.newline.currentIndexChanged.connect(self.updateFormat)
+        self.log_error.connect(self.onLogError)
+        self.log_warning.connect(self.onLogWarning)
+        self.log_process_timer = QtCore.QTimer(self)
+        self.log_process_timer.timeout.connect(self.checkLogProcess)
+        self.log_in_process.toggled.connect(self.onLogProcess)
+        self.log_ring_size.valueChanged.connect(self.onLogRingSize)
+        if self.log_in_process.isChecked():
+            self.startLogProcess()
+        self.updateFormat()
+        self.enable_log.toggled.connect(self.updateLogWriter)
+        self.log_file.editingFinished.connect(self.updateLogWriter)
+        self.log_rotate_size.valueChanged.connect(self.updateLogWriter)
+        self.log_rotate_time.valueChanged.connect(self.updateLogWriter)
+        self.log_compress.currentIndexChanged.connect(self.updateLogWriter)
+        self.updateLogWriter()
+        self.overload_policy.currentIndexChanged.connect(self.updateOverload)
+        self.display_queue.valueChanged.connect(self.updateOverload)
+
         if not USE_THREAD:
             self.timer = QtCore.QTimer()
             self.timer.timeout.connect(self.doReadData)
-        else:
-            self.thread = serialthread.SerialThread(self.serial)
-            self.thread.recv.connect(self.recv)
-            self.thread.recv_error.connect(self.onRecvError)
+        self.setSerial(create_serial())
 
         self.input.key_event.connect(self.onInputKey)
+        self.input.paste_lines.connect(self.onBulkSend)
+
+        if self.actionRestoreSession.isChecked():
+            self.restoreSession()
+
+    def setSerial(self, serial_instance):
+        """Use a new serial port instance."""
+        self.serial = serial_instance
+        if USE_THREAD:
+            self.thread = serialthread.SerialThread(self.serial)
+            self.thread.sinks = self.sinks
+            self.thread.ready.connect(self.onReady)
+            self.thread.recv_error.connect(self.onRecvError)
+            self.updateOverload()
 
     def uiConnectedEnable(self, connected):
         """Toggle enabled on controls based on connect."""
@@ -213,84 +402,286 @@ class MainWindow(QMainWindow):
     def onBtnOpen(self):
         """Open button clicked."""
         if self.serial.isOpen():
-            if not USE_THREAD:
-                self.timer.stop()
-                self.serial.close()
-            else:
-                self.thread.close()
-            self.uiConnectedEnable(False)
-            self.statusBar().showMessage("Not connected")
+            self.closePort()
         else:
             dlg = SettingsDialog(self)
             if dlg.exec_():
-                settings = dlg.getValues()
-                for key in settings:
-                    setattr(self.serial, key, settings[key])
+                self.openPort(dlg.getValues())
+
+    def closePort(self):
+        """Close the serial port."""
+        self.stopSequences()
+        self.stopLinkTest()
+        self.stopBulkSend()
+        self.stopModemLines()
+        self.stopCompare()
+        self.actionBridge.setChecked(False)
+        if not USE_THREAD:
+            self.timer.stop()
+            self.serial.close()
+        else:
+            self.thread.close()
+            self.status_timer.stop()
+            self.onReady()
+            self.updateStatus()
+        self.uiConnectedEnable(False)
+        self.statusBar().showMessage("Not connected")
+
+    def openPort(self, settings):
+        """Open the serial port with a dictionary of port settings."""
+        try:
+            if '://' in settings['port']:
+                self.setSerial(create_serial(settings['port']))
             else:
-                return
+                self.setSerial(create_serial())
+        except (ValueError, serial.SerialException) as exp:
+            QtGui.QMessageBox.critical(self, 'Error Opening Serial Port',
+                                       str(exp))
+            return
+        for key in settings:
+            setattr(self.serial, key, settings[key])
 
-            try:
-                self.serial.open()
-            except serial.SerialException as exp:
-                QtGui.QMessageBox.critical(self, 'Error Opening Serial Port',
-                                           str(exp))
-            except (IOError, OSError) as exp:
-                QtGui.QMessageBox.critical(self, 'IO Error Opening Serial Port',
-                                           str(exp))
+        try:
+            self.serial.open()
+        except serial.SerialException as exp:
+            QtGui.QMessageBox.critical(self, 'Error Opening Serial Port',
+                                       str(exp))
+        except (IOError, OSError) as exp:
+            QtGui.QMessageBox.critical(self, 'IO Error Opening Serial Port',
+                                       str(exp))
+        else:
+            self.port_settings = settings
+            if parse_version(serial.VERSION) >= parse_version("3.0"):
+                self.serial.reset_input_buffer() # pylint: disable=no-member
+                self.serial.reset_output_buffer() # pylint: disable=no-member
             else:
-                if parse_version(serial.VERSION) >= parse_version("3.0"):
-                    self.serial.reset_input_buffer() # pylint: disable=no-member
-                    self.serial.reset_output_buffer() # pylint: disable=no-member
-                else:
-                    self.serial.flushInput() # pylint: disable=no-member
-                    self.serial.flushOutput() # pylint: disable=no-member
-                self.statusBar().showMessage('Connected to ' + settings['port'] +
-                                             ' ' +
-                                             str(settings['baudrate']) + ',' +
-                                             str(settings['parity']) + ',' +
-                                             str(settings['bytesize']) + ',' +
-                                             str(settings['stopbits']))
-                self.uiConnectedEnable(True)
-                if not USE_THREAD:
-                    self.timer.start(100)
-                else:
-                    self.thread.start()
-
-    def doLog(self, text):
-        """Write to log file."""
-        text = text.decode("utf-8", 'backslashreplace')
-        if self.remove_escape.isChecked():
-            text = self.ansi_escape.sub('', text)
-        if self.output_hex.isChecked():
-            text = str_to_hex(text)
-            text = ' '.join(a+b for a, b in zip(text[::2], text[1::2]))
-            text = text + ' '
+                self.serial.flushInput() # pylint: disable=no-member
+                self.serial.flushOutput() # pylint: disable=no-member
+            self.statusBar().showMessage('Connected to ' + settings['port'] +
+                                         ' ' +
+                                         str(settings['baudrate']) + ',' +
+                                         str(settings['parity']) + ',' +
+                                         str(settings['bytesize']) + ',' +
+                                         str(settings['stopbits']))
+            self.uiConnectedEnable(True)
+            self.startModemLines()
+            if not USE_THREAD:
+                self.timer.start(100)
+            else:
+                self.thread.start()
+                self.status_timer.start(500)
+
+    def updateFormat(self):
+        """Apply the output options to the output and log formatters."""
+        options = {'remove_escape': self.remove_escape.isChecked(),
+                   'hex': self.output_hex.isChecked(),
+                   'timestamps': self.timestamps.isChecked(),
+                   'deltas': self.timestamp_delta.isChecked(),
+                   'encoding': self.encoding.currentText(),
+                   'newline': self.newline.currentText(),
+                   'controls': self.show_controls.isChecked()}
+        self.display_format.configure(options)
+        with self.log_lock:
+            self.log_format.configure(options)
+        if self.log_process is not None:
+            self.log_process.setFormat(options)
 
+    def display(self, data, stamp=None, sent=False):
+        """Write to the output window."""
+        self.insertText(self.display_format.format(data, stamp, sent))
+
+    def insertText(self, text):
+        """Append text to the end of the output window."""
         cursor = self.log.textCursor()
         cursor.movePosition(QtGui.QTextCursor.End)
         cursor.insertText(text)
         if not self.lock.isChecked():
             self.log.moveCursor(QtGui.QTextCursor.End)
 
+    def logData(self, data, stamp=None, sent=False):
+        """
+        Write to log file.
+
+        For received data this is called on the serial thread, for
+        everything read, so the log is complete even when the output window
+        can't keep up.
+        """
+        error = None
+        with self.log_lock:
+            if self.log_process is not None:
+                if self.log_config is not None:
+                    self.log_process.write(data, stamp, sent)
+            elif self.log_writer is not None:
+                error = self.writeLog(self.log_format.format(data, stamp,
+                                                             sent))
+        if error is not None:
+            self.log_error.emit(error)
+
+    def logEvent(self, text, stamp=None):
+        """Write a note, like a modem line change, to the log file."""
+        error = None
+        with self.log_lock:
+            if self.log_process is not None:
+                if self.log_config is not None:
+                    self.log_process.event(text, stamp)
+            elif self.log_writer is not None:
+                error = self.writeLog(self.log_format.event(text, stamp))
+        if error is not None:
+            self.log_error.emit(error)
+
+    def writeLog(self, text):
+        """
+        Write to the log writer, with log_lock held.
+
+        If that fails, like when the disk is full, the writer is closed and
+        the error returned, so only logging stops and not the serial thread
+        that called this.
+        """
+        try:
+            self.log_writer.write(text)
+        except (IOError, OSError) as exp:
+            writer = self.log_writer
+            self.log_writer = None
+            try:
+                writer.close()
+            except (IOError, OSError):
+                pass
+            return str(exp)
+        return None
+
+    def onLogWarning(self, error):
+        """Something went wrong that doesn't stop logging."""
+        QtGui.QMessageBox.warning(self, 'Log Warning', error)
+
+    def onLogError(self, error):
+        """Writing the log failed, so logging was stopped."""
+        self.enable_log.setChecked(False)
+        QtGui.QMessageBox.critical(self, 'Log Error', error)
+
+    def doLog(self, data, stamp=None, sent=False):
+        """Write to the output window and log file."""
+        self.display(data, stamp, sent)
+        self.logData(data, stamp, sent)
+
+    def updateLogWriter(self):
+        """
+        Open the log writer, or reopen it if the log settings changed, or
+        close it if logging is disabled.
+        """
+        config = None
         if self.enable_log.isChecked() and len(self.log_file.text()):
-            with open(self.log_file.text(), "a") as handle:
-                handle.write(text)
+            compress = None
+            if self.log_compress.currentIndex():
+                compress = self.log_compress.currentText()
+            config = (self.log_file.text(),
+                      self.log_rotate_size.value() * 1024 * 1024,
+                      self.log_rotate_time.value() * 60,
+                      compress)
+        if config == self.log_config:
+            return
+        self.closeLog()
+        if config is not None and self.log_process is not None:
+            # If the worker exited, checkLogProcess() reports it.
+            if self.log_process.open(config):
+                self.log_config = config
+        elif config is not None:
+            try:
+                writer = logwriter.RotatingLogWriter(
+                    *config, on_error=self.log_warning.emit)
+            except (IOError, OSError) as exp:
+                self.enable_log.setChecked(False)
+                QtGui.QMessageBox.critical(self, 'Log Error', str(exp))
+                return
+            with self.log_lock:
+                self.log_writer = writer
+            self.log_config = config
+
+    def closeLog(self):
+        """Close the log writer."""
+        with self.log_lock:
+            writer = self.log_writer
+            self.log_writer = None
+        if writer is not None:
+            writer.close()
+        if self.log_process is not None and self.log_config is not None:
+            self.log_process.open(None)
+        self.log_config = None
+
+    def onLogProcess(self, checked):
+        """Separate log process check box toggled."""
+        self.closeLog()
+        if checked:
+            self.startLogProcess()
+            self.updateFormat()
+        else:
+            self.stopLogProcess()
+        self.updateLogWriter()
+
+    def onLogRingSize(self):
+        """Log process buffer size changed, so restart the process."""
+        if self.log_process is not None:
+            self.closeLog()
+            self.stopLogProcess()
+            self.startLogProcess()
+            self.updateFormat()
+            self.updateLogWriter()
+
+    def startLogProcess(self):
+        """Start formatting and writing the log in a separate process."""
+        process = LogProcess(self.log_ring_size.value() * 1024 * 1024)
+        with self.log_lock:
+            self.log_process = process
+        self.log_dropped = 0
+        self.log_process_timer.start(500)
+
+    def stopLogProcess(self):
+        """Stop the log process if it is running."""
+        with self.log_lock:
+            process = self.log_process
+            self.log_process = None
+        if process is not None:
+            self.log_process_timer.stop()
+            process.stop()
+
+    def checkLogProcess(self):
+        """Report errors from the log process."""
+        if self.log_process is None:
+            return
+        if self.log_process.dropped != self.log_dropped:
+            self.log_dropped = self.log_process.dropped
+            self.statusBar().showMessage(
+                'The log process fell behind and %s was not logged' %
+                human_size(self.log_dropped))
+        errors = []
+        for fatal, error in self.log_process.errors():
+            if fatal:
+                errors.append(error)
+            else:
+                self.onLogWarning(error)
+        if not self.log_process.isAlive():
+            errors.append('The log process exited.')
+            self.log_in_process.setChecked(False)
+        if errors:
+            self.enable_log.setChecked(False)
+            QtGui.QMessageBox.critical(self, 'Log Error', '\n'.join(errors))
 
     def encodeInput(self):
         """
         Interpret the user input text as hex or append appropriate line ending.
+
+        The result is cached, so the input is only parsed again when it, the
+        line ending or the encoding changes.
         """
-        endings = [u"\n", u"\r", u"\r\n", u"\n\r", u"", u""]
-        text = self.input.text()
-
-        if self.line_end.currentText() == "Hex":
-            text = ''.join(text.split())
-            if len(text) % 2:
-                raise ValueError('Hex encoded values must be a multiple of 2')
-            text = hex_to_raw(text)
-        else:
-            text = text + endings[self.line_end.currentIndex()]
-        return text.encode()
+        key = (self.input.text(), self.line_end.currentIndex(),
+               self.encoding.currentText())
+        if self._encoded is None or self._encoded[0] != key:
+            if self.line_end.currentText() == "Hex":
+                raw = compile_payload("Hex", key[0])
+            else:
+                raw = compile_payload("Text", key[0], key[1],
+                                      transform.tx_codec(key[2]))
+            self._encoded = (key, raw)
+        return self._encoded[1]
 
     def onInputChanged(self):
         """Input line edit changed."""
@@ -309,16 +700,416 @@ class MainWindow(QMainWindow):
         if key == QtCore.Qt.Key_Up:
             if self.history_index > 0:
                 self.history_index -= 1
-                item = self.history.item(self.history_index)
-                self.input.setText(item.text())
+                self.input.setText(
+                    self.history_model.entry(self.history_index))
         elif key == QtCore.Qt.Key_Down:
-            if self.history_index < self.history.count():
+            count = self.history_model.rowCount()
+            if self.history_index < count:
                 self.history_index += 1
-                if self.history_index == self.history.count():
+                if self.history_index == count:
                     self.input.setText("")
                 else:
-                    item = self.history.item(self.history_index)
-                    self.input.setText(item.text())
+                    self.input.setText(
+                        self.history_model.entry(self.history_index))
+
+    def write(self, raw):
+        """Write to the serial port, from any thread."""
+        if not USE_THREAD:
+            return self.serial.write(raw)
+        return self.thread.write(raw)
+
+    def onSent(self, raw):
+        """Account for and echo data that was sent."""
+        self.tx = self.tx + len(raw)
+        self.updateStatus()
+        if self.echo_input.isChecked():
+            self.doLog(raw, sent=True)
+
+    def sendRaw(self, raw):
+        """Send raw bytes, returning False if the write failed."""
+        try:
+            self.write(raw)
+        except serial.SerialException as exp:
+            QtGui.QMessageBox.critical(self, 'Serial write error', str(exp))
+            return False
+        self.onSent(raw)
+        return True
+
+    def updateMacroBar(self):
+        """Rebuild the macro toolbar from the macros and sequences."""
+        self.stopSequences()
+        self.macro_bar.clear()
+        for macro in self.macros:
+            action = self.macro_bar.addAction(macro.name)
+            action.setToolTip("Send macro " + macro.name)
+            if macro.shortcut:
+                action.setShortcut(QKeySequence(macro.shortcut))
+            action.triggered.connect(
+                lambda checked=False, macro=macro: self.onMacro(macro))
+        if self.macros and self.sequences:
+            self.macro_bar.addSeparator()
+        for sequence in self.sequences:
+            action = self.macro_bar.addAction(sequence.name)
+            action.setCheckable(True)
+            action.setToolTip("Start or stop sequence " + sequence.name)
+            action.toggled.connect(
+                lambda checked, seq=sequence, act=action:
+                self.onSequence(seq, act, checked))
+        self.macro_bar.setVisible(bool(self.macros or self.sequences))
+
+    def onMacro(self, macro):
+        """Macro action triggered."""
+        if not self.serial.isOpen():
+            return
+        try:
+            raw = macro.payload()
+        except ValueError as exp:
+            QtGui.QMessageBox.critical(self, 'Macro Error',
+                                       'Macro %s: %s' % (macro.name, exp))
+            return
+        self.sendRaw(raw)
+
+    def onSequence(self, sequence, action, checked):
+        """Sequence action toggled."""
+        thread = self.sequence_threads.pop(sequence.name, None)
+        if thread is not None:
+            thread.stop()
+        if not checked:
+            return
+        if not self.serial.isOpen():
+            action.setChecked(False)
+            return
+        try:
+            steps = sequence.compile(dict((m.name, m) for m in self.macros))
+        except ValueError as exp:
+            action.setChecked(False)
+            QtGui.QMessageBox.critical(self, 'Macro Error',
+                                       'Sequence %s: %s' % (sequence.name, exp))
+            return
+        thread = SequenceThread(sequence.name, steps, sequence.repeat,
+                                self.write)
+        thread.sent.connect(self.onSent)
+        thread.send_error.connect(self.onSendError)
+        thread.finished.connect(
+            lambda: self.onSequenceFinished(sequence.name, thread, action))
+        self.sequence_threads[sequence.name] = thread
+        thread.start()
+
+    def onSequenceFinished(self, name, thread, action):
+        """Sequence thread finished."""
+        if self.sequence_threads.get(name) is thread:
+            action.setChecked(False)
+
+    def onSendError(self, error):
+        """Write error from a sequence thread."""
+        QtGui.QMessageBox.critical(self, 'Serial write error', error)
+
+    def stopSequences(self):
+        """Stop all running sequences."""
+        for action in self.macro_bar.actions():
+            if action.isCheckable():
+                action.setChecked(False)
+        for thread in self.sequence_threads.values():
+            thread.stop()
+        self.sequence_threads = {}
+
+    def onMacros(self):
+        """Macros menu clicked."""
+        dlg = MacroDialog(self.macros, self.sequences, self)
+        if dlg.exec_():
+            self.macros = dlg.macros
+            self.sequences = dlg.sequences
+            self.settings.beginGroup("macros")
+            save_macros(self.settings, self.macros, self.sequences)
+            self.settings.endGroup()
+            self.updateMacroBar()
+
+    def onBtnSendFile(self):
+        """Send file button clicked."""
+        text = open_text(self, 'Send File')
+        if text is not None:
+            self.onBulkSend(text)
+
+    def onBulkSend(self, text):
+        """Ask how to send a block of text and start sending it."""
+        if not self.serial.isOpen():
+            QtGui.QMessageBox.critical(self, 'Send Text',
+                                       'Open a device to send text.')
+            return
+        if self.bulk_send is not None:
+            QtGui.QMessageBox.critical(self, 'Send Text',
+                                       'Text is already being sent.')
+            return
+        dlg = BulkSendDialog(text, self)
+        if not dlg.exec_():
+            return
+        encoding = transform.tx_codec(self.encoding.currentText())
+        try:
+            pieces = dlg.getPieces(encoding)
+            values = dlg.getValues(encoding)
+        except (ValueError, UnicodeError) as exp:
+            QtGui.QMessageBox.critical(self, 'Input Error', str(exp))
+            return
+        if not pieces or not self.serial.isOpen():
+            return
+        waiter = PromptWaiter()
+        thread = BulkSendThread(pieces, self.write, waiter, **values)
+        thread.sent.connect(self.onSent)
+        thread.send_error.connect(self.onSendError)
+        thread.progress.connect(self.onBulkSendProgress)
+        thread.finished.connect(lambda: self.onBulkSendFinished(thread))
+        self.bulk_send = (waiter, thread)
+        self.addSink(waiter.feed)
+        self.bulk_progress.setRange(0, len(pieces))
+        self.bulk_progress.setValue(0)
+        self.bulk_progress.setVisible(True)
+        self.btn_bulk_stop.setVisible(True)
+        thread.start()
+
+    def onBulkSendProgress(self, count, total):
+        """Show how much of the block has been sent."""
+        self.bulk_progress.setValue(count)
+        self.bulk_progress.setFormat("Sent %d of %d" % (count, total))
+
+    def onBulkSendFinished(self, thread):
+        """The block was sent or sending failed."""
+        if self.bulk_send is not None and self.bulk_send[1] is thread:
+            self.stopBulkSend()
+
+    def stopBulkSend(self):
+        """Stop sending a block of text if it is being sent."""
+        if self.bulk_send is None:
+            return
+        waiter, thread = self.bulk_send
+        self.bulk_send = None
+        thread.stop()
+        self.removeSink(waiter.feed)
+        self.bulk_progress.setVisible(False)
+        self.btn_bulk_stop.setVisible(False)
+        if thread.timeouts:
+            self.statusBar().showMessage(
+                "Timed out waiting %d times while sending text" %
+                thread.timeouts)
+
+    def onBridge(self, checked):
+        """Network bridge menu toggled."""
+        if not checked:
+            self.stopBridge()
+            return
+        if self.bridge is not None:
+            return
+        if not self.serial.isOpen():
+            QtGui.QMessageBox.critical(self, 'Network Bridge',
+                                       'Open a device before starting the bridge.')
+            self.actionBridge.setChecked(False)
+            return
+        dlg = BridgeDialog(self)
+        if not dlg.exec_():
+            self.actionBridge.setChecked(False)
+            return
+        try:
+            self.bridge = BridgeServer(self.serial, self.write,
+                                       **dlg.getValues())
+        except (socket.error, OverflowError) as exp:
+            QtGui.QMessageBox.critical(self, 'Network Bridge', str(exp))
+            self.actionBridge.setChecked(False)
+            return
+        self.addSink(self.bridge.broadcast)
+        self.bridge.start()
+        self.bridge_status.setVisible(True)
+        self.updateBridgeStatus()
+        self.bridge_timer.start(1000)
+
+    def stopBridge(self):
+        """Stop the network bridge if it is running."""
+        if self.bridge is None:
+            return
+        self.removeSink(self.bridge.broadcast)
+        self.bridge.stop()
+        self.bridge = None
+        self.bridge_timer.stop()
+        self.bridge_status.setVisible(False)
+
+    def updateBridgeStatus(self):
+        """Update the bridge status bar label."""
+        if self.bridge is None:
+            return
+        if self.bridge.error is not None:
+            QtGui.QMessageBox.critical(self, 'Network Bridge',
+                                       self.bridge.error)
+            self.actionBridge.setChecked(False)
+            return
+        clients = self.bridge.clients
+        text = "Bridge %s:%d: %d client%s" % (self.bridge.address[0],
+                                              self.bridge.address[1],
+                                              len(clients),
+                                              "" if len(clients) == 1 else "s")
+        dropped = sum(client.dropped for client in clients)
+        if dropped:
+            text += ", " + human_size(dropped) + " dropped"
+        self.bridge_status.setText(text)
+
+    def onLinkTest(self, checked):
+        """Link test start button toggled."""
+        if not checked:
+            self.stopLinkTest()
+            return
+        if not self.serial.isOpen():
+            QtGui.QMessageBox.critical(self, 'Link Test',
+                                       'Open a device to run a link test.')
+            self.linktest.btn_start.setChecked(False)
+            return
+        pattern = make_pattern(self.linktest.pattern.currentText())
+        checker = PatternChecker(pattern)
+        thread = PatternThread(pattern, self.write, checker,
+                               self.linktest.count.value() * 1024)
+        thread.send_error.connect(self.onSendError)
+        thread.finished.connect(lambda: self.onLinkTestFinished(thread))
+        self.link_test = (checker, thread)
+        self.addSink(checker.feed)
+        self.linktest.start(checker, thread)
+        thread.start()
+
+    def onLinkTestFinished(self, thread):
+        """The link test sent everything or failed."""
+        if self.link_test is not None and self.link_test[1] is thread:
+            self.stopLinkTest()
+
+    def stopLinkTest(self):
+        """Stop the link test if it is running."""
+        if self.link_test is None:
+            return
+        checker, thread = self.link_test
+        self.link_test = None
+        thread.stop()
+        self.removeSink(checker.feed)
+        self.linktest.finish()
+        self.linktest.btn_start.setChecked(False)
+
+    def startModemLines(self):
+        """Start watching the modem lines of the port that was opened."""
+        monitor = ModemLineMonitor(self.serial, self.logEvent, self)
+        monitor.start()
+        if USE_THREAD:
+            self.thread.pollers = [monitor.poll]
+        self.modem_monitor = monitor
+        for line in self.modem_lines.outputs:
+            self.modem_lines.setOutput(
+                line, bool(getattr(self.serial, line.lower(), True)))
+        self.modem_lines.start(monitor)
+
+    def stopModemLines(self):
+        """Stop watching the modem lines."""
+        if self.modem_monitor is None:
+            return
+        if USE_THREAD:
+            self.thread.pollers = []
+        self.modem_monitor.stop()
+        self.modem_monitor = None
+        self.modem_lines.finish()
+
+    def onModemOutput(self, line, checked):
+        """DTR or RTS button toggled."""
+        if not self.serial.isOpen():
+            return
+        try:
+            set_output(self.serial, line, checked)
+        except (serial.SerialException, IOError, OSError, ValueError) as exp:
+            QtGui.QMessageBox.critical(self, 'Modem Lines', str(exp))
+            self.modem_lines.setOutput(line, not checked)
+            return
+        stamp = clock()
+        state = "on" if checked else "off"
+        self.logEvent("%s %s" % (line, state), stamp)
+        self.modem_lines.addEvents([(stamp, line, checked)])
+
+    def onCompare(self, checked):
+        """Compare start button toggled."""
+        if not checked:
+            self.stopCompare()
+            return
+        if not self.serial.isOpen():
+            QtGui.QMessageBox.critical(self, 'Compare',
+                                       'Open a device to compare it.')
+            self.compare.btn_start.setChecked(False)
+            return
+        try:
+            diff = IncrementalDiff(self.compare.window_lines.value(),
+                                   self.compare.ignore.text())
+        except re.error as exp:
+            QtGui.QMessageBox.critical(self, 'Compare',
+                                       'Bad ignore expression: ' + str(exp))
+            self.compare.btn_start.setChecked(False)
+            return
+        thread = None
+        if self.compare.source.currentIndex() == compareview.PORT:
+            thread, title = self.openComparePort()
+            if thread is None:
+                self.compare.btn_start.setChecked(False)
+                return
+            other = LiveStream(self.encoding.currentText())
+            thread.sinks = [other.feed]
+            thread.recv_error.connect(self.onCompareError)
+            thread.start()
+        else:
+            text = open_text(self, 'Compare With Capture')
+            if text is None:
+                self.compare.btn_start.setChecked(False)
+                return
+            other = CaptureStream(text)
+            title = "Capture"
+        stream = LiveStream(self.encoding.currentText())
+        self.compare_session = (stream, thread)
+        self.addSink(stream.feed)
+        self.compare.start(stream, other, diff, title)
+
+    def openComparePort(self):
+        """
+        Ask for and open the other port to compare with.  Returns a serial
+        thread that isn't started yet and the port name, or None and None.
+        """
+        if not USE_THREAD:
+            QtGui.QMessageBox.critical(self, 'Compare',
+                                       'Comparing ports needs the serial'
+                                       ' thread.')
+            return None, None
+        dlg = SettingsDialog(self)
+        if not dlg.exec_():
+            return None, None
+        settings = dlg.getValues()
+        try:
+            if '://' in settings['port']:
+                port = create_serial(settings['port'])
+            else:
+                port = create_serial()
+            for key in settings:
+                setattr(port, key, settings[key])
+            port.open()
+        except (ValueError, serial.SerialException, IOError, OSError) as exp:
+            QtGui.QMessageBox.critical(self, 'Error Opening Serial Port',
+                                       str(exp))
+            return None, None
+        thread = serialthread.SerialThread(port)
+        # Nothing from the other port is displayed, only compared.
+        thread.max_queued = 0
+        return thread, settings['port']
+
+    def onCompareError(self, error):
+        """Read error on the other port."""
+        QtGui.QMessageBox.critical(self, 'Compare', error)
+        self.stopCompare()
+
+    def stopCompare(self):
+        """Stop comparing if a comparison is running."""
+        if self.compare_session is None:
+            return
+        stream, thread = self.compare_session
+        self.compare_session = None
+        self.removeSink(stream.feed)
+        if thread is not None:
+            thread.close()
+        self.compare.finish()
+        self.compare.btn_start.setChecked(False)
 
     def onBtnSend(self):
         """Send button clicked."""
@@ -326,28 +1117,16 @@ class MainWindow(QMainWindow):
             return
         try:
             raw = self.encodeInput()
-            if not USE_THREAD:
-                ret = self.serial.write(raw)
-            else:
-                ret = self.thread.write(raw)
-            self.tx = self.tx + ret
-            self.rxtx.setText("TX: " + human_size(self.tx) + "  RX: " +
-                              human_size(self.rx))
-        except serial.SerialException as exp:
-            QtGui.QMessageBox.critical(self, 'Serial write error', str(exp))
-            return
         except ValueError as exp:
             QtGui.QMessageBox.critical(self, 'Input Error', str(exp))
             return
-
-        if self.echo_input.isChecked():
-            self.doLog(raw)
+        if not self.sendRaw(raw):
+            return
 
         if len(self.input.text()):
-            item = QListWidgetItem(self.input.text())
-            self.history.addItem(item)
-            self.history.scrollToItem(item)
-            self.history_index = self.history.count()
+            self.history_model.add(self.input.text())
+            self.history.scrollToBottom()
+        self.history_index = self.history_model.rowCount()
 
         self.input.clear()
 
@@ -360,15 +1139,41 @@ class MainWindow(QMainWindow):
         if dialog.exec_() == QDialog.Accepted:
             filename = dialog.selectedFiles()[0]
             self.log_file.setText(filename)
+            self.updateLogWriter()
 
-    def onHistoryDoubleClick(self, item):
+    def onHistoryDoubleClick(self, index):
         """Send log item double clicked."""
-        self.input.setText(item.text())
+        self.input.setText(self.history_model.entry(index.row()))
         self.onBtnSend()
 
+    def onSearchHistory(self):
+        """Search history menu clicked."""
+        if not self.history_search.isVisible():
+            self._before_search = self.input.text()
+        self.history_search.activate()
+
+    def onHistoryMatch(self, row):
+        """Show a history search match in the input and the history list."""
+        self.input.setText(self.history_model.entry(row))
+        index = self.history_model.index(row)
+        self.history.setCurrentIndex(index)
+        self.history.scrollTo(index)
+
+    def onHistorySearchFinished(self, accepted):
+        """History search closed."""
+        if not accepted:
+            self.input.setText(self._before_search)
+        self.history_index = self.history_model.rowCount()
+        self.input.setFocus()
+
+    def onFind(self):
+        """Find menu clicked."""
+        self.search.activate()
+
     def onBtnClear(self):
         """Clear button clicked."""
         self.log.clear()
+        self.display_format.reset()
 
     def doReadData(self):
         """Read serial port."""
@@ -378,22 +1183,107 @@ class MainWindow(QMainWindow):
             except serial.SerialException as exp:
                 QtGui.QMessageBox.critical(self, 'Serial read error', str(exp))
             else:
-                self.recv(text)
+                stamp = clock()
+                if text:
+                    for sink in self.sinks:
+                        sink(text, stamp)
+                if self.modem_monitor is not None:
+                    self.modem_monitor.poll(stamp)
+                self.recv(text, stamp)
 
-    def recv(self, text):
-        """Receive data from the serial port signal."""
+    def recv(self, text, stamp):
+        """Display data read by the timer."""
         if len(text):
-            size = len(text)
-            self.rx = self.rx + size
-            self.rxtx.setText("TX: " + human_size(self.tx) + "  RX: " +
-                              human_size(self.rx))
-            self.doLog(text)
+            self.rx = self.rx + len(text)
+            self.updateStatus()
+            self.display(text, stamp)
+            self.decoder.feed(text, stamp)
+            self.plot.feed(text)
+
+    def addSink(self, sink):
+        """Add a callable to be called with everything received."""
+        self.setSinks(self.sinks + [sink])
+
+    def removeSink(self, sink):
+        """Remove a callable added with addSink()."""
+        self.setSinks([s for s in self.sinks if s != sink])
+
+    def setSinks(self, sinks):
+        """
+        Replace the sinks.  The serial thread may be iterating over the old
+        list, so it is replaced rather than modified.
+        """
+        self.sinks = sinks
+        if USE_THREAD:
+            self.thread.sinks = sinks
+
+    def onReady(self):
+        """Display everything queued by the serial thread."""
+        items = self.thread.take()
+        if not items:
+            return
+        self.log.setUpdatesEnabled(False)
+        for text, stamp, skipped in items:
+            if skipped:
+                # Whatever line was open is incomplete, so start over.
+                self.insertText('\n[%s not displayed]\n' % human_size(skipped))
+                self.display_format.skip(skipped)
+                self.decoder.resync()
+            self.display(text, stamp)
+            self.decoder.feed(text, stamp)
+            self.plot.feed(text)
+        self.log.setUpdatesEnabled(True)
+
+    def updateOverload(self):
+        """Apply the overload policy to the serial thread."""
+        if USE_THREAD:
+            self.thread.policy = self.overload_policy.currentIndex()
+            self.thread.max_queued = self.display_queue.value() * 1024
+
+    def onResume(self):
+        """Resume the output after the overload policy paused it."""
+        self.thread.resume()
+        self.updateStatus()
+
+    def updateStatus(self):
+        """Update the byte counts and overload indicators."""
+        if USE_THREAD:
+            self.rx = self.thread.received
+            not_displayed = self.thread.not_displayed
+            self.btn_resume.setVisible(self.thread.paused)
+            self.overload_status.setVisible(not_displayed > 0)
+            self.overload_status.setText(human_size(not_displayed) +
+                                         " not displayed")
+        self.rxtx.setText("TX: " + human_size(self.tx) + "  RX: " +
+                          human_size(self.rx))
 
     def onRecvError(self, error):
         """Receive error when reading serial port from signal."""
         QtGui.QMessageBox.critical(self, 'Serial read error', error)
         self.onBtnOpen()
 
+    def saveSession(self):
+        """Save a snapshot of the session."""
+        try:
+            session.save_session(session.session_path(),
+                                 self.log.toPlainText(),
+                                 self.port_settings, self.serial.isOpen())
+        except (IOError, OSError):
+            pass
+
+    def restoreSession(self):
+        """Restore the last session snapshot."""
+        snapshot = session.load_session(session.session_path())
+        if snapshot is None:
+            return
+        self.log.setPlainText(snapshot['scrollback'])
+        self.log.moveCursor(QtGui.QTextCursor.End)
+        self.port_settings = snapshot['port']
+        if snapshot['connected'] and self.port_settings:
+            # Reconnect once the window is up, so errors are shown over it.
+            QtCore.QTimer.singleShot(
+                0, lambda: self.openPort(self.port_settings))
+
     def onAbout(self):
         """About menu clicked."""
         msg = QMessageBox(self)
@@ -416,27 +1306,98 @@ class MainWindow(QMainWindow):
         msg.setStandardButtons(QMessageBox.Ok)
         msg.exec_()
 
+    def onProfile(self):
+        """Profile menu clicked."""
+        if self.profile_session is not None:
+            self.stopProfile()
+            return
+        seconds, ok = QInputDialog.getInt(self, 'Profile',
+                                          'Seconds to profile:', 10, 1, 3600)
+        if ok:
+            self.startProfile(seconds)
+
+    def startProfile(self, seconds, directory=None):
+        """
+        Start profiling for a number of seconds, or until stopped or the
+        window is closed if seconds is 0.
+        """
+        if directory is None:
+            directory = os.path.join(os.path.dirname(history_path()),
+                                     'profiles')
+        self.profile_session = ProfileSession(directory)
+        self.actionProfile.setText("Stop Profiling")
+        if seconds:
+            self.profile_timer.start(int(seconds * 1000))
+        self.statusBar().showMessage("Profiling")
+
+    def stopProfile(self):
+        """Stop profiling, write the results and show where they are."""
+        if self.profile_session is None:
+            return
+        profile = self.profile_session
+        self.profile_session = None
+        self.profile_timer.stop()
+        self.actionProfile.setText("Profile for N Seconds...")
+        try:
+            summary = profile.stop()
+        except (IOError, OSError) as exp:
+            QtGui.QMessageBox.critical(self, 'Profile', str(exp))
+            return
+        self.statusBar().showMessage("Profile written to " +
+                                     profile.directory)
+        msg = QMessageBox(self)
+        msg.setWindowTitle('Profile')
+        msg.setText("Profile written to:\n\n" + "\n".join(profile.files) +
+                    "\n\nAttach these files to a bug report.")
+        msg.setDetailedText(summary)
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.exec_()
+
     def closeEvent(self, unused_event):
         """Handle window close event."""
         _ = unused_event
+        self.stopProfile()
+        if self.actionRestoreSession.isChecked():
+            self.saveSession()
+        try:
+            self.history_model.save(history_path())
+        except (IOError, OSError):
+            pass
+        self.stopSequences()
+        self.stopLinkTest()
+        self.stopBulkSend()
+        self.stopModemLines()
+        self.stopCompare()
+        self.stopBridge()
+        self.closeLog()
+        self.stopLogProcess()
         if not USE_THREAD:
             self.timer.stop()
             self.serial.close()
         else:
             self.thread.close()
+        self.search.stop()
         self.settings.beginGroup("mainWindow")
-        guisave.save(self, self.settings,
-                     ["ui", "remove_escape",
-                      "echo_input", "log_file", "enable_log", "line_end",
-                      "splitter", "output_hex"])
+        guisave.save(self, self.settings, self.controls)
         self.settings.endGroup()
 
 def main():
     """Create main app and window."""
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(prog='tinycom',
+                                     description='Line based serial terminal.')
+    parser.add_argument('--profile', metavar='SECONDS', type=float, nargs='?',
+                        const=0,
+                        help='profile for SECONDS, or until exit, and write'
+                        ' the results to files')
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='directory to write profiles to')
+    args, rest = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + rest)
     app.setApplicationName("TinyCom")
     win = MainWindow(None)
     win.setWindowTitle("TinyCom")
+    if args.profile is not None:
+        win.startProfile(args.profile, args.profile_dir)
     win.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,165 @@
+# Copyright (c) 2017 Joshua Henderson <digitalpeer@digitalpeer.com>
+#
+# SPDX-License-Identifier: GPL-3.0
+"""
+Streaming transforms between bytes on the wire and text on the screen.
+
+A transform is compiled once from its options into a short list of steps,
+using one bytes.translate() for everything that can be done byte for byte
+and one str.translate() for everything that can be done character for
+character, so converting a chunk is a few C level passes rather than a
+pass per option.  Transforms keep state between chunks, so a multibyte
+character or a CR/LF split across two reads comes out right.
+"""
+import re
+import codecs
+import binascii
+import collections
+
+try:
+    unichr
+except NameError:
+    unichr = chr # pylint: disable=invalid-name,redefined-builtin
+
+# Encoding name to Python codec, or None for raw 8-bit, which shows ASCII as
+# is and every other byte as a \x escape.
+ENCODINGS = collections.OrderedDict([
+    ("UTF-8", "utf-8"),
+    ("Latin-1", "latin-1"),
+    ("Shift-JIS", "shift_jis"),
+    ("CP437", "cp437"),
+    ("7-bit ASCII", "ascii"),
+    ("Raw 8-bit", None),
+])
+
+# How received line ends are shown.
+LF = "LF Newlines"
+CR = "CR Newlines"
+ANY = "CR, LF or CR/LF Newlines"
+AS_RECEIVED = "Newlines As Received"
+NEWLINES = [LF, CR, ANY, AS_RECEIVED]
+
+ANSI_ESCAPE = re.compile(r'(\x9B|\x1B\[)[0-?]*[ -\/]*[@-~]')
+ANSI_ESCAPE_BYTES = re.compile(br'(\x9B|\x1B\[)[0-?]*[ -\/]*[@-~]')
+
+# C0 controls and DEL to the Unicode control pictures, except tab and LF.
+CONTROL_PICTURES = dict((c, unichr(0x2400 + c)) for c in range(32)
+                        if c not in (9, 10))
+CONTROL_PICTURES[127] = u'\u2421'
+
+RAW_8BIT = dict((c, u'\\x%02x' % c) for c in range(128, 256))
+
+def tx_codec(encoding):
+    """Return the Python codec to encode text to send with."""
+    return ENCODINGS.get(encoding, "utf-8") or "latin-1"
+
+def _identity():
+    """Return a bytes.translate() table that maps every byte to itself."""
+    return bytearray(range(256))
+
+class RxTransform(object):
+    """Converts received bytes to text for display and logging."""
+
+    def __init__(self, encoding="UTF-8", newline=LF, controls=False,
+                 remove_escape=False, hex=False): # pylint: disable=redefined-builtin
+        self.encoding = encoding
+        self.newline = newline
+        self.controls = controls
+        self.remove_escape = remove_escape
+        self.hex = hex
+        self.steps = []
+        self._decoder = None
+        self._cr = False
+        self.compile()
+
+    def options(self):
+        """Return the options as a dictionary of constructor arguments."""
+        return {'encoding': self.encoding, 'newline': self.newline,
+                'controls': self.controls,
+                'remove_escape': self.remove_escape, 'hex': self.hex}
+
+    def configure(self, options):
+        """Change options from a dictionary, compiling again if needed."""
+        changed = False
+        for key, value in options.items():
+            if getattr(self, key) != value:
+                setattr(self, key, value)
+                changed = True
+        if changed:
+            self.compile()
+
+    def compile(self):
+        """
+        Build the steps from the options.  They are replaced in one
+        assignment, so a chunk being converted on another thread sees either
+        the old steps or the new ones.
+        """
+        steps = []
+        self._cr = False
+        if self.hex:
+            if self.remove_escape:
+                steps.append(lambda data: ANSI_ESCAPE_BYTES.sub(b'', data))
+            steps.append(self.toHex)
+            self.steps = steps
+            return
+
+        table = None
+        delete = b''
+        codec = ENCODINGS.get(self.encoding, "utf-8")
+        if codec == "ascii":
+            # 7-bit devices may set the parity bit, so strip it.
+            table = bytearray(c & 0x7f for c in range(256))
+        if self.newline == LF:
+            delete = b'\r'
+        elif self.newline == CR:
+            table = table or _identity()
+            table[13] = 10
+            delete = b'\n'
+        if table is not None or delete:
+            table = bytes(table) if table is not None else None
+            steps.append(lambda data: data.translate(table, delete))
+
+        errors = 'backslashreplace'
+        if codec is None:
+            codec = 'latin-1'
+        self._decoder = codecs.getincrementaldecoder(codec)(errors)
+        steps.append(self._decoder.decode)
+
+        if self.newline == ANY:
+            steps.append(self.toLf)
+        if self.remove_escape:
+            steps.append(lambda text: ANSI_ESCAPE.sub(u'', text))
+
+        chars = {}
+        if ENCODINGS.get(self.encoding, "utf-8") is None:
+            chars.update(RAW_8BIT)
+        if self.controls:
+            chars.update(CONTROL_PICTURES)
+        if chars:
+            steps.append(lambda text: text.translate(chars))
+        self.steps = steps
+
+    def reset(self):
+        """Forget any partial character or line end from the last chunk."""
+        self.compile()
+
+    def __call__(self, data):
+        """Transform a chunk of received bytes to text."""
+        for step in self.steps:
+            data = step(data)
+        return data
+
+    @staticmethod
+    def toHex(data):
+        """Convert bytes to space separated hex text."""
+        text = binascii.hexlify(data).decode('ascii')
+        return ''.join(text[i:i + 2] + ' ' for i in range(0, len(text), 2))
+
+    def toLf(self, text):
+        """Convert CR, LF and CR/LF line ends to LF."""
+        if not text:
+            return text
+        if self._cr and text.startswith(u'\n'):
+            text = text[1:]
+        self._cr = text.endswith(u'\r')
+        return text.replace(u'\r\n', u'\n').replace(u'\r', u'\n')